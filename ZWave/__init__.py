@@ -99,6 +99,9 @@ SIGNAL_NOTIFICATION = None
 SIGNAL_CONTROLLER_COMMAND = None
 SIGNAL_CONTROLLER_WAITING = None
 SIGNAL_CONTROLLER_STATS = None
+SIGNAL_HEAL_STARTED = None
+SIGNAL_HEAL_PROGRESS = None
+SIGNAL_HEAL_COMPLETE = None
 
 
 class Network(object):
@@ -226,11 +229,12 @@ class Network(object):
                     'Z-Wave: Finished initializing new network.\n\n'
                 )
 
-            self.zwave_network.set_poll_interval(100, True)
-
-            # for node in self.zwave_network.nodes.values():
-            #     for value in node.properties:
-            #         value.enable_poll()
+            # values are polled by the poll scheduler of the network, the
+            # poll interval of the stick is the shortest time between polls
+            if self.poll_interval > 0:
+                self.zwave_network.poll_scheduler.budget = (
+                    1000.0 / self.poll_interval
+                )
 
         threading.Thread(target=do).start()
 
@@ -415,6 +419,9 @@ class ZWave(eg.PluginBase):
         global SIGNAL_CONTROLLER_COMMAND
         global SIGNAL_CONTROLLER_WAITING
         global SIGNAL_CONTROLLER_STATS
+        global SIGNAL_HEAL_STARTED
+        global SIGNAL_HEAL_PROGRESS
+        global SIGNAL_HEAL_COMPLETE
 
         SIGNAL_NETWORK_FAILED = ZWaveNetwork.SIGNAL_NETWORK_FAILED
         SIGNAL_NETWORK_START = ZWaveNetwork.SIGNAL_NETWORK_START
@@ -457,6 +464,9 @@ class ZWave(eg.PluginBase):
         SIGNAL_CONTROLLER_COMMAND = ZWaveNetwork.SIGNAL_CONTROLLER_COMMAND
         SIGNAL_CONTROLLER_WAITING = ZWaveNetwork.SIGNAL_CONTROLLER_WAITING
         SIGNAL_CONTROLLER_STATS = ZWaveNetwork.SIGNAL_CONTROLLER_STATS
+        SIGNAL_HEAL_STARTED = ZWaveNetwork.SIGNAL_HEAL_STARTED
+        SIGNAL_HEAL_PROGRESS = ZWaveNetwork.SIGNAL_HEAL_PROGRESS
+        SIGNAL_HEAL_COMPLETE = ZWaveNetwork.SIGNAL_HEAL_COMPLETE
 
         dispatcher.connect(self.signal_network, SIGNAL_NETWORK_FAILED)
         dispatcher.connect(self.signal_network, SIGNAL_NETWORK_START)
@@ -464,6 +474,9 @@ class ZWave(eg.PluginBase):
         dispatcher.connect(self.signal_network, SIGNAL_NETWORK_STOP)
         dispatcher.connect(self.signal_network, SIGNAL_NETWORK_RESET)
         dispatcher.connect(self.signal_network, SIGNAL_NETWORK_AWAKE)
+        dispatcher.connect(self.signal_network, SIGNAL_HEAL_STARTED)
+        dispatcher.connect(self.signal_network, SIGNAL_HEAL_PROGRESS)
+        dispatcher.connect(self.signal_network, SIGNAL_HEAL_COMPLETE)
         dispatcher.connect(self.signal_group, SIGNAL_GROUP)
         dispatcher.connect(self.signal_node, SIGNAL_NODE_ADDED)
         dispatcher.connect(self.signal_node, SIGNAL_NODE_EVENT)
@@ -516,6 +529,7 @@ class ZWave(eg.PluginBase):
         self.AddAction(Get)
         self.AddAction(RampDownDimmer)
         self.AddAction(RampUpDimmer)
+        self.AddAction(FadeRoom)
         self._config_event = threading.Event()
         self._config_event.set()
 
@@ -542,6 +556,12 @@ class ZWave(eg.PluginBase):
             self.TriggerEvent(event, kwargs)
         elif signal == SIGNAL_NETWORK_AWAKE:
             self.TriggerEvent(event, kwargs)
+        elif signal == SIGNAL_HEAL_STARTED:
+            self.TriggerEvent(event, kwargs)
+        elif signal == SIGNAL_HEAL_PROGRESS:
+            self.TriggerEvent(event, kwargs)
+        elif signal == SIGNAL_HEAL_COMPLETE:
+            self.TriggerEvent(event, kwargs)
 
     def signal_group(
         self,
@@ -1396,15 +1416,16 @@ class Set(eg.ActionBase):
             node.location = value
 
         elif prop_name == 'Poll Intensity':
+            # only the values a user sees are worth polling
             for prop in node.values.values():
-                if value:
+                if value and prop.genre == 'User':
                     prop.enable_poll(value)
                 else:
                     prop.disable_poll()
 
         elif prop_name == 'Poll':
             for prop in node.values.values():
-                if value:
+                if value and prop.genre == 'User':
                     prop.enable_poll()
                 else:
                     prop.disable_poll()
@@ -1715,7 +1736,15 @@ class Set(eg.ActionBase):
 # noinspection PyPep8Naming
 class Get(eg.ActionBase):
 
-    def __call__(self, network_name, room_name, node_name, prop_name):
+    def __call__(
+        self,
+        network_name,
+        room_name,
+        node_name,
+        prop_name,
+        history=0,
+        aggregate='mean'
+    ):
         for network in self.plugin.networks:
             if network.name == network_name:
                 break
@@ -1764,23 +1793,16 @@ class Get(eg.ActionBase):
             return room
 
         elif prop_name == 'Poll Intensity':
-            values = node.values.values()
-            if values:
-                prop = values[0]
-
-                if prop.is_polled:
-                    value = prop.poll_intensity
-                else:
-                    value = 0
-
-                return value
+            # the node is polled when any of its values is, node.values is
+            # not in any order
+            intensities = list(
+                prop.poll_intensity for prop in node.values.values()
+                if prop.is_polled
+            )
+            return max(intensities) if intensities else 0
 
         elif prop_name == 'Poll':
-            values = node.values.values()
-            if values:
-                prop = values[0]
-
-                return prop.is_polled
+            return any(prop.is_polled for prop in node.values.values())
 
         else:
             for prop in node.values.values():
@@ -1789,30 +1811,75 @@ class Get(eg.ActionBase):
             else:
                 eg.PrintError('Z-Wave: Variable not found.')
                 return
-            return prop.data
+
+            if not history:
+                return prop.data
+
+            if prop.history is None:
+                eg.PrintError('Z-Wave: Variable has no history.')
+                return
+
+            import time
+
+            start = time.time() - history * 60
+            if aggregate == 'samples':
+                return network.history.samples(prop, start).tolist()
+
+            return network.history.aggregate(prop, aggregate, start)
 
     def GetLabel(
         self,
         network_name=None,
         room_name=None,
         node_name=None,
-        prop_name=None
+        prop_name=None,
+        history=0,
+        aggregate='mean'
     ):
         label = '{0}: {1}.{2}.{3}.{4}'
+        if history:
+            label += ' {5} {6}min'
         return label.format(
             self.__class__.__name__,
             network_name,
             room_name,
             node_name,
-            prop_name
+            prop_name,
+            aggregate,
+            history
         )
 
-    def Configure(self, network=None, room=None, node=None, prop=None):
+    def Configure(
+        self,
+        network=None,
+        room=None,
+        node=None,
+        prop=None,
+        history=0,
+        aggregate='mean'
+    ):
+        from zwave_history import AGGREGATES
+
+        aggregates = list(AGGREGATES) + ['samples']
+
         panel = eg.ConfigPanel()
         zwave_panel = ZWavePanel(panel, self.plugin.networks)
 
-        eg.EqualizeWidths(zwave_panel.GetStaticTexts())
-        eg.EqualizeWidths(zwave_panel.GetControls())
+        history_st = panel.StaticText('History minutes (0 = current):')
+        aggregate_st = panel.StaticText('History aggregate:')
+
+        history_ctrl = panel.SpinIntCtrl(value=history, min=0, max=5256000)
+        aggregate_ctrl = panel.Choice(
+            aggregates.index(aggregate),
+            choices=aggregates
+        )
+
+        eg.EqualizeWidths(
+            zwave_panel.GetStaticTexts() + (history_st, aggregate_st)
+        )
+        eg.EqualizeWidths(
+            zwave_panel.GetControls() + (history_ctrl, aggregate_ctrl)
+        )
 
         if network is not None:
             zwave_panel.SetNetwork(network)
@@ -1821,10 +1888,18 @@ class Get(eg.ActionBase):
             zwave_panel.SetProperty(prop)
 
         panel.sizer.Add(zwave_panel, 0, wx.EXPAND | wx.ALL, 5)
+        panel.sizer.Add(h_sizer(history_st, history_ctrl))
+        panel.sizer.Add(h_sizer(aggregate_st, aggregate_ctrl))
 
         while panel.Affirmed():
             panel.SetResult(
-                *zwave_panel.GetValues()
+                *(
+                    zwave_panel.GetValues() +
+                    (
+                        history_ctrl.GetValue(),
+                        aggregates[aggregate_ctrl.GetSelection()]
+                    )
+                )
             )
 
 
@@ -2074,3 +2149,105 @@ class RampUpDimmer(eg.ActionBase):
             )
 
 
+# noinspection PyPep8Naming
+class FadeRoom(eg.ActionBase):
+    name = 'Fade Room'
+    description = (
+        'Fades every dimmable light in a room to the same level at the '
+        'same time.'
+    )
+
+    def __call__(self, network_name, room_name, level, duration):
+        for network in self.plugin.networks:
+            if network.name == network_name:
+                break
+        else:
+            eg.PrintError('Z-Wave: Network not found.')
+            return
+
+        node_ids = []
+        for node in network.nodes.values():
+            try:
+                room = node.location
+            except AttributeError:
+                room = None
+
+            if not room:
+                room = 'Not Assigned'
+
+            if room == room_name:
+                node_ids += [node.id]
+
+        if not node_ids:
+            eg.PrintError('Z-Wave: Room not found.')
+            return
+
+        group = network.create_fade_group(node_ids)
+
+        if not group.nodes:
+            eg.PrintError('Z-Wave: Room has no dimmable lights.')
+            return
+
+        group.fade(level, duration)
+
+    def GetLabel(
+        self,
+        network_name=None,
+        room_name=None,
+        level=None,
+        duration=None
+    ):
+        label = '{0}: {1}.{2}, {3}% {4}s'
+        return label.format(
+            self.__class__.__name__,
+            network_name,
+            room_name,
+            level,
+            duration
+        )
+
+    def Configure(self, network=None, room=None, level=0, duration=1.0):
+        import zwave_command_classes  # NOQA
+
+        panel = eg.ConfigPanel()
+        zwave_panel = ZWavePanel(
+            panel,
+            self.plugin.networks,
+            zwave_command_classes.COMMAND_CLASS_SWITCH_MULTILEVEL
+        )
+        network_st, room_st, node_st = zwave_panel.GetStaticTexts()
+        network_ctrl, room_ctrl, node_ctrl = zwave_panel.GetControls()
+        node_st.Hide()
+        node_ctrl.Hide()
+
+        level_st = panel.StaticText('Target level:')
+        duration_st = panel.StaticText('Fade time (seconds):')
+
+        level_ctrl = panel.SpinIntCtrl(value=level, min=0, max=99)
+        duration_ctrl = panel.SpinNumCtrl(
+            value=duration,
+            increment=0.1,
+            min=0.0
+        )
+
+        eg.EqualizeWidths((network_st, room_st, level_st, duration_st))
+        eg.EqualizeWidths((network_ctrl, room_ctrl, level_ctrl, duration_ctrl))
+
+        if network is not None:
+            zwave_panel.SetNetwork(network)
+            zwave_panel.SetRoom(room)
+
+        panel.sizer.Add(zwave_panel, 0, wx.EXPAND | wx.ALL, 5)
+
+        panel.sizer.Add(h_sizer(level_st, level_ctrl))
+        panel.sizer.Add(h_sizer(duration_st, duration_ctrl))
+
+        while panel.Affirmed():
+            network, room, _ = zwave_panel.GetValues()
+
+            panel.SetResult(
+                network,
+                room,
+                level_ctrl.GetValue(),
+                duration_ctrl.GetValue()
+            )
@@ -112,6 +112,114 @@ class ToolTips(object):
         write_only = 'Self explanatory.'
 
 
+class CachedInfo(object):
+    """
+    Wraps a node or a value for the admin panel.
+
+    The attributes named in CACHED are read from the manager the first time
+    they are used and kept until invalidate is called, everything else is
+    passed through to the wrapped object. Setting an attribute sets it on
+    the wrapped object.
+    """
+
+    CACHED = ()
+
+    def __init__(self, obj):
+        self.__dict__['obj'] = obj
+        self.__dict__['_cache'] = {}
+
+    def __getattr__(self, item):
+        if item in self.CACHED:
+            cache = self._cache
+            if item not in cache:
+                cache[item] = getattr(self.obj, item)
+            return cache[item]
+
+        return getattr(self.obj, item)
+
+    def __setattr__(self, key, value):
+        setattr(self.obj, key, value)
+
+        # the setters of the values send the new value to the manager on a
+        # timer, reading it back right away could give the old one.
+        if key in self.CACHED:
+            self._cache[key] = value
+
+    def __eq__(self, other):
+        if isinstance(other, CachedInfo):
+            other = other.obj
+        return self.obj is other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.obj)
+
+    def invalidate(self, *names):
+        """
+        Read attributes from the manager again the next time they are used.
+
+        :param names: Names of the attributes. Defaults to all of them.
+        """
+        if names:
+            for name in names:
+                self._cache.pop(name, None)
+        else:
+            self._cache.clear()
+
+
+class NodeInfo(CachedInfo):
+    CACHED = (
+        'name',
+        'location',
+        'object_id_str',
+        'manufacturer_name',
+        'product_name',
+        'generic_as_str',
+        'specific_as_str',
+        'basic_as_str',
+        'device_type_as_str',
+        'command_classes_as_str',
+        'role_as_str',
+    )
+
+
+class ValueInfo(CachedInfo):
+    CACHED = (
+        'label',
+        'object_id_str',
+        'id_on_network',
+        'genre',
+        'index',
+        'is_set',
+        'is_read_only',
+        'is_write_only',
+        'units',
+        'type',
+        'min',
+        'max',
+        'help',
+        'precision',
+        'is_polled',
+        'poll_intensity',
+        'data',
+    )
+
+    def __iter__(self):
+        if 'items' not in self._cache:
+            self._cache['items'] = list(self.obj)
+        return iter(self._cache['items'])
+
+    def enable_poll(self, intensity=1):
+        self.invalidate('is_polled', 'poll_intensity')
+        return self.obj.enable_poll(intensity)
+
+    def disable_poll(self):
+        self.invalidate('is_polled', 'poll_intensity')
+        return self.obj.disable_poll()
+
+
 # noinspection PyPep8Naming
 class NodePanel(ScrolledPanel):
 
@@ -803,7 +911,8 @@ class NetworkPanel(ScrolledPanel):
             'is_static_update_controller',
             'is_bridge_controller',
             'is_locked',
-            'send_queue_count'
+            'send_queue_count',
+            'value_queue_count'
         )
 
         for attr in attrs:
@@ -961,7 +1070,8 @@ class PlotFrame(wx.Frame):
             size=Config.image_viewer_size,
             pos=Config.image_viewer_position
         )
-        self._image = None
+        self._plot_thread = None
+        self._pyramid = None
         self._cache = {}
 
         self.Centre()
@@ -1066,43 +1176,57 @@ class PlotFrame(wx.Frame):
         Config.image_viewer_size = self.GetSizeTuple()
         Config.image_viewer_position = self.GetPositionTuple()
 
+        if self._pyramid is not None:
+            self._pyramid.plot.remove_listener(self.on_plot_changed)
+
         evt.Skip()
 
     @property
     def image(self):
-        if self._image is None:
+        if self._pyramid is None and self._plot_thread is None:
             import threading
 
             def do():
-                from zwave_cord_diagram import Plot
+                from zwave_cord_diagram import Plot, TilePyramid
 
                 plot = Plot(self.network)
-                self._image, self.graph_nodes = plot.image
+                self._pyramid = TilePyramid(plot)
+                self.graph_nodes = plot.nodes
+                plot.add_listener(self.on_plot_changed)
 
-                plot.close()
-
-                del plot
                 del Plot
 
-                self.SetStatusText(
-                    str(self._image.size[0]) + 'x' + str(self._image.size[1]),
-                    1
-                )
+                size = str(self._pyramid.base_size)
+                self.SetStatusText(size + 'x' + size, 1)
                 self.process_picture(1.0)
 
-            threading.Thread(target=do).start()
+            self._plot_thread = threading.Thread(target=do)
+            self._plot_thread.start()
 
-        return self._image
+        return self._pyramid
+
+    def on_plot_changed(self, plot, damage):
+        self._pyramid.invalidate(damage)
+        self.graph_nodes = plot.nodes
+
+        if damage is None:
+            size = str(self._pyramid.base_size)
+            self.SetStatusText(size + 'x' + size, 1)
+            self.SetStatusText('Nodes: ' + str(len(plot.nodes)), 0)
+            self.menu_id = None
+            self.menu_bmp = None
+
+        self.process_picture()
 
     @property
     def orig_image_size(self):
-        return self._image.size
+        return self._pyramid.base_size, self._pyramid.base_size
 
     def set_scroll(self, scroll_x, scroll_y):
         self.scroll_x += scroll_x
         self.scroll_y += scroll_y
 
-        image_w, image_h = self._bmp.GetSize()
+        image_w, image_h = int(self.width), int(self.height)
 
         if self.scroll_x < -image_w:
             self.scroll_x = -image_w
@@ -1114,6 +1238,54 @@ class PlotFrame(wx.Frame):
         elif self.scroll_y > image_h:
             self.scroll_y = image_h
 
+    @property
+    def image_pos(self):
+        client_w, client_h = self.image_box_size
+        image_w, image_h = int(self.width), int(self.height)
+
+        if image_w < client_w:
+            pos_x = (client_w - image_w) / 2
+        else:
+            pos_x = 0
+
+        if image_h < client_h:
+            pos_y = (client_h - image_h) / 2
+        else:
+            pos_y = 0
+
+        return pos_x - self.scroll_x, pos_y - self.scroll_y
+
+    def compose(self):
+        """
+        Build the bitmap for the window from the tiles that are visible.
+        """
+        from PIL import Image
+
+        client_w, client_h = self.image_box_size
+        image_w, image_h = int(self.width), int(self.height)
+        pos_x, pos_y = self.image_pos
+
+        left = max(0, -pos_x)
+        top = max(0, -pos_y)
+        right = min(image_w, client_w - pos_x)
+        bottom = min(image_h, client_h - pos_y)
+
+        img = Image.new('RGBA', (client_w, client_h), (0, 0, 0, 255))
+
+        if right > left and bottom > top:
+            region, (region_x, region_y) = self._pyramid.compose(
+                image_w,
+                left,
+                top,
+                right - left,
+                bottom - top,
+                self.rotation,
+                self.mode
+            )
+            img.paste(region, (pos_x + region_x, pos_y + region_y), region)
+
+        return wx.BitmapFromBufferRGBA(client_w, client_h, img.tobytes())
+
     @zwave_utils.thread_call_wait
     def process_picture(
         self,
@@ -1125,11 +1297,17 @@ class PlotFrame(wx.Frame):
         x=None,
         y=None,
     ):
-        if self._image is None:
+        if self._pyramid is None:
             return
 
         if scroll_x is not None or scroll_y is not None:
             self.set_scroll(scroll_x, scroll_y)
+            try:
+                self.bmp = self.compose()
+                self.memory_error = False
+            except MemoryError:
+                self.memory_error = True
+
             self.hit_test_nodes()
             self.Refresh()
             self.Update()
@@ -1157,15 +1335,15 @@ class PlotFrame(wx.Frame):
 
         orig_w, orig_h = self.orig_image_size
 
+        last_width = self.width
+        last_height = self.height
+
         if factor is not None:
             if factor > 0:
                 self.factor = factor * self.factor
             elif factor == 0.0:
                 self.factor = 1.0
 
-            last_width = self.width
-            last_height = self.height
-
             win_x, win_y = self.image_box_size
 
             win_x -= 40
@@ -1187,48 +1365,28 @@ class PlotFrame(wx.Frame):
             if int(self.height) <= 0:
                 self.height = last_height
 
-        img = self.image
-
-        try:
-            img = img.resize((int(self.width), int(self.height)), self.mode)
-            if self.rotation:
-                if self.mode in (0, 2, 3):
-                    rotate_mode = self.mode
-                else:
-                    rotate_mode = 0
-
-                img = img.rotate(self.rotation, rotate_mode)
-
-            last_w, last_h = self._bmp.GetSize()
-
-            self.bmp = wx.BitmapFromBufferRGBA(
-                img.size[0],
-                img.size[1],
-                str(img.tobytes())
-            )
-
-            new_w, new_h = self._bmp.GetSize()
+        if last_width and last_height:
+            new_w, new_h = self.width, self.height
 
             if None not in (x, y):
-                scroll_x = int((float(x) * (float(new_w) / float(last_w))) - x)
-
-                scroll_y = int((float(y) * (float(new_h) / float(last_h))) - y)
+                scroll_x = int((float(x) * (new_w / last_width)) - x)
+                scroll_y = int((float(y) * (new_h / last_height)) - y)
 
             else:
                 scroll_x = int(
-                    (
-                        float(self.scroll_x) * (float(new_w) / float(last_w))
-                    ) - self.scroll_x
+                    (float(self.scroll_x) * (new_w / last_width)) -
+                    self.scroll_x
                 )
                 scroll_y = int(
-                    (
-                        float(self.scroll_y) * (float(new_h) / float(last_h))
-                    ) - self.scroll_y
+                    (float(self.scroll_y) * (new_h / last_height)) -
+                    self.scroll_y
                 )
 
             if scroll_x != 0 or scroll_y != 0:
                 self.set_scroll(scroll_x, scroll_y)
 
+        try:
+            self.bmp = self.compose()
             self.memory_error = False
 
         except MemoryError:
@@ -1247,25 +1405,9 @@ class PlotFrame(wx.Frame):
 
     @property
     def bmp(self):
-        bmp_w, bmp_h = self._bmp.GetSize()
-
         client_w, client_h = self.image_box_size
         wx_bmp = wx.EmptyBitmap(client_w, client_h)
 
-        if bmp_w < client_w:
-            pos_x = (client_w - bmp_w) / 2
-        else:
-            pos_x = 0
-
-        pos_x -= self.scroll_x
-
-        if bmp_h < client_h:
-            pos_y = (client_h - bmp_h) / 2
-        else:
-            pos_y = 0
-
-        pos_y -= self.scroll_y
-
         dc = wx.MemoryDC()
         dc.SelectObject(wx_bmp)
         dc.SetPen(wx.Pen(wx.Colour(0, 0, 0), 1))
@@ -1273,7 +1415,7 @@ class PlotFrame(wx.Frame):
         dc.DrawRectangle(0, 0, client_w, client_h)
 
         gc = wx.GCDC(dc)
-        gc.DrawBitmap(self._bmp, pos_x, pos_y)
+        gc.DrawBitmap(self._bmp, 0, 0)
         if self.memory_error:
             gc.SetTextForeground(wx.Colour(255, 0, 0))
             gc.SetTextBackground(wx.Colour(0, 0, 0, 0))
@@ -1490,152 +1632,134 @@ class PlotFrame(wx.Frame):
         if self.graph_nodes is None:
             return
 
-        x = self.x
-        y = self.y
+        pos_x, pos_y = self.image_pos
+        x = self.x - pos_x
+        y = self.y - pos_y
+        image_size = int(self.width), int(self.height)
+
+        index = self._pyramid.plot.layout.hit_test(
+            x,
+            y,
+            image_size[0],
+            image_size[1],
+            -self.rotation
+        )
 
-        client_w, client_h = self.image_box_size
-        image_w, image_h = self._bmp.GetSize()
-
-        if client_w > image_w:
-            x -= (client_w - image_w) / 2
-        x += self.scroll_x
-
-        if client_h > image_h:
-            y -= (client_h - image_h) / 2
-        y += self.scroll_y
-
-        for node in self.graph_nodes:
-            if node.id == self.menu_id:
-                if node.hit_test(
-                    x,
-                    y,
-                    -self.rotation,
-                    *self._bmp.GetSize()
-                ):
-                    pos_x = self.x
-                    pos_y = self.y
-                    break
-
-            if node.id != self.menu_id:
-                if not node.hit_test(
-                    x,
-                    y,
-                    -self.rotation,
-                    *self._bmp.GetSize()
-                ):
-                    continue
-
-                self.menu_id = node.id
-                self.menu_event.set()
-
-                pos_x = self.x
-                pos_y = self.y
-
-                # noinspection PyShadowingNames
-                def build_menu(n):
-                    try:
-                        with self.menu_lock:
-                            self.menu_event.clear()
-                            self.menu_event.wait(0.5)
-                            if self.menu_event.isSet():
-                                return
-
-                            dc = wx.MemoryDC()
-                            dc.SetFont(self.GetFont())
-
-                            node_id = 'Node id - ' + n.node.object_id_str
-                            neighbor_text = [node_id]
-                            if n.index != 0:
-                                num_routes = 'Routes: ' + str(n.num_routes)
-                                neighbor_text += [num_routes]
-
-                            neighbor_text += ['---------']
-                            label_w, label_h = dc.GetTextExtent('G')
-                            height = (
-                                4 + ((label_h + 4) * len(neighbor_text))
-                            )
-                            width = len(node_id) * label_w
-
-                            colors = [(0, 255, 0)] * len(neighbor_text)
-                            for neighbor in n.neighbors:
-                                if neighbor is None:
-                                    continue
-
-                                name = neighbor.name
-                                room = neighbor.room
-                                label = '{0} {1} ({2})'.format(
-                                    room,
-                                    name,
-                                    neighbor.node.object_id_str
-                                )
-
-                                width = max(width, label_w * len(label))
-                                height += label_h + 4
-                                neighbor_text += [label]
-                                colors += [neighbor.color]
-
-                            width += 4
-
-                            bmp = wx.EmptyBitmapRGBA(
-                                width,
-                                height,
-                                0,
-                                0,
-                                0,
-                                0
-                            )
-                            dc.SelectObject(bmp)
-                            gc = wx.GCDC(dc)
-
-                            gc.SetTextBackground(wx.Colour(0, 0, 0, 0))
-                            gc.SetPen(wx.Pen(wx.Colour(0, 0, 255, 255), 3))
-                            gc.SetBrush(wx.Brush(wx.Colour(0, 0, 0, 180)))
-
-                            text_x = 4
-                            text_y = 4
-
-                            gc.DrawRoundedRectangle(0, 0, width, height, 5)
-
-                            for i, text in enumerate(neighbor_text):
-                                gc.SetTextForeground(wx.Colour(*colors[i]))
-                                gc.DrawText(text, text_x, text_y)
-                                text_y += label_h + 4
-
-                            gc.Destroy()
-                            del gc
-
-                            dc.SelectObject(wx.EmptyBitmap(1, 1))
-                            dc.Destroy()
-                            del dc
-
-                            client_w, client_h = self.image_box_size
-                            p_x = pos_x
-                            p_y = pos_y
-
-                            if p_x + width > client_w:
-                                p_x -= width
-
-                            if p_y + height > client_h:
-                                p_y -= height
-
-                            self.menu_pos = (p_x, p_y)
-                            self.menu_bmp = bmp
-                            self.Refresh()
-                            self.Update()
-                    except wx.PyDeadObjectError:
-                        pass
-
-                threading.Thread(
-                    target=build_menu,
-                    args=(node,)
-                ).start()
-
-                break
-        else:
+        if index is None:
             self.menu_id = None
             self.menu_bmp = None
             self.Refresh()
             self.Update()
+            return
+
+        node = self.graph_nodes[index]
+        if node.id == self.menu_id:
+            return
+
+        self.menu_id = node.id
+        self.menu_event.set()
+
+        pos_x = self.x
+        pos_y = self.y
+
+        # noinspection PyShadowingNames
+        def build_menu(n):
+            try:
+                with self.menu_lock:
+                    self.menu_event.clear()
+                    self.menu_event.wait(0.5)
+                    if self.menu_event.isSet():
+                        return
+
+                    dc = wx.MemoryDC()
+                    dc.SetFont(self.GetFont())
+
+                    node_id = 'Node id - ' + n.node.object_id_str
+                    neighbor_text = [node_id]
+                    if n.index != 0:
+                        num_routes = 'Routes: ' + str(n.num_routes)
+                        neighbor_text += [num_routes]
+
+                    neighbor_text += ['---------']
+                    label_w, label_h = dc.GetTextExtent('G')
+                    height = (
+                        4 + ((label_h + 4) * len(neighbor_text))
+                    )
+                    width = len(node_id) * label_w
+
+                    colors = [(0, 255, 0)] * len(neighbor_text)
+                    for neighbor in n.neighbors:
+                        if neighbor is None:
+                            continue
+
+                        name = neighbor.name
+                        room = neighbor.room
+                        label = '{0} {1} ({2})'.format(
+                            room,
+                            name,
+                            neighbor.node.object_id_str
+                        )
+
+                        width = max(width, label_w * len(label))
+                        height += label_h + 4
+                        neighbor_text += [label]
+                        colors += [neighbor.color]
+
+                    width += 4
+
+                    bmp = wx.EmptyBitmapRGBA(
+                        width,
+                        height,
+                        0,
+                        0,
+                        0,
+                        0
+                    )
+                    dc.SelectObject(bmp)
+                    gc = wx.GCDC(dc)
+
+                    gc.SetTextBackground(wx.Colour(0, 0, 0, 0))
+                    gc.SetPen(wx.Pen(wx.Colour(0, 0, 255, 255), 3))
+                    gc.SetBrush(wx.Brush(wx.Colour(0, 0, 0, 180)))
+
+                    text_x = 4
+                    text_y = 4
+
+                    gc.DrawRoundedRectangle(0, 0, width, height, 5)
+
+                    for i, text in enumerate(neighbor_text):
+                        gc.SetTextForeground(wx.Colour(*colors[i]))
+                        gc.DrawText(text, text_x, text_y)
+                        text_y += label_h + 4
+
+                    gc.Destroy()
+                    del gc
+
+                    dc.SelectObject(wx.EmptyBitmap(1, 1))
+                    dc.Destroy()
+                    del dc
+
+                    client_w, client_h = self.image_box_size
+                    p_x = pos_x
+                    p_y = pos_y
+
+                    if p_x + width > client_w:
+                        p_x -= width
+
+                    if p_y + height > client_h:
+                        p_y -= height
+
+                    self.menu_pos = (p_x, p_y)
+                    self.menu_bmp = bmp
+                    self.Refresh()
+                    self.Update()
+            except wx.PyDeadObjectError:
+                pass
+
+        threading.Thread(
+            target=build_menu,
+            args=(node,)
+        ).start()
 
     def on_leave(self, _):
         self.on_left_up(None)
@@ -1714,6 +1838,7 @@ class AdminPanel(wx.Panel):
         apply_btn.Bind(wx.EVT_BUTTON, self.on_apply)
 
         tree_ctrl.Bind(wx.EVT_TREE_SEL_CHANGED, self.on_selection_changed)
+        tree_ctrl.Bind(wx.EVT_TREE_ITEM_EXPANDING, self.on_item_expanding)
         tree_ctrl.Bind(wx.EVT_TREE_BEGIN_LABEL_EDIT, self.on_start_edit_label)
         tree_ctrl.Bind(wx.EVT_TREE_END_LABEL_EDIT, self.on_end_edit_label)
 
@@ -1757,25 +1882,29 @@ class AdminPanel(wx.Panel):
         sizer.Add(top_sizer, 1, wx.EXPAND)
         sizer.Add(bottom_sizer, 0, wx.EXPAND)
 
-        from . import zwave_network
-
-        dispatcher.connect(
-            self.signal_remove_node,
-            zwave_network.ZWaveNetwork.SIGNAL_NODE_REMOVED
-        )
-        dispatcher.connect(
-            self.signal_add_node,
-            zwave_network.ZWaveNetwork.SIGNAL_NODE_ADDED
-        )
-        dispatcher.connect(
-            self.signal_add_node,
-            zwave_network.ZWaveNetwork.SIGNAL_NODE_NEW
-        )
         self.tree_ctrl = tree_ctrl
         self.splitter_window = splitter_window
         self.remove_failed_node_btn = remove_failed_node_btn
         self.plot_btn = plot_btn
         self.plot_frame = None
+
+        # the tree items get created when their parent is expanded, these
+        # map the rooms, nodes and values to the items created so far.
+        self._room_items = {}
+        self._node_rooms = {}
+        self._node_items = {}
+        self._value_items = {}
+        self._node_info = {}
+        self._value_info = {}
+
+        # the changes from the signals are applied to the tree in batches,
+        # at most 20 times a second and not at all while the panel is
+        # hidden.
+        self.ui_bridge = zwave_utils.UIBridge(self.on_ui_changes)
+
+        for callback, signal in self._signals():
+            dispatcher.connect(callback, signal)
+
         self.load_tree()
         self.SetSizer(sizer)
         self.tree_ctrl.Bind(wx.EVT_CHAR_HOOK, self.on_key)
@@ -1790,6 +1919,8 @@ class AdminPanel(wx.Panel):
         self.tree_ctrl.SetFont(font)
 
         parent.GetParent().Bind(wx.EVT_CLOSE, self.on_close)
+        parent.GetParent().Bind(wx.EVT_ICONIZE, self.on_iconize)
+        self.Bind(wx.EVT_SHOW, self.on_show)
 
         def do():
             parent.GetParent().SetSize(Config.size)
@@ -1899,85 +2030,61 @@ class AdminPanel(wx.Panel):
             if not new_label.strip():
                 new_label = str('No Room')
                 self.tree_ctrl.SetItemText(item_id, new_label)
-            nodes = {}
-            self.get_nodes(item_id, nodes)
+
+            if self._room_items.get(self.old_item_label) == item_id:
+                del self._room_items[self.old_item_label]
+            self._room_items[new_label] = item_id
+
+            selection = self.tree_ctrl.GetSelection()
 
             for node in data['nodes']:
                 try:
                     node.location = new_label
-                    if self.tree_ctrl.GetSelection() == nodes[node]:
+                    node_item_id = self._node_items.get(node.id)
+                    if node_item_id is not None and selection == node_item_id:
                         self.options_panel.SetLabel(new_label)
                 except AttributeError:
                     pass
 
-    def clear_node_from_room(self, item_id, node):
-        parent_id = self.tree_ctrl.GetItemParent(item_id)
-        parent_data = self.tree_ctrl.GetPyData(parent_id)
-        parent_data['nodes'].remove(node)
-        if not parent_data['nodes']:
-            self.tree_ctrl.DeleteChildren(parent_id)
-            self.tree_ctrl.Delete(parent_id)
-            return False
-
-        self.tree_ctrl.SetPyData(
-            parent_id,
-            parent_data
-        )
-        return True
-
     def move_location(self, node, location):
-        root = self.tree_ctrl.GetRootItem()
-        nodes = {}
-        self.get_nodes(root, nodes)
+        node = self.node_info(node)
 
-        item_id = nodes[node]
+        old_room_id = self._node_rooms.get(node.id)
+        old_item_id = self._node_items.pop(node.id, None)
+        room_id = self._room_items.get(location)
 
-        child_id, cookie = self.tree_ctrl.GetFirstChild(root)
-
-        while child_id.IsOk():
-            room_name = self.tree_ctrl.GetItemText(child_id)
-            if room_name == location:
-                child_id = self.add_node(child_id, node)
-                self.tree_ctrl.SelectItem(child_id)
-
-                if self.clear_node_from_room(item_id, node):
-                    self.tree_ctrl.DeleteChildren(item_id)
-                    self.tree_ctrl.Delete(item_id)
-                return
+        if room_id is not None and room_id == old_room_id:
+            if old_item_id is not None:
+                self._node_items[node.id] = old_item_id
+            return
 
-            child_id, cookie = self.tree_ctrl.GetNextChild(child_id, cookie)
+        if room_id is None:
+            room_id = self.add_room(location)
 
-        parent_id = self.tree_ctrl.AppendItem(root, location)
-        self.tree_ctrl.SetPyData(
-            parent_id,
-            dict(obj=None, panel=Panel, nodes=[])
+        selected = (
+            old_item_id is not None and
+            self.tree_ctrl.GetSelection() == old_item_id
         )
 
-        child_id = self.add_node(parent_id, node)
-        self.tree_ctrl.SelectItem(child_id)
-        if self.clear_node_from_room(item_id, node):
-            self.tree_ctrl.DeleteChildren(item_id)
-            self.tree_ctrl.Delete(item_id)
+        child_id = self.add_node(room_id, node)
+        if selected:
+            if child_id is None:
+                self.load_children(room_id)
+                child_id = self._node_items[node.id]
+            self.tree_ctrl.SelectItem(child_id)
+
+        if old_room_id is not None:
+            self._remove_from_room(old_room_id, old_item_id, node.id)
 
     def on_close(self, evt=None):
         Config.pos = self.parent.GetParent().GetPositionTuple()
         Config.size = self.parent.GetParent().GetSizeTuple()
         Config.zoom = self.zoom_steps
 
-        import zwave_network
+        for callback, signal in self._signals():
+            dispatcher.disconnect(callback, signal)
 
-        dispatcher.disconnect(
-            self.signal_remove_node,
-            zwave_network.ZWaveNetwork.SIGNAL_NODE_REMOVED
-        )
-        dispatcher.disconnect(
-            self.signal_add_node,
-            zwave_network.ZWaveNetwork.SIGNAL_NODE_ADDED
-        )
-        dispatcher.disconnect(
-            self.signal_add_node,
-            zwave_network.ZWaveNetwork.SIGNAL_NODE_NEW
-        )
+        self.ui_bridge.stop()
 
         if self.plot_frame is not None:
             self.plot_frame.Hide()
@@ -1991,6 +2098,63 @@ class AdminPanel(wx.Panel):
         self.on_close(None)
         wx.Panel.Destroy(self)
 
+    def _signals(self):
+        network = self.network
+        return (
+            (self.signal_add_node, network.SIGNAL_NODE_ADDED),
+            (self.signal_add_node, network.SIGNAL_NODE_NEW),
+            (self.signal_remove_node, network.SIGNAL_NODE_REMOVED),
+            (self.signal_node_naming, network.SIGNAL_NODE_NAMING),
+            (self.signal_node_naming, network.SIGNAL_NODE_QUERIES_COMPLETE),
+            (self.signal_add_value, network.SIGNAL_VALUE_ADDED),
+            (self.signal_remove_value, network.SIGNAL_VALUE_REMOVED),
+            (self.signal_value_changed, network.SIGNAL_VALUE_CHANGED),
+            (self.signal_value_changed, network.SIGNAL_VALUE_REFRESHED),
+        )
+
+    def node_info(self, node):
+        """
+        The cached information of a node.
+
+        :param node: The node
+        :type node: ZWaveNode, NodeInfo
+        :rtype: NodeInfo
+        """
+        if isinstance(node, CachedInfo):
+            return node
+
+        info = self._node_info.get(node.id, None)
+        if info is None or info.obj is not node:
+            info = self._node_info[node.id] = NodeInfo(node)
+        return info
+
+    def value_info(self, value):
+        """
+        The cached information of a value.
+
+        :param value: The value
+        :type value: ZWaveValue, ValueInfo
+        :rtype: ValueInfo
+        """
+        if isinstance(value, CachedInfo):
+            return value
+
+        info = self._value_info.get(value.id, None)
+        if info is None or info.obj is not value:
+            info = self._value_info[value.id] = ValueInfo(value)
+        return info
+
+    @staticmethod
+    def _room_name(node):
+        try:
+            room = node.location
+        except AttributeError:
+            room = None
+
+        if not room:
+            room = 'No Room'
+        return room
+
     def load_tree(self):
         panel = Panel(self.splitter_window, None)
 
@@ -2001,6 +2165,12 @@ class AdminPanel(wx.Panel):
         self.options_panel = panel
 
         self.tree_ctrl.DeleteAllItems()
+        self._room_items.clear()
+        self._node_rooms.clear()
+        self._node_items.clear()
+        self._value_items.clear()
+        self._node_info.clear()
+        self._value_info.clear()
 
         root = self.tree_ctrl.AddRoot(self.network.name)
 
@@ -2009,36 +2179,29 @@ class AdminPanel(wx.Panel):
             dict(obj=self.network, panel=NetworkPanel)
         )
 
+        controller_node = self.node_info(self.network.controller.node)
         controller_room_id = self.tree_ctrl.AppendItem(
             root,
-            self.network.controller.node.location
+            controller_node.location
         )
         self.tree_ctrl.SetPyData(
             controller_room_id,
-            dict(obj=None, panel=Panel, nodes=[], controller=True)
-        )
-
-        controller_id = self.add_node(
-            controller_room_id,
-            self.network.controller.node
-        )
-        data = self.tree_ctrl.GetPyData(controller_id)
-        data['controller'] = True
-
-        self.tree_ctrl.SetPyData(
-            controller_id,
-            data
+            dict(
+                obj=None,
+                panel=Panel,
+                nodes=[],
+                loaded=False,
+                controller=True
+            )
         )
+        self.add_node(controller_room_id, controller_node)
 
+        # only the rooms are added, the nodes and values get added when
+        # their parent is expanded.
         rooms = {}
         for node in self.network.nodes.values():
-            try:
-                room = node.location
-            except AttributeError:
-                room = None
-
-            if not room:
-                room = 'No Room'
+            node = self.node_info(node)
+            room = self._room_name(node)
 
             if room not in rooms:
                 rooms[room] = []
@@ -2046,12 +2209,7 @@ class AdminPanel(wx.Panel):
             rooms[room] += [node]
 
         for room in sorted(rooms.keys()):
-            parent_id = self.tree_ctrl.AppendItem(root, room)
-
-            self.tree_ctrl.SetPyData(
-                parent_id,
-                dict(obj=None, panel=Panel, nodes=[])
-            )
+            parent_id = self.add_room(room)
 
             for node in rooms[room]:
                 self.add_node(parent_id, node)
@@ -2059,41 +2217,151 @@ class AdminPanel(wx.Panel):
         self.tree_ctrl.Expand(root)
         self.tree_ctrl.SelectItem(root)
 
+    def add_room(self, room):
+        parent_id = self.tree_ctrl.AppendItem(
+            self.tree_ctrl.GetRootItem(),
+            room
+        )
+        self.tree_ctrl.SetPyData(
+            parent_id,
+            dict(obj=None, panel=Panel, nodes=[], loaded=False)
+        )
+        self._room_items[room] = parent_id
+        return parent_id
+
     def add_node(self, parent_id, node):
+        """
+        Add a node to a room.
+
+        The item of the node only gets created if the children of the room
+        have been loaded.
+
+        :param parent_id: The item of the room
+        :type parent_id: wx.TreeItemId
+        :param node: The node to add
+        :type node: ZWaveNode, NodeInfo
+        :return: The item of the node, None if it has not been created.
+        :rtype: wx.TreeItemId or None
+        """
+        node = self.node_info(node)
+
+        data = self.tree_ctrl.GetPyData(parent_id)
+        data['nodes'] += [node]
+        self._node_rooms[node.id] = parent_id
+        self.tree_ctrl.SetItemHasChildren(parent_id, True)
+
+        if data['loaded']:
+            return self._append_node(parent_id, node)
+
+    def _append_node(self, parent_id, node):
         name = node.name
 
         if not name:
             name = node.object_id_str
 
-        data = self.tree_ctrl.GetPyData(parent_id)
-        data['nodes'] += [node]
+        child_id = self.tree_ctrl.AppendItem(parent_id, name)
+
+        data = dict(obj=node, panel=NodePanel, loaded=False)
+        if 'controller' in self.tree_ctrl.GetPyData(parent_id):
+            data['controller'] = True
+
+        self.tree_ctrl.SetPyData(child_id, data)
+        self.tree_ctrl.SetItemHasChildren(child_id, bool(node.values))
+        self._node_items[node.id] = child_id
+
+        return child_id
+
+    def _append_value(self, parent_id, value):
+        value = self.value_info(value)
+
+        label = value.label
+        if not label:
+            label = value.object_id_str
+
+        value_id = self.tree_ctrl.AppendItem(parent_id, label)
 
         self.tree_ctrl.SetPyData(
-            parent_id,
-            data
+            value_id,
+            dict(obj=value, panel=ValuePanel)
         )
+        self._value_items[value.id] = value_id
 
-        child_id = self.tree_ctrl.AppendItem(parent_id, name)
+        return value_id
 
-        self.tree_ctrl.SetPyData(
-            child_id,
-            dict(obj=node, panel=NodePanel)
+    def load_children(self, item_id):
+        """
+        Create the items of the nodes in a room or of the values of a node.
+        """
+        data = self.tree_ctrl.GetPyData(item_id)
+        if data is None or data.get('loaded', True):
+            return
+
+        data['loaded'] = True
+
+        if data['panel'] == NodePanel:
+            for value in data['obj'].values.values():
+                self._append_value(item_id, value)
+        else:
+            for node in data['nodes']:
+                self._append_node(item_id, node)
+
+    def on_item_expanding(self, evt):
+        self.load_children(evt.GetItem())
+        evt.Skip()
+
+    def _forget_values(self, item_id):
+        child_id, cookie = self.tree_ctrl.GetFirstChild(item_id)
+
+        while child_id.IsOk():
+            data = self.tree_ctrl.GetPyData(child_id)
+            if data is not None and data['panel'] == ValuePanel:
+                self._value_items.pop(data['obj'].id, None)
+            child_id, cookie = self.tree_ctrl.GetNextChild(item_id, cookie)
+
+    def _remove_from_room(self, room_id, item_id, node_id):
+        data = self.tree_ctrl.GetPyData(room_id)
+        data['nodes'] = list(
+            node for node in data['nodes'] if node.id != node_id
         )
 
-        for value in node.values.values():
+        if item_id is not None:
+            self._forget_values(item_id)
+            self.tree_ctrl.Delete(item_id)
 
-            label = value.label
-            if not label:
-                label = value.object_id_str
+        if not data['nodes']:
+            for room, room_id_ in self._room_items.items():
+                if room_id_ == room_id:
+                    del self._room_items[room]
 
-            value_id = self.tree_ctrl.AppendItem(child_id, label)
+            self.tree_ctrl.Delete(room_id)
 
-            self.tree_ctrl.SetPyData(
-                value_id,
-                dict(obj=value, panel=ValuePanel)
-            )
+    def remove_node_item(self, node_id):
+        """
+        Remove a node from the tree, the room is removed when the node was
+        the last one in it.
+        """
+        room_id = self._node_rooms.pop(node_id, None)
+        item_id = self._node_items.pop(node_id, None)
 
-        return child_id
+        if room_id is not None:
+            self._remove_from_room(room_id, item_id, node_id)
+
+        self._node_info.pop(node_id, None)
+
+    def show_network_panel(self):
+        root = self.tree_ctrl.GetRootItem()
+        data = self.tree_ctrl.GetPyData(root)
+        obj = data['obj']
+        panel = data['panel']
+        panel = panel(self.splitter_window, obj)
+        self.options_panel.Hide()
+        self.splitter_window.ReplaceWindow(
+            self.options_panel,
+            panel
+        )
+        self.options_panel.Destroy()
+        self.options_panel = panel
+        self.tree_ctrl.SelectItem(root)
 
     def on_selection_changed(self, _):
         item_id = self.tree_ctrl.GetSelection()
@@ -2119,90 +2387,187 @@ class AdminPanel(wx.Panel):
             self.options_panel.Destroy()
             self.options_panel = panel
 
-    def signal_add_node(self, network, node, node_id, **_):
-        if network != self.network:
-            return
+    def on_show(self, evt):
+        if evt.GetShow():
+            self.ui_bridge.resume()
+        else:
+            self.ui_bridge.pause()
+        evt.Skip()
 
-        root = self.tree_ctrl.GetRootItem()
+    def on_iconize(self, evt):
+        if evt.Iconized():
+            self.ui_bridge.pause()
+        else:
+            self.ui_bridge.resume()
+        evt.Skip()
 
-        nodes = {}
-        self.get_nodes(root, nodes)
+    def on_ui_changes(self, changes):
+        """
+        Apply the changes collected by the ui bridge to the tree.
 
-        for tree_node in nodes.keys():
-            if node_id == tree_node.id:
-                return
+        :param changes: [(key, action, args), ...]
+        :type changes: list
+        """
+        if not self:
+            return
 
+        self.tree_ctrl.Freeze()
         try:
-            room = node.location
-        except AttributeError:
-            room = None
+            for _, action, args in changes:
+                getattr(self, '_' + action)(*args)
+        finally:
+            self.tree_ctrl.Thaw()
+
+    # the signals come from the thread of the manager, the changes are
+    # posted to the ui bridge and applied to the tree on the wx thread.
+
+    def signal_add_node(self, network=None, node=None, node_id=None, **_):
+        if network == self.network and node is not None:
+            self.ui_bridge.post(('node', node.id), 'add_node', node)
+
+    def _add_node(self, node):
+        if node.id in self._node_rooms:
+            info = self._node_info.get(node.id, None)
+            if info is not None and info.obj is node:
+                return
 
-        if not room:
-            room = 'No Room'
+            # the node was removed and added again before the remove got
+            # applied.
+            self._remove_node(node.id)
 
-        child_id, cookie = self.tree_ctrl.GetFirstChild(root)
+        node = self.node_info(node)
+        room = self._room_name(node)
 
-        while child_id.IsOk():
-            room_name = self.tree_ctrl.GetItemText(child_id)
-            if room_name == room:
-                child_id = self.add_node(child_id, node)
-                self.tree_ctrl.SelectItem(child_id)
-                return
-            child_id, cookie = self.tree_ctrl.GetNextChild(child_id, cookie)
+        parent_id = self._room_items.get(room, None)
+        if parent_id is None:
+            parent_id = self.add_room(room)
 
-        parent_id = self.tree_ctrl.AppendItem(root, room)
+        child_id = self.add_node(parent_id, node)
+        if child_id is not None:
+            self.tree_ctrl.SelectItem(child_id)
 
-        self.tree_ctrl.SetPyData(
-            parent_id,
-            dict(obj=None, panel=Panel, nodes=[])
-        )
+    def signal_remove_node(self, network=None, node_id=None, **_):
+        if network == self.network:
+            self.ui_bridge.post(('node', node_id), 'remove_node', node_id)
 
-        self.add_node(parent_id, node)
+    def _remove_node(self, node_id):
+        if node_id not in self._node_rooms:
+            return
 
-    def get_nodes(self, parent_id, nodes):
-        child_id, cookie = self.tree_ctrl.GetFirstChild(parent_id)
+        item_id = self._node_items.get(node_id, None)
+        if item_id is not None:
+            selection = self.tree_ctrl.GetSelection()
+            if selection.IsOk() and (
+                selection == item_id or
+                self.tree_ctrl.GetItemParent(selection) == item_id
+            ):
+                self.show_network_panel()
 
-        while child_id.IsOk():
-            data = self.tree_ctrl.GetPyData(child_id)
+        self.remove_node_item(node_id)
 
-            if data['panel'] == NodePanel:
-                nodes[data['obj']] = child_id
+    def signal_node_naming(self, network=None, node_id=None, **_):
+        if network == self.network:
+            self.ui_bridge.post(
+                ('node', node_id),
+                'node_naming',
+                node_id,
+                weak=True
+            )
+
+    def _node_naming(self, node_id):
+        node = self._node_info.get(node_id, None)
+        if node is None:
+            return
+
+        node.invalidate()
+
+        item_id = self._node_items.get(node_id, None)
+        if item_id is not None:
+            name = node.name
+            if not name:
+                name = node.object_id_str
+            self.tree_ctrl.SetItemText(item_id, name)
+
+        room_id = self._node_rooms.get(node_id, None)
+        if room_id is None:
+            return
+
+        room = self._room_name(node)
+        if 'controller' in self.tree_ctrl.GetPyData(room_id):
+            self.tree_ctrl.SetItemText(room_id, room)
+        elif self.tree_ctrl.GetItemText(room_id) != room:
+            self.move_location(node, room)
+
+    def signal_add_value(self, network=None, node_id=None, value=None, **_):
+        if network == self.network and value is not None:
+            self.ui_bridge.post(
+                ('value', value.id),
+                'add_value',
+                node_id,
+                value
+            )
+
+    def _add_value(self, node_id, value):
+        if value.id in self._value_items:
+            return
+
+        item_id = self._node_items.get(node_id, None)
+        if item_id is None:
+            return
+
+        self.tree_ctrl.SetItemHasChildren(item_id, True)
+        if self.tree_ctrl.GetPyData(item_id)['loaded']:
+            self._append_value(item_id, value)
+
+    def signal_remove_value(self, network=None, id=None, **_):
+        if network == self.network:
+            self.ui_bridge.post(('value', id), 'remove_value', id)
+
+    def _remove_value(self, value_id):
+        self._value_info.pop(value_id, None)
+        item_id = self._value_items.pop(value_id, None)
+        if item_id is None:
+            return
 
-            elif self.tree_ctrl.ItemHasChildren(child_id):
-                self.get_nodes(child_id, nodes)
+        if self.tree_ctrl.GetSelection() == item_id:
+            self.tree_ctrl.SelectItem(self.tree_ctrl.GetItemParent(item_id))
 
-            child_id, cookie = self.tree_ctrl.GetNextChild(child_id, cookie)
+        self.tree_ctrl.Delete(item_id)
 
-    def signal_remove_node(self, network, node_id, **_):
+    def signal_value_changed(
+        self,
+        network=None,
+        value_id=None,
+        changed_values=(),
+        refreshed_values=(),
+        **_
+    ):
         if network != self.network:
             return
-        root = self.tree_ctrl.GetRootItem()
 
-        nodes = {}
-        self.get_nodes(root, nodes)
-
-        for node in nodes.keys():
-            if node_id == node.id:
-                item_id = nodes.pop(node)
-                if self.tree_ctrl.GetSelection() == item_id:
-                    data = self.tree_ctrl.GetPyData(root)
-                    obj = data['obj']
-                    panel = data['panel']
-                    panel = panel(self.splitter_window, obj)
-                    self.options_panel.Hide()
-                    self.splitter_window.ReplaceWindow(
-                        self.options_panel,
-                        panel
-                    )
-                    self.options_panel.Destroy()
-                    self.options_panel = panel
-                    self.tree_ctrl.SelectItem(root)
+        info = self._value_info.get(value_id, None)
+        if info is None:
+            return
 
-                if self.clear_node_from_room(item_id, node):
-                    self.tree_ctrl.DeleteChildren(item_id)
-                    self.tree_ctrl.Delete(item_id)
+        info.invalidate()
+        if 'label' in changed_values or 'label' in refreshed_values:
+            self.ui_bridge.post(
+                ('value', value_id),
+                'value_label',
+                value_id,
+                weak=True
+            )
 
-                break
+    def _value_label(self, value_id):
+        info = self._value_info.get(value_id, None)
+        item_id = self._value_items.get(value_id, None)
+        if info is None or item_id is None:
+            return
+
+        label = info.label
+        if not label:
+            label = info.object_id_str
+        self.tree_ctrl.SetItemText(item_id, label)
 
     def on_add_node(self, _):
         # places controller into add mode.
@@ -2215,27 +2580,12 @@ class AdminPanel(wx.Panel):
     def on_remove_failed_node(self, _):
         item_id = self.tree_ctrl.GetSelection()
         if item_id.IsOk():
-            root = self.tree_ctrl.GetRootItem()
             node = self.tree_ctrl.GetPyData(item_id)['obj']
             # removes failed node
-            data = self.tree_ctrl.GetPyData(root)
-            obj = data['obj']
-            panel = data['panel']
-            panel = panel(self.splitter_window, obj)
-            self.options_panel.Hide()
-            self.splitter_window.ReplaceWindow(
-                self.options_panel,
-                panel
-            )
-            self.options_panel.Destroy()
-            self.options_panel = panel
-            self.tree_ctrl.SelectItem(root)
+            self.show_network_panel()
 
             self.network.controller.remove_failed_node(node.id)
-
-            if self.clear_node_from_room(item_id, node):
-                self.tree_ctrl.DeleteChildren(item_id)
-                self.tree_ctrl.Delete(item_id)
+            self.remove_node_item(node.id)
 
     def on_factory_reset(self, _):
         # Factory resets controller
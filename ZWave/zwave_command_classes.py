@@ -16,9 +16,7 @@
 # You should have received a copy of the GNU General Public License along
 # with EventGhost. If not, see <http://www.gnu.org/licenses/>.
 
-
-import threading
-import time
+import re
 
 
 # ------------- ACTIVE -------------
@@ -687,11 +685,273 @@ def print_not_implemented(*_): # cmd_cls, device):
     pass
 
 
+def value_name(label):
+    """
+    The attribute name of a value label, 'Test Powerlevel' is
+    'test_powerlevel'.
+
+    :param label: The label of a value
+    :type label: str
+    :rtype: str
+    """
+    return re.sub(r'\W+', '_', label.strip().lower()).strip('_')
+
+
+class ValueAccessor(object):
+    """
+    Attribute of a command class that reads and writes the data of one of
+    the node's values.
+
+    The value is declared by command class and label or index. The
+    accessors of all the command classes of a node are gathered once when
+    the node class is composed, and an accessor is bound to its value when
+    the value is added to the node. Reading or writing the attribute is a
+    single lookup in the node's value slots.
+
+    A getter and setter can be added like a property, they are passed the
+    bound value.
+
+        level = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Level')
+
+        @level.setter
+        def level(self, value, data):
+            value.data = min(data, 99)
+    """
+
+    def __init__(
+        self,
+        command_class,
+        label=None,
+        index=None,
+        instance=None,
+        read_only=False,
+        fget=None,
+        fset=None
+    ):
+        """
+        :param command_class: The command class of the value
+        :type command_class: int
+        :param label: The label of the value
+        :type label: str, None
+        :param index: The index of the value
+        :type index: int, None
+        :param instance: The instance of the value. Defaults to the lowest
+        instance.
+        :type instance: int, None
+        :param read_only: Do not allow setting the attribute
+        :type read_only: bool
+        """
+        self.command_class = command_class
+        self.label = label
+        self.index = index
+        self.instance = instance
+        self.read_only = read_only
+        self.fget = fget
+        self.fset = fset
+        self.name = None
+
+    def __repr__(self):
+        return '<ValueAccessor %s: %s %r>' % (
+            self.name,
+            self.command_class,
+            self.label if self.index is None else self.index
+        )
+
+    def _copy(self, **kwargs):
+        params = dict(
+            command_class=self.command_class,
+            label=self.label,
+            index=self.index,
+            instance=self.instance,
+            read_only=self.read_only,
+            fget=self.fget,
+            fset=self.fset
+        )
+        params.update(kwargs)
+        return type(self)(**params)
+
+    def getter(self, fget):
+        return self._copy(fget=fget)
+
+    def setter(self, fset):
+        return self._copy(fset=fset, read_only=False)
+
+    def matches(self, value):
+        if self.label is not None and value.label != self.label:
+            return False
+        if self.index is not None and value.index != self.index:
+            return False
+        if self.instance is not None and value.instance != self.instance:
+            return False
+        return True
+
+    def bind(self, node, value):
+        bound = node._value_slots.get(self.name, None)
+        if bound is None or bound.instance > value.instance:
+            node._value_slots[self.name] = value
+
+    def unbind(self, node, value):
+        if node._value_slots.get(self.name, None) is not value:
+            return
+
+        del node._value_slots[self.name]
+        for val in node.values:
+            if (
+                val is not value and
+                val.command_class == self.command_class and
+                self.matches(val)
+            ):
+                self.bind(node, val)
+
+    def __get__(self, node, cls=None):
+        if node is None:
+            return self
+
+        try:
+            value = node._value_slots[self.name]
+        except KeyError:
+            return None
+
+        if self.fget is None:
+            return value.data
+        return self.fget(node, value)
+
+    def __set__(self, node, data):
+        if self.read_only:
+            raise AttributeError(self.name + ' is read only')
+
+        try:
+            value = node._value_slots[self.name]
+        except KeyError:
+            return
+
+        if self.fset is None:
+            value.data = data
+        else:
+            self.fset(node, value, data)
+
+
+class ValueGroup(object):
+    """
+    The values of a command class, as attributes named after their
+    labels.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, '_values', {})
+
+    def add(self, value):
+        self._values[value_name(value.label)] = value
+
+    def remove(self, value):
+        for name, val in self._values.items():
+            if val is value:
+                del self._values[name]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, item):
+        return item in self._values
+
+    def __iter__(self):
+        for value in sorted(self._values.values(), key=lambda v: v.id):
+            yield value
+
+    def __getattr__(self, item):
+        try:
+            return self._values[item].data
+        except KeyError:
+            raise AttributeError(item)
+
+    def __setattr__(self, key, data):
+        try:
+            value = self._values[key]
+        except KeyError:
+            raise AttributeError(key)
+
+        if value.is_read_only:
+            raise AttributeError(key + ' is read only')
+        value.data = data
+
+
+class ValueGroupAccessor(ValueAccessor):
+    """
+    Attribute of a command class holding all of the node's values of that
+    command class as a ValueGroup. The attribute is None when the node has
+    no values of the command class.
+    """
+
+    def __init__(self, command_class, genre=None):
+        ValueAccessor.__init__(self, command_class, read_only=True)
+        self.genre = genre
+
+    def matches(self, value):
+        return self.genre is None or value.genre == self.genre
+
+    def bind(self, node, value):
+        group = node._value_slots.get(self.name, None)
+        if group is None:
+            group = node._value_slots[self.name] = ValueGroup()
+        group.add(value)
+
+    def unbind(self, node, value):
+        group = node._value_slots.get(self.name, None)
+        if group is not None:
+            group.remove(value)
+            if not len(group):
+                del node._value_slots[self.name]
+
+    def __get__(self, node, cls=None):
+        if node is None:
+            return self
+        return node._value_slots.get(self.name, None)
+
+
+class CommandClassMeta(type):
+    """
+    Names the value accessors of a class and gathers the accessors of the
+    class and its bases into a table keyed by command class.
+
+    The node classes are composed from ZWaveNode and the command classes
+    of the node, so the table of a node class has every accessor of the
+    node and binding a value is a dict lookup by its command class.
+    """
+
+    def __init__(cls, name, bases, dct):
+        type.__init__(cls, name, bases, dct)
+
+        accessors = {}
+        for klass in reversed(cls.__mro__):
+            for attr_name, attr in vars(klass).items():
+                if isinstance(attr, ValueAccessor):
+                    attr.name = attr_name
+                    accessors[attr_name] = attr
+
+        table = {}
+        for attr_name in sorted(accessors.keys()):
+            accessor = accessors[attr_name]
+            table.setdefault(accessor.command_class, []).append(accessor)
+
+        cls._value_accessors = table
+
+
 class CommandClassBase(object):
+    __metaclass__ = CommandClassMeta
 
     def __init__(self):
         self.values = {}
 
+    def bound_value(self, name):
+        """
+        The value a value accessor is bound to.
+
+        :param name: The attribute name of the accessor
+        :type name: str
+        :rtype: ZWaveValue or None
+        """
+        return self._value_slots.get(name, None)
+
 
 class Alarm(CommandClassBase):
 
@@ -857,6 +1117,12 @@ class Battery(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_BATTERY]
 
+    battery_level = ValueAccessor(
+        COMMAND_CLASS_BATTERY,
+        'Battery Level',
+        read_only=True
+    )
+
     @property
     def batteries(self):
         res = []
@@ -934,6 +1200,22 @@ class Configuration(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_CONFIGURATION]
 
+    @property
+    def config_profile(self):
+        """
+        The configuration profile of the product of the node.
+
+        :return: {parameter index: value} or None
+        :rtype: dict or None
+        """
+        return self._network.config_profiles.profile(self.product_key)
+
+    def apply_config_profile(self, parameters=None):
+        """
+        See ZWaveConfigProfiles.apply
+        """
+        return self._network.config_profiles.apply(self, parameters)
+
     @property
     def settings(self):
         res = []
@@ -1050,24 +1332,7 @@ class DoorLock(CommandClassBase):
         self._cls_ids += [COMMAND_CLASS_DOOR_LOCK]
         print_not_implemented('COMMAND_CLASS_DOOR_LOCK', self)
 
-    @property
-    def status(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_DOOR_LOCK and
-                value.label == 'Status'
-            ):
-                return value.data
-
-    @status.setter
-    def status(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_DOOR_LOCK and
-                val.label == 'Status'
-            ):
-                val.data = value
-                break
+    status = ValueAccessor(COMMAND_CLASS_DOOR_LOCK, 'Status')
 
 
 class DoorLockLogging(CommandClassBase):
@@ -1260,53 +1525,7 @@ class Indicator(CommandClassBase):
         self._cls_ids += [COMMAND_CLASS_INDICATOR]
         print_not_implemented('COMMAND_CLASS_INDICATOR', self)
 
-    @property
-    def indicators(self):
-        indicators = list(
-            value for value in self.values.values()
-            if value == COMMAND_CLASS_INDICATOR
-        )
-        if indicators:
-            return self.Indicators(indicators)
-
-
-    class Indicators(object):
-
-        def __init__(self, indicators):
-            self._indicators = indicators
-
-        def __contains__(self, item):
-            return hasattr(self, item)
-
-        def __iter__(self):
-            for indicator in self._indicators:
-                yield indicator
-
-        def __getattr__(self, item):
-            if item in self.__dict__:
-                return self.__dict__[item]
-
-            label = item.replace('_', ' ').title()
-            for indicator in self._indicators:
-                if label == indicator.label:
-                    return indicator.data
-
-            raise AttributeError(item)
-
-        def __setattr__(self, key, value):
-            if key.startswith('_'):
-                object.__setattr__(self, key, value)
-            else:
-                if key in self:
-                    label = key.replace('_', ' ').title()
-                    for indicator in self._indicators:
-                        if (
-                            indicator.label == label and
-                            not indicator.readonly
-                        ):
-                            indicator.data = value
-                else:
-                    raise AttributeError(key)
+    indicators = ValueGroupAccessor(COMMAND_CLASS_INDICATOR)
 
 
 class IpAssociation(CommandClassBase):
@@ -1442,6 +1661,17 @@ class Meter(CommandClassBase):
                 res += [self.Meter(value)]
         return res
 
+    def energy(self, start=None, end=None):
+        """
+        The energy used by the node from start to end.
+
+        See ZWaveEnergy.report for the fields.
+
+        :rtype: dict or None
+        """
+        report = self._network.energy.report(start, end, [self])
+        return report['nodes'].get(self.id, None)
+
 
     class Meter(object):
 
@@ -1452,6 +1682,14 @@ class Meter(CommandClassBase):
         def value(self):
             return self._sensor.data
 
+        @property
+        def kind(self):
+            """
+            'energy' for a kWh counter, 'power' for a W reading or None.
+            """
+            import zwave_energy
+            return zwave_energy.meter_kind(self._sensor)
+
         def __getattr__(self, item):
             if item in self.__dict__:
                 return self.__dict__[item]
@@ -1683,58 +1921,28 @@ class Powerlevel(CommandClassBase):
         self._cls_ids += [COMMAND_CLASS_POWERLEVEL]
         print_not_implemented('COMMAND_CLASS_POWERLEVEL', self)
 
-    @property
-    def power_level(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_POWERLEVEL and
-                value.label == 'Test Powerlevel'
-            ):
-                return value.data
-
-    @power_level.setter
-    def power_level(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_POWERLEVEL and
-                val.label == 'Powerlevel'
-            ):
-                val.data = value
+    power_level = ValueAccessor(COMMAND_CLASS_POWERLEVEL, 'Powerlevel')
+    acked_frames = ValueAccessor(
+        COMMAND_CLASS_POWERLEVEL,
+        'Acked Frames',
+        read_only=True
+    )
+    frame_count = ValueAccessor(
+        COMMAND_CLASS_POWERLEVEL,
+        'Frame Count',
+        read_only=True
+    )
+    _test_power_level = ValueAccessor(
+        COMMAND_CLASS_POWERLEVEL,
+        'Test Powerlevel'
+    )
+    _test_node = ValueAccessor(COMMAND_CLASS_POWERLEVEL, 'Test Node')
 
     def test_power_level(self, db):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_POWERLEVEL and
-                value.label == 'Test Powerlevel'
-            ):
-                value.data = db
-                break
+        self._test_power_level = db
 
     def test_node(self):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_POWERLEVEL and
-                val.label == 'Test Node'
-            ):
-                val.data = 1
-
-    @property
-    def acked_frames(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_POWERLEVEL and
-                value.label == 'Acked Frames'
-            ):
-                return value.data
-
-    @property
-    def frame_count(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_POWERLEVEL and
-                value.label == 'Frame Count'
-            ):
-                return value.data
+        self._test_node = 1
 
 
 class Prepayment(CommandClassBase):
@@ -2163,53 +2371,7 @@ class SwitchAll(CommandClassBase):
         self._cls_ids += [COMMAND_CLASS_SWITCH_ALL]
         print_not_implemented('COMMAND_CLASS_SWITCH_ALL', self)
 
-    @property
-    def switch_all(self):
-        switch_all = list(
-            value for value in self.values.values()
-            if value == COMMAND_CLASS_SWITCH_ALL
-        )
-        if switch_all:
-            return self.SwitchAll(switch_all)
-
-
-    class SwitchAll(object):
-
-        def __init__(self, switch_all):
-            self._switch_all = switch_all
-
-        def __contains__(self, item):
-            return hasattr(self, item)
-
-        def __iter__(self):
-            for switch in self._switch_all:
-                yield switch
-
-        def __getattr__(self, item):
-            if item in self.__dict__:
-                return self.__dict__[item]
-
-            label = item.replace('_', ' ').title()
-            for switch in self._switch_all:
-                if label == switch.label:
-                    return switch.data
-
-            raise AttributeError(item)
-
-        def __setattr__(self, key, value):
-            if key.startswith('_'):
-                object.__setattr__(self, key, value)
-            else:
-                if key in self:
-                    label = key.replace('_', ' ').title()
-                    for switch in self._switch_all:
-                        if (
-                            switch.label == label and
-                            not switch.readonly
-                        ):
-                            switch.data = value
-                else:
-                    raise AttributeError(key)
+    switch_all = ValueGroupAccessor(COMMAND_CLASS_SWITCH_ALL)
 
 
 class SwitchBinary(CommandClassBase):
@@ -2223,24 +2385,7 @@ class SwitchBinary(CommandClassBase):
         self._cls_ids += [COMMAND_CLASS_SWITCH_BINARY]
         print_not_implemented('COMMAND_CLASS_SWITCH_BINARY', self)
 
-    @property
-    def status(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_BINARY and
-                value.label == 'Status'
-            ):
-                return value.data
-
-    @status.setter
-    def status(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_SWITCH_BINARY and
-                val.label == 'Status'
-            ):
-                    val.data = value
-                    break
+    status = ValueAccessor(COMMAND_CLASS_SWITCH_BINARY, 'Status')
 
 
 class SwitchColor(CommandClassBase):
@@ -2254,18 +2399,17 @@ class SwitchColor(CommandClassBase):
         self._cls_ids += [COMMAND_CLASS_SWITCH_COLOR]
         print_not_implemented('COMMAND_CLASS_SWITCH_COLOR', self)
 
-    @property
-    def color(self):
-        for value in self.values.values():
-            if value == COMMAND_CLASS_SWITCH_COLOR:
-                return value.data
+    color = ValueAccessor(COMMAND_CLASS_SWITCH_COLOR, 'Color')
 
     @color.setter
-    def color(self, value):
-        for val in self.values.values():
-            if val == COMMAND_CLASS_SWITCH_COLOR:
-                val.data = value
-                break
+    def color(self, value, data):
+        self._network.ramp_scheduler.cancel(value)
+        value.data = data
+
+    def fade_color(self, color, duration=1.0):
+        value = self.bound_value('color')
+        if value is not None:
+            self._network.ramp_scheduler.fade_color(value, color, duration)
 
 
 class SwitchMultilevel(CommandClassBase):
@@ -2278,212 +2422,87 @@ class SwitchMultilevel(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_SWITCH_MULTILEVEL]
         print_not_implemented('COMMAND_CLASS_SWITCH_MULTILEVEL', self)
-        self._ramping_event = threading.Event()
-        self._ramping_lock = threading.Lock()
-
-    @property
-    def status(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Level'
-            ):
-                return value.data > value.min
 
-    @status.setter
+    status = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Level')
+    level = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Level')
+    start_level = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Start Level')
+    ignore_start_level = ValueAccessor(
+        COMMAND_CLASS_SWITCH_MULTILEVEL,
+        'Ignore Start Level'
+    )
+    _bright = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Bright')
+    _dim = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Dim')
+
+    @status.getter
     def status(self, value):
-        value = bool(value)
-        for val in self.values.values():
-            if val == COMMAND_CLASS_SWITCH_MULTILEVEL:
-                if val.label == 'Bright' and value:
-                    val.data = value
-                    break
-                elif val.label == 'Dim' and value:
-                    val.data = value
-                    break
-        else:
-            for val in self.values.values():
-                if (
-                    val == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                    val.label == 'Level'
-                ):
-                    if value and val.data == val.min:
-                        val.data = val.max
-                    elif not value and val.data > val.min:
-                        val.data = val.min
-                    break
-
-    def ramp_up(self, level, speed=0.17, step=1):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Level'
-            ):
-                break
-        else:
-            return
+        return value.data > value.min
 
-        self._ramping_event.set()
-
-        def do(val, stp, spd, lvl):
-            with self._ramping_lock:
-                self._ramping_event.clear()
-
-                while not self._ramping_event.isSet():
+    @status.setter
+    def status(self, value, data):
+        if data:
+            for name in ('_bright', '_dim'):
+                val = self.bound_value(name)
+                if val is not None:
+                    val.data = True
+                    return
 
-                    new_level = val.data + stp
-                    start = time.time()
+            if value.data == value.min:
+                value.data = value.max
 
-                    with val as event:
-                        val.data = new_level
-                        event.wait(spd)
+        elif value.data > value.min:
+            value.data = value.min
 
-                    if val.data >= lvl:
-                        break
+    @level.setter
+    def level(self, value, data):
+        if 99 >= data >= 0 or data == 255:
+            self._network.ramp_scheduler.cancel(value)
+            value.data = data
+        else:
+            raise ValueError(
+                'Value {0} not within range {1} - {2}'.format(
+                    data,
+                    value.min,
+                    value.max
+                )
+            )
 
-                    stop = time.time()
+    @start_level.setter
+    def start_level(self, value, data):
+        if value.max >= data >= value.min:
+            value.data = data
+        else:
+            raise ValueError(
+                'Value {0} not within range {1} - {2}'.format(
+                    data,
+                    value.min,
+                    value.max
+                )
+            )
 
-                    finish = (stop - start) * 1000
-                    if finish < spd * 1000:
-                        self._ramping_event.wait(
-                            ((spd * 1000) - finish) / 1000)
+    def ramp_up(self, level, speed=0.17, step=1):
+        value = self.bound_value('level')
+        if value is None or value.data >= level:
+            return
 
-        t = threading.Thread(target=do, args=(value, step, speed, level))
-        t.daemon = True
-        t.start()
+        self._network.ramp_scheduler.ramp(value, level, speed, step)
 
     def ramp_down(self, level, speed=0.17, step=1):
-
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Level'
-            ):
-                break
-        else:
+        value = self.bound_value('level')
+        if value is None or value.data <= level:
             return
 
-        self._ramping_event.set()
-
-        def do(val, stp, spd, lvl):
-            with self._ramping_lock:
-                self._ramping_event.clear()
-
-                while not self._ramping_event.isSet():
-
-                    new_level = val.data - stp
-                    start = time.time()
-
-                    with val as event:
-                        val.data = new_level
-                        event.wait(spd)
-
-                    if val.data <= lvl:
-                        break
-
-                    stop = time.time()
+        self._network.ramp_scheduler.ramp(value, level, speed, step)
 
-                    finish = (stop - start) * 1000
-                    if finish < spd * 1000:
-                        self._ramping_event.wait(
-                            ((spd * 1000) - finish) / 1000)
-
-        t = threading.Thread(target=do, args=(value, step, speed, level))
-        t.daemon = True
-        t.start()
+    def stop_ramp(self):
+        value = self.bound_value('level')
+        if value is not None:
+            self._network.ramp_scheduler.cancel(value)
 
     def bright(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Bright'
-            ):
-                value.data = True
-                break
+        self._bright = True
 
     def dim(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Dim'
-            ):
-                value.data = True
-                break
-
-    @property
-    def level(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Level'
-            ):
-                return value.data
-
-    @level.setter
-    def level(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                val.label == 'Level'
-            ):
-                if 99 >= value >= 0 or value == 255:
-                    val.data = value
-                    break
-                else:
-                    raise ValueError(
-                        'Value {0} not within range {1} - {2}'.format(
-                            value,
-                            val.min,
-                            val.max
-                        )
-                    )
-
-    @property
-    def start_level(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Start Level'
-            ):
-                return value.data
-
-    @start_level.setter
-    def start_level(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                val.label == 'Start Level'
-            ):
-                if val.max >= value >= val.min:
-                    val.data = value
-                    break
-                else:
-                    raise ValueError(
-                        'Value {0} not within range {1} - {2}'.format(
-                            value,
-                            val.min,
-                            val.max
-                        )
-                    )
-
-    @property
-    def ignore_start_level(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Ignore Start Level'
-            ):
-                return value.data
-
-    @ignore_start_level.setter
-    def ignore_start_level(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                val.label == 'Ignore Start Level'
-            ):
-                val.data = value
-                break
+        self._dim = True
 
 
 class SwitchToggleBinary(CommandClassBase):
@@ -2500,14 +2519,12 @@ class SwitchToggleBinary(CommandClassBase):
             self
         )
 
+    _status = ValueAccessor(COMMAND_CLASS_SWITCH_BINARY, 'Status')
+
     def toggle(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_BINARY and
-                value.label == 'Status'
-            ):
-                value.data = ~value.data
-                return
+        value = self.bound_value('_status')
+        if value is not None:
+            value.data = not value.data
 
     def toggle_all(self):
         if COMMAND_CLASS_MULTI_CHANNEL in self._cls_ids:
@@ -2516,7 +2533,7 @@ class SwitchToggleBinary(CommandClassBase):
                     value == COMMAND_CLASS_SWITCH_BINARY and
                     value.label == 'Status'
                 ):
-                    value.data = ~value.data
+                    value.data = not value.data
 
 
 class SwitchToggleMultilevel(CommandClassBase):
@@ -2533,17 +2550,15 @@ class SwitchToggleMultilevel(CommandClassBase):
             self
         )
 
+    _level = ValueAccessor(COMMAND_CLASS_SWITCH_MULTILEVEL, 'Level')
+
     def toggle(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_SWITCH_MULTILEVEL and
-                value.label == 'Level'
-            ):
-                if value.data > value.min:
-                    value.data = value.min
-                else:
-                    value.data = value.max
-                return
+        value = self.bound_value('_level')
+        if value is not None:
+            if value.data > value.min:
+                value.data = value.min
+            else:
+                value.data = value.max
 
     def toggle_all(self):
         if COMMAND_CLASS_MULTI_CHANNEL in self._cls_ids:
@@ -2592,23 +2607,7 @@ class ThermostatFanMode(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_THERMOSTAT_FAN_MODE]
 
-    @property
-    def fan_mode(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_THERMOSTAT_FAN_MODE and
-                value.label == 'Fan Mode'
-            ):
-                return value.data
-
-    @fan_mode.setter
-    def fan_mode(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_THERMOSTAT_FAN_MODE and
-                val.label == 'Fan Mode'
-            ):
-                val.data = value
+    fan_mode = ValueAccessor(COMMAND_CLASS_THERMOSTAT_FAN_MODE, 'Fan Mode')
 
 
 class ThermostatFanState(CommandClassBase):
@@ -2621,14 +2620,11 @@ class ThermostatFanState(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_THERMOSTAT_FAN_STATE]
 
-    @property
-    def fan_state(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_THERMOSTAT_FAN_STATE and
-                value.label == 'Fan State'
-            ):
-                return value.data
+    fan_state = ValueAccessor(
+        COMMAND_CLASS_THERMOSTAT_FAN_STATE,
+        'Fan State',
+        read_only=True
+    )
 
 
 class ThermostatMode(CommandClassBase):
@@ -2641,23 +2637,7 @@ class ThermostatMode(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_THERMOSTAT_MODE]
 
-    @property
-    def operating_mode(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_THERMOSTAT_MODE
-                and value.label == 'Mode'
-            ):
-                return value.data
-
-    @operating_mode.setter
-    def operating_mode(self, value):
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_THERMOSTAT_MODE
-                and val.label == 'Mode'
-            ):
-                val.data = value
+    operating_mode = ValueAccessor(COMMAND_CLASS_THERMOSTAT_MODE, 'Mode')
 
 
 class ThermostatOperatingState(CommandClassBase):
@@ -2670,14 +2650,11 @@ class ThermostatOperatingState(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_THERMOSTAT_OPERATING_STATE]
 
-    @property
-    def operating_state(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_THERMOSTAT_OPERATING_STATE
-                and value.label == 'Operating State'
-            ):
-                return value.data
+    operating_state = ValueAccessor(
+        COMMAND_CLASS_THERMOSTAT_OPERATING_STATE,
+        'Operating State',
+        read_only=True
+    )
 
 
 class ThermostatSetback(CommandClassBase):
@@ -2702,43 +2679,14 @@ class ThermostatSetpoint(CommandClassBase):
 
         self._cls_ids += [COMMAND_CLASS_THERMOSTAT_SETPOINT]
 
-    @property
-    def heat_setpoint(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_THERMOSTAT_SETPOINT and
-                value.label == 'Heating 1'
-            ):
-                return value.data
-
-    @heat_setpoint.setter
-    def heat_setpoint(self, value):
-
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_THERMOSTAT_SETPOINT and
-                val.label == 'Heating 1'
-            ):
-                val.data = value
-
-    @property
-    def cool_setpoint(self):
-        for value in self.values.values():
-            if (
-                value == COMMAND_CLASS_THERMOSTAT_SETPOINT and
-                value.label == 'Cooling 1'
-            ):
-                return value.data
-
-    @cool_setpoint.setter
-    def cool_setpoint(self, value):
-
-        for val in self.values.values():
-            if (
-                val == COMMAND_CLASS_THERMOSTAT_SETPOINT and
-                val.label == 'Cooling 1'
-            ):
-                val.data = value
+    heat_setpoint = ValueAccessor(
+        COMMAND_CLASS_THERMOSTAT_SETPOINT,
+        'Heating 1'
+    )
+    cool_setpoint = ValueAccessor(
+        COMMAND_CLASS_THERMOSTAT_SETPOINT,
+        'Cooling 1'
+    )
 
 
 class Time(CommandClassBase):
@@ -2813,7 +2761,27 @@ class WakeUp(CommandClassBase):
             self._cls_ids = []
 
         self._cls_ids += [COMMAND_CLASS_WAKE_UP]
-        print_not_implemented('COMMAND_CLASS_WAKE_UP', self)
+
+    wake_up_interval = ValueAccessor(COMMAND_CLASS_WAKE_UP, 'Wake-up Interval')
+
+    @property
+    def next_wake_up(self):
+        """
+        When the node is expected to wake up next.
+
+        :return: A timestamp or None if it is not known yet
+        :rtype: float or None
+        """
+        return self._network.wake_up_scheduler.next_wake_up(self.id)
+
+    @property
+    def battery_forecast(self):
+        """
+        See ZWaveWakeUpScheduler.battery_forecast
+
+        :rtype: dict or None
+        """
+        return self._network.wake_up_scheduler.battery_forecast(self)
 
     @property
     def can_wake_up(self):
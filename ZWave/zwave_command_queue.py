@@ -0,0 +1,656 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+import threading
+import dispatcher
+from collections import deque
+
+logger = logging.getLogger('openzwave')
+
+# seconds the queue waits for the controller to report the end of a
+# command that was cancelled before the next command is sent
+CANCEL_WAIT = 5.0
+
+
+class ControllerCommandFuture(object):
+    """
+    Handle to a controller command that has been queued.
+
+    The handle is resolved with the controller state that ended the
+    command (Completed, Failed, NodeOK, NodeFailed, Error or Cancel).
+    """
+
+    STATE_PENDING = 'Pending'
+    STATE_RUNNING = 'Running'
+    STATE_TIMEOUT = 'Timeout'
+    STATE_REJECTED = 'Rejected'
+
+    def __init__(self, queue, command, args, timeout):
+        self._queue = queue
+        self.command = command
+        self.args = args
+        self.timeout = timeout
+        self.state = self.STATE_PENDING
+        self.queued_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self._event = threading.Event()
+        self._callbacks = []
+
+    def __repr__(self):
+        return '<ControllerCommandFuture %s%s: %s>' % (
+            self.command,
+            self.args,
+            self.state
+        )
+
+    @property
+    def node_id(self):
+        """
+        The node the command was sent to.
+
+        :rtype: int or None
+        """
+        if self.args and isinstance(self.args[0], int):
+            return self.args[0]
+
+    def done(self):
+        """
+        Has the command finished.
+
+        :rtype: bool
+        """
+        return self._event.isSet()
+
+    def running(self):
+        """
+        Is the command running on the controller.
+
+        :rtype: bool
+        """
+        return self.state == self.STATE_RUNNING
+
+    def cancelled(self):
+        """
+        Was the command cancelled.
+
+        :rtype: bool
+        """
+        return self.state == 'Cancel'
+
+    def cancel(self):
+        """
+        Cancel the command. A command that is running on the controller is
+        cancelled on the controller.
+
+        :return: False if the command had already finished.
+        :rtype: bool
+        """
+        return self._queue.cancel(self)
+
+    def result(self, timeout=None):
+        """
+        Wait for the command to finish.
+
+        :param timeout: Maximum number of seconds to wait
+        :type timeout: float, None
+        :return: The controller state that ended the command, None if the
+        command did not finish in time.
+        :rtype: str or None
+        """
+        self._event.wait(timeout)
+        if self._event.isSet():
+            return self.state
+
+    def add_done_callback(self, callback):
+        """
+        Call a function when the command finishes.
+
+        :param callback: Called with the future as the only argument
+        :type callback: callable
+        """
+        if self._event.isSet():
+            callback(self)
+        else:
+            self._callbacks += [callback]
+
+    def _set_running(self):
+        self.state = self.STATE_RUNNING
+        self.start_time = time.time()
+
+    def _set_result(self, state):
+        if self._event.isSet():
+            return False
+
+        self.state = state
+        self.end_time = time.time()
+        self._event.set()
+
+        for callback in self._callbacks:
+            try:
+                callback(self)
+            except:
+                logger.exception(
+                    u'Controller command callback failed : %s',
+                    self.command
+                )
+        del self._callbacks[:]
+        return True
+
+
+class ControllerCommandQueue(object):
+    """
+    Runs controller commands one after the other.
+
+    Commands are held until the controller lock is free, sent, and their
+    handles resolved when the controller reports a state from
+    STATES_UNLOCKED for the node of the command. After a command timed out
+    or was cancelled the states the controller reports are ignored until
+    it reports NORMAL, or for CANCEL_WAIT seconds, so a late state of the
+    cancelled command does not end the next one.
+    """
+
+    COMMANDS = dict(
+        add_node='addNode',
+        remove_node='removeNode',
+        remove_failed_node='removeFailedNode',
+        has_node_failed='hasNodeFailed',
+        request_node_neighbor_update='requestNodeNeighborUpdate',
+        assign_return_route='assignReturnRoute',
+        delete_all_return_routes='deleteAllReturnRoutes',
+        send_node_information='sendNodeInformation',
+        replace_failed_node='replaceFailedNode',
+        request_network_update='requestNetworkUpdate',
+        replication_send='replicationSend',
+        create_button='createButton',
+        delete_button='deleteButton',
+        create_new_primary='createNewPrimary',
+        transfer_primary_role='transferPrimaryRole',
+        receive_configuration='receiveConfiguration',
+    )
+
+    def __init__(self, controller):
+        """
+        :param controller: The controller the commands are sent to
+        :type controller: ZWaveController
+        """
+        self._controller = controller
+        self._pending = deque()
+        self._current = None
+        self._cancelled = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def current(self):
+        """
+        The command running on the controller.
+
+        :rtype: ControllerCommandFuture or None
+        """
+        return self._current
+
+    def put(self, command, *args, **kwargs):
+        """
+        Queue a controller command.
+
+        :param command: Name of the ZWaveController method,
+        ie: 'request_node_neighbor_update'
+        :type command: str
+        :param args: Arguments for the command
+        :param timeout: Seconds the command is allowed to run on the
+        controller before it is cancelled. Defaults to 60
+        :type timeout: float
+        :return: A handle to the command
+        :rtype: ControllerCommandFuture
+        """
+        if command not in self.COMMANDS:
+            raise ValueError('Unknown controller command : ' + command)
+
+        timeout = kwargs.pop('timeout', 60.0)
+        future = ControllerCommandFuture(self, command, args, timeout)
+
+        with self._condition:
+            self._pending.append(future)
+            self._start()
+            self._condition.notify()
+
+        return future
+
+    def cancel(self, future):
+        with self._condition:
+            if future in self._pending:
+                self._pending.remove(future)
+                return future._set_result('Cancel')
+
+        if future is self._current and not future.done():
+            with self._condition:
+                self._cancelled = True
+            self._controller.cancel_command()
+            return future._set_result('Cancel')
+
+        return False
+
+    def lock_released(self):
+        """
+        Called by the controller when the controller lock is released.
+        """
+        with self._condition:
+            self._condition.notify_all()
+
+    def stop(self):
+        """
+        Cancel every command and stop the queue.
+        """
+        with self._condition:
+            self._running = False
+            pending = list(self._pending)
+            self._pending.clear()
+            self._condition.notify()
+
+        for future in pending:
+            future._set_result('Cancel')
+
+        current = self._current
+        if current is not None:
+            current._set_result('Cancel')
+
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def handle_state(self, state, node_id):
+        """
+        Called by the controller for every ControllerCommand notification.
+        """
+        controller = self._controller
+
+        with self._condition:
+            if state in controller.STATES_UNLOCKED:
+                self._condition.notify_all()
+
+            if state == controller.STATE_NORMAL:
+                self._cancelled = False
+                return
+
+            if self._cancelled:
+                logger.debug(
+                    u'Controller state after a cancel ignored : %s',
+                    state
+                )
+                return
+
+            current = self._current
+
+        if (
+            current is None or
+            state not in controller.STATES_UNLOCKED or
+            current.node_id not in (None, node_id)
+        ):
+            return
+
+        logger.debug(
+            u'Controller command %s finished : %s',
+            current.command,
+            state
+        )
+        current._set_result(state)
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    # noinspection PyProtectedMember
+    def _run(self):
+        controller = self._controller
+        lock = controller._ctrl_lock
+
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+
+                if not self._running:
+                    break
+
+                # wait for the end of a cancelled command to be reported
+                end = time.time() + CANCEL_WAIT
+                while self._running and self._cancelled:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self._cancelled = False
+
+                while self._running and not lock.acquire(False):
+                    self._condition.wait()
+
+                if not self._running or not self._pending:
+                    try:
+                        lock.release()
+                    except threading.ThreadError:
+                        pass
+                    continue
+
+                future = self._pending.popleft()
+                self._current = future
+
+            future._set_running()
+            logger.debug(
+                u'Send controller command : %s, : args : %s',
+                future.command,
+                future.args
+            )
+
+            try:
+                sent = getattr(
+                    controller.network.manager,
+                    self.COMMANDS[future.command]
+                )(controller.home_id, *future.args)
+            except:
+                logger.exception(
+                    u'Controller command failed : %s',
+                    future.command
+                )
+                sent = False
+
+            if not sent:
+                future._set_result(future.STATE_REJECTED)
+            elif not future._event.wait(future.timeout):
+                logger.warning(
+                    u'Controller command timed out : %s',
+                    future.command
+                )
+                with self._condition:
+                    self._cancelled = True
+                future._set_result(future.STATE_TIMEOUT)
+                controller.network.manager.cancelControllerCommand(
+                    controller.home_id
+                )
+
+            with self._condition:
+                self._current = None
+
+            # when the controller reports the end of a command the lock
+            # gets released by ZWaveController._handle_controller_command
+            # and cancel_command, it only needs to be released here if the
+            # controller never answered.
+            if future.state in (future.STATE_REJECTED, future.STATE_TIMEOUT):
+                try:
+                    lock.release()
+                except threading.ThreadError:
+                    pass
+
+
+class ValueSendQueue(object):
+    """
+    The writes to the values of a network, in front of manager.setValue.
+
+    A write to a value that is still queued replaces the queued data, so
+    only the last one is sent. A write of the data the node already
+    reported, with no other write to the value pending, is dropped. No
+    more than max_in_flight writes to a node are sent before the node
+    reports back, a write counts as in flight until the value is reported,
+    the MsgComplete notification of the node arrives or timeout seconds
+    have passed. Writes to buttons and write only values are never
+    reported back and do not count as in flight.
+    """
+
+    def __init__(self, network, max_in_flight=2, timeout=10.0):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param max_in_flight: The number of writes to a node that can be
+        waiting for a report
+        :type max_in_flight: int
+        :param timeout: Seconds a write waits for a report
+        :type timeout: float
+        """
+        self._network = network
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+        self._order = deque()
+        self._queued = {}
+        self._in_flight = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        self.sent = 0
+        self.collapsed = 0
+        self.dropped = 0
+        self.expired = 0
+
+        dispatcher.connect(
+            self._on_msg_complete,
+            network.SIGNAL_MSG_COMPLETE
+        )
+
+    def __len__(self):
+        return len(self._queued)
+
+    def put(self, value, data):
+        """
+        Queue a write to a value.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :param data: The data to write
+        :return: False if the write was dropped because the node already
+        reported the data.
+        :rtype: bool
+        """
+        # read before the queue is locked, is_pending takes the write lock
+        # of the value
+        pending = value.is_pending
+        # the data of a button or a write only value is not the state of
+        # the node, writing it again is a new press
+        reports_back = self.reports_back(value)
+
+        with self._condition:
+            if value.id in self._queued:
+                self._queued[value.id] = (value, data)
+                self.collapsed += 1
+                return True
+
+            if (
+                reports_back and
+                not pending and
+                value.reported_data == data and
+                type(value.reported_data) == type(data)
+            ):
+                self.dropped += 1
+                logger.debug(
+                    u'Value %s already is %r, write dropped',
+                    value.id,
+                    data
+                )
+                return False
+
+            self._queued[value.id] = (value, data)
+            self._order.append(value.id)
+            self._start()
+            self._condition.notify()
+
+        return True
+
+    def reported(self, value):
+        """
+        Called when a value is reported, frees the write in flight to it.
+
+        :param value: The value
+        :type value: ZWaveValue
+        """
+        with self._condition:
+            in_flight = self._in_flight.get(value.node.id, None)
+            if in_flight and in_flight.pop(value.id, None) is not None:
+                self._condition.notify()
+
+    def _on_msg_complete(self, network=None, nodeId=None, **_):
+        if network is not self._network:
+            return
+
+        # the oldest write to the node is done
+        with self._condition:
+            in_flight = self._in_flight.get(nodeId, None)
+            if in_flight:
+                value_id = min(in_flight, key=in_flight.get)
+                del in_flight[value_id]
+                self._condition.notify()
+
+    @staticmethod
+    def reports_back(value):
+        """
+        Does the node report the data of a value after it is written.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :rtype: bool
+        """
+        # noinspection PyProtectedMember
+        if value._type == 'Button':
+            return False
+        try:
+            return not value.is_write_only
+        except:
+            return True
+
+    @property
+    def in_flight(self):
+        """
+        The number of writes waiting for a report.
+
+        :rtype: int
+        """
+        with self._condition:
+            return sum(len(item) for item in self._in_flight.values())
+
+    @property
+    def stats(self):
+        """
+        :return: dict(queued=, in_flight=, sent=, collapsed=, dropped=,
+        expired=), collapsed are the writes replaced by a later write to
+        the same value, dropped the writes of data the node already
+        reported and expired the writes the node never reported back.
+        :rtype: dict
+        """
+        return dict(
+            queued=len(self),
+            in_flight=self.in_flight,
+            sent=self.sent,
+            collapsed=self.collapsed,
+            dropped=self.dropped,
+            expired=self.expired
+        )
+
+    def stop(self):
+        """
+        Drop the queued writes and stop the queue.
+        """
+        with self._condition:
+            self._running = False
+            self._order.clear()
+            self._queued.clear()
+            self._in_flight.clear()
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _expire(self, now):
+        # returns the time the next write in flight expires
+        next_expiry = None
+        for in_flight in self._in_flight.values():
+            for value_id, sent in list(in_flight.items()):
+                expires = sent + self.timeout
+                if expires <= now:
+                    del in_flight[value_id]
+                    self.expired += 1
+                    logger.debug(u'Write to value %s expired', value_id)
+                elif next_expiry is None or expires < next_expiry:
+                    next_expiry = expires
+        return next_expiry
+
+    def _next(self):
+        for value_id in self._order:
+            value, data = self._queued[value_id]
+            in_flight = self._in_flight.setdefault(value.node.id, {})
+            if (
+                len(in_flight) < self.max_in_flight and
+                value_id not in in_flight
+            ):
+                self._order.remove(value_id)
+                del self._queued[value_id]
+                return value, data
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._order:
+                    self._condition.wait()
+
+                if not self._running:
+                    break
+
+                now = time.time()
+                next_expiry = self._expire(now)
+                item = self._next()
+
+                if item is None:
+                    # every node with queued writes is busy
+                    if next_expiry is None:
+                        self._condition.wait()
+                    else:
+                        self._condition.wait(next_expiry - now)
+                    continue
+
+                value, data = item
+                self.sent += 1
+
+            if self.reports_back(value):
+                with self._condition:
+                    in_flight = self._in_flight.setdefault(value.node.id, {})
+                    in_flight[value.id] = now
+
+            # heals wait for the writes to the network to stop
+            self._network.heal_scheduler.notify_traffic()
+
+            try:
+                self._network.manager.setValue(value.id, data)
+            except:
+                logger.exception(u'Unable to write value %s', value.id)
+                self.reported(value)
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compiled index of the OpenZWave device database.
+
+manufacturer_specific.xml and the product files it points to are read once
+and written to a single file. The file starts with a header holding the
+manufacturers and products, followed by the configuration parameters and
+association groups of every product file, each pickled on its own. The
+file is memory mapped and the parameters of a product are only unpickled
+when they are asked for.
+
+OpenZWave still reads the xml files itself, the index is for looking up
+products and their parameters without parsing xml.
+"""
+
+import os
+import re
+import mmap
+import struct
+import hashlib
+import logging
+import threading
+import cPickle as pickle
+import xml.etree.ElementTree as ElementTree
+
+logger = logging.getLogger('openzwave')
+
+MAGIC = 'OZWIDX\x00\x01'
+HEADER = struct.Struct('<8sQ')
+INDEX_FILE_NAME = 'ozw_config.idx'
+
+COMMAND_CLASS_CONFIGURATION = 112
+COMMAND_CLASS_ASSOCIATION = 133
+
+
+def _tag(element):
+    # the elements are in the open-zwave namespace
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _to_int(value):
+    if isinstance(value, (str, unicode)):
+        return int(value, 16)
+    return int(value)
+
+
+def _bool(value):
+    return str(value).lower() == 'true'
+
+
+def _number(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _help(element):
+    if element is None or not element.text:
+        return u''
+    return re.sub(r'\s+', ' ', element.text).strip()
+
+
+def _xml_files(config_dir):
+    res = []
+    for folder, _, file_names in os.walk(config_dir):
+        for file_name in file_names:
+            if file_name.lower().endswith('.xml'):
+                path = os.path.join(folder, file_name)
+                res += [os.path.relpath(path, config_dir).replace('\\', '/')]
+    return sorted(res)
+
+
+def signature(config_dir):
+    """
+    Fingerprint of the names, sizes and modification times of the xml
+    files in a config folder.
+
+    :param config_dir: The OpenZWave config folder
+    :type config_dir: str
+    :rtype: str
+    """
+    sha = hashlib.sha1()
+    for rel_path in _xml_files(config_dir):
+        stat = os.stat(os.path.join(config_dir, rel_path))
+        sha.update('%s|%d|%d\n' % (rel_path, stat.st_size, stat.st_mtime))
+    return sha.hexdigest()
+
+
+def digest(config_dir):
+    """
+    Hash of the names and contents of the xml files in a config folder.
+
+    :param config_dir: The OpenZWave config folder
+    :type config_dir: str
+    :rtype: str
+    """
+    sha = hashlib.sha1()
+    for rel_path in _xml_files(config_dir):
+        sha.update(rel_path + '\n')
+        with open(os.path.join(config_dir, rel_path), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def parse_product(path):
+    """
+    Read the configuration parameters and association groups of a product
+    file.
+
+    :param path: The product xml file
+    :type path: str
+    :return: dict(parameters=[dict(), ...], groups=[dict(), ...])
+    :rtype: dict
+    """
+    parameters = []
+    groups = []
+
+    root = ElementTree.parse(path).getroot()
+
+    for command_class in root:
+        if _tag(command_class) != 'CommandClass':
+            continue
+
+        class_id = int(command_class.get('id', 0))
+
+        if class_id == COMMAND_CLASS_CONFIGURATION:
+            for element in command_class:
+                if _tag(element) != 'Value':
+                    continue
+
+                help_element = None
+                items = []
+                for child in element:
+                    if _tag(child) == 'Help':
+                        help_element = child
+                    elif _tag(child) == 'Item':
+                        items += [(
+                            _number(child.get('value')),
+                            child.get('label', u'')
+                        )]
+
+                parameters += [dict(
+                    index=int(element.get('index')),
+                    instance=int(element.get('instance', 1)),
+                    label=element.get('label', u''),
+                    type=element.get('type', u''),
+                    genre=element.get('genre', u'config'),
+                    units=element.get('units', u''),
+                    min=_number(element.get('min')),
+                    max=_number(element.get('max')),
+                    size=_number(element.get('size')),
+                    value=_number(element.get('value')),
+                    read_only=_bool(element.get('read_only', False)),
+                    write_only=_bool(element.get('write_only', False)),
+                    help=_help(help_element),
+                    items=items
+                )]
+
+        elif class_id == COMMAND_CLASS_ASSOCIATION:
+            for associations in command_class:
+                if _tag(associations) != 'Associations':
+                    continue
+
+                for element in associations:
+                    if _tag(element) != 'Group':
+                        continue
+
+                    groups += [dict(
+                        index=int(element.get('index')),
+                        label=element.get('label', u''),
+                        max_associations=int(
+                            element.get('max_associations', 0)
+                        )
+                    )]
+
+    parameters.sort(key=lambda p: (p['index'], p['instance']))
+    groups.sort(key=lambda g: g['index'])
+    return dict(parameters=parameters, groups=groups)
+
+
+class ZWaveConfigIndex(object):
+    """
+    Product lookups on a compiled index file.
+
+    Use load to get an index that is up to date with a config folder, it
+    compiles the index when there is none or when the xml files changed.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The index file
+        :type path: str
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache = {}
+
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(),
+                0,
+                access=mmap.ACCESS_READ
+            )
+            magic, length = HEADER.unpack(self._map[:HEADER.size])
+            if magic != MAGIC:
+                raise ValueError('Not a config index : ' + path)
+
+            header = pickle.loads(
+                self._map[HEADER.size:HEADER.size + length]
+            )
+            self._data_start = HEADER.size + length
+        except:
+            self.close()
+            raise
+
+        self.signature = header['signature']
+        self.digest = header['digest']
+        self._manufacturers = header['manufacturers']
+        self._products = header['products']
+        self._configs = header['configs']
+
+    def __repr__(self):
+        return '<ZWaveConfigIndex %s: %d products>' % (
+            self.path,
+            len(self._products)
+        )
+
+    def __len__(self):
+        return len(self._products)
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @classmethod
+    def build(cls, config_dir, path):
+        """
+        Compile the xml files of a config folder into an index file.
+
+        :param config_dir: The OpenZWave config folder
+        :type config_dir: str
+        :param path: The index file to write
+        :type path: str
+        :rtype: ZWaveConfigIndex
+        """
+        manufacturers = {}
+        products = {}
+        configs = {}
+        blobs = []
+        offset = 0
+
+        root = ElementTree.parse(
+            os.path.join(config_dir, 'manufacturer_specific.xml')
+        ).getroot()
+
+        for manufacturer in root:
+            if _tag(manufacturer) != 'Manufacturer':
+                continue
+
+            manufacturer_id = _to_int(manufacturer.get('id'))
+            manufacturers[manufacturer_id] = manufacturer.get('name', u'')
+
+            for product in manufacturer:
+                if _tag(product) != 'Product':
+                    continue
+
+                config = product.get('config', None)
+                products[(
+                    manufacturer_id,
+                    _to_int(product.get('type')),
+                    _to_int(product.get('id'))
+                )] = (product.get('name', u''), config)
+
+                if config is None or config in configs:
+                    continue
+
+                config_path = os.path.join(config_dir, config)
+                if not os.path.exists(config_path):
+                    logger.warning(u'Missing product file : %s', config)
+                    continue
+
+                try:
+                    blob = pickle.dumps(
+                        parse_product(config_path),
+                        pickle.HIGHEST_PROTOCOL
+                    )
+                except:
+                    logger.exception(u'Unable to read : %s', config)
+                    continue
+
+                configs[config] = (offset, len(blob))
+                blobs += [blob]
+                offset += len(blob)
+
+        # the offsets of the product files are from the end of the header
+        header = pickle.dumps(
+            dict(
+                signature=signature(config_dir),
+                digest=digest(config_dir),
+                manufacturers=manufacturers,
+                products=products,
+                configs=configs
+            ),
+            pickle.HIGHEST_PROTOCOL
+        )
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except OSError:
+            # the old index can still be open on windows
+            logger.warning(u'Unable to replace config index : %s', path)
+            path = temp_path
+
+        logger.debug(
+            u'Config index built : %d products, %d product files',
+            len(products),
+            len(configs)
+        )
+        return cls(path)
+
+    @classmethod
+    def load(cls, config_dir, path=None):
+        """
+        Open the index of a config folder, compiling it if it is missing or
+        out of date.
+
+        :param config_dir: The OpenZWave config folder
+        :type config_dir: str
+        :param path: The index file. Defaults to ozw_config.idx in the
+        config folder.
+        :type path: str, None
+        :rtype: ZWaveConfigIndex
+        """
+        if path is None:
+            path = os.path.join(config_dir, INDEX_FILE_NAME)
+
+        if os.path.exists(path):
+            try:
+                index = cls(path)
+            except:
+                logger.exception(u'Unable to open config index : %s', path)
+            else:
+                if not index.is_stale(config_dir):
+                    return index
+                index.close()
+
+        return cls.build(config_dir, path)
+
+    def is_stale(self, config_dir, check_hash=True):
+        """
+        Have the xml files of the config folder changed since the index was
+        built.
+
+        The sizes and modification times are compared first, when they
+        differ the contents of the files are hashed, so a copy of the same
+        files is not stale.
+
+        :param config_dir: The OpenZWave config folder
+        :type config_dir: str
+        :param check_hash: Hash the contents when the times differ
+        :type check_hash: bool
+        :rtype: bool
+        """
+        if signature(config_dir) == self.signature:
+            return False
+        if not check_hash:
+            return True
+        return digest(config_dir) != self.digest
+
+    def manufacturer_name(self, manufacturer_id):
+        """
+        :param manufacturer_id: ie: 0x0086 or '0x0086'
+        :type manufacturer_id: int, str
+        :rtype: str or None
+        """
+        return self._manufacturers.get(_to_int(manufacturer_id), None)
+
+    def product(self, manufacturer_id, product_type, product_id):
+        """
+        The name and product file of a product.
+
+        :return: dict(manufacturer=, name=, config=) or None if the product
+        is not in the database.
+        :rtype: dict or None
+        """
+        key = (
+            _to_int(manufacturer_id),
+            _to_int(product_type),
+            _to_int(product_id)
+        )
+
+        if key not in self._products:
+            return None
+
+        name, config = self._products[key]
+        return dict(
+            manufacturer=self._manufacturers.get(key[0], u''),
+            name=name,
+            config=config
+        )
+
+    def _product_data(self, manufacturer_id, product_type, product_id):
+        product = self.product(manufacturer_id, product_type, product_id)
+        if product is None or product['config'] not in self._configs:
+            return dict(parameters=[], groups=[])
+
+        config = product['config']
+        with self._lock:
+            if config not in self._cache:
+                offset, length = self._configs[config]
+                offset += self._data_start
+                self._cache[config] = pickle.loads(
+                    self._map[offset:offset + length]
+                )
+            return self._cache[config]
+
+    def parameters(self, manufacturer_id, product_type, product_id):
+        """
+        The configuration parameters of a product.
+
+        :return: [dict(index=, label=, type=, min=, max=, size=, value=,
+        units=, help=, items=[(value, label), ...], ...), ...]
+        :rtype: list
+        """
+        return self._product_data(
+            manufacturer_id,
+            product_type,
+            product_id
+        )['parameters']
+
+    def parameter(self, manufacturer_id, product_type, product_id, index):
+        """
+        A configuration parameter of a product.
+
+        :rtype: dict or None
+        """
+        for parameter in self.parameters(
+            manufacturer_id,
+            product_type,
+            product_id
+        ):
+            if parameter['index'] == index:
+                return parameter
+
+    def groups(self, manufacturer_id, product_type, product_id):
+        """
+        The association groups of a product.
+
+        :return: [dict(index=, label=, max_associations=), ...]
+        :rtype: list
+        """
+        return self._product_data(
+            manufacturer_id,
+            product_type,
+            product_id
+        )['groups']
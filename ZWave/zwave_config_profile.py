@@ -0,0 +1,566 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.eventghost.net/>.
+
+"""
+Configuration profiles.
+
+A profile is the configuration parameters a product should have. It is
+stored by the manufacturer id, product type and product id of the product
+and applied to every node of that product, nodes that are included later
+get it as soon as their queries are complete.
+
+Only the parameters that differ from the values OpenZWave has for the node
+are written. They are written together and read back, the reports that
+come back are compared to the profile and the progress is sent with the
+SIGNAL_CONFIG_PROFILE_* signals of the network. For sleeping nodes the
+writes are held by the wake up scheduler until the node wakes up.
+
+Parameters that are not reported back within verify_timeout seconds of
+being read are failed. For a sleeping node the time starts when the reads
+are sent at its wake up.
+"""
+
+import os
+import json
+import logging
+import threading
+import dispatcher
+import zwave_command_classes
+
+logger = logging.getLogger('openzwave')
+
+DEFAULT_SIZE = 2
+
+
+def product_key(manufacturer_id, product_type, product_id):
+    """
+    :param manufacturer_id: ie: 0x0086 or '0x0086'
+    :type manufacturer_id: int, str
+    :param product_type: ie: 0x0002 or '0x0002'
+    :type product_type: int, str
+    :param product_id: ie: 0x0064 or '0x0064'
+    :type product_id: int, str
+    :rtype: tuple
+    """
+    res = ()
+    for item in (manufacturer_id, product_type, product_id):
+        if isinstance(item, (str, unicode)):
+            item = int(item, 16)
+        res += (int(item),)
+    return res
+
+
+def _key_string(key):
+    return '%04X:%04X:%04X' % key
+
+
+def _string_key(key):
+    return product_key(*key.split(':'))
+
+
+class ZWaveConfigProfiles(object):
+    """
+    The configuration profiles of a network.
+
+    The profiles are kept in the user directory.
+    """
+
+    STATE_FILE = 'config_profiles.json'
+
+    def __init__(self, network, auto_apply=True, verify_timeout=120.0):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param auto_apply: Apply the profile of a node when its queries are
+        complete.
+        :type auto_apply: bool
+        :param verify_timeout: Seconds to wait for the parameters to be
+        reported back
+        :type verify_timeout: float
+        """
+        self._network = network
+        self.auto_apply = auto_apply
+        self.verify_timeout = verify_timeout
+
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._progress = {}
+        self._loaded = False
+
+        dispatcher.connect(
+            self._on_node_queries_complete,
+            network.SIGNAL_NODE_QUERIES_COMPLETE
+        )
+        dispatcher.connect(self._on_value, network.SIGNAL_VALUE_CHANGED)
+        dispatcher.connect(self._on_value, network.SIGNAL_VALUE_REFRESHED)
+        # connected after the wake up scheduler, the held reads are sent
+        # by the time an Awake gets here
+        dispatcher.connect(
+            self._on_notification,
+            network.SIGNAL_NOTIFICATION
+        )
+
+    @property
+    def _state_file(self):
+        controller = self._network.controller
+        if controller is None or controller.options is None:
+            return None
+
+        user_path = controller.options.user_path
+        if not user_path:
+            return None
+
+        return os.path.join(user_path, self.STATE_FILE)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        path = self._state_file
+        if path is None or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            logger.exception(u'Unable to load config profiles : %s', path)
+            return
+
+        for key, profile in data.items():
+            self._profiles[_string_key(key)] = dict(
+                parameters=dict(
+                    (int(index), value)
+                    for index, value in profile['parameters'].items()
+                ),
+                sizes=dict(
+                    (int(index), size)
+                    for index, size in profile.get('sizes', {}).items()
+                )
+            )
+
+    def _save(self):
+        path = self._state_file
+        if path is None:
+            return
+
+        data = dict(
+            (_key_string(key), profile)
+            for key, profile in self._profiles.items()
+        )
+
+        try:
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=4, sort_keys=True)
+        except IOError:
+            logger.exception(u'Unable to save config profiles : %s', path)
+
+    @property
+    def keys(self):
+        """
+        The products that have a profile.
+
+        :return: [(manufacturer id, product type, product id), ...]
+        :rtype: list
+        """
+        with self._lock:
+            self._load()
+            return sorted(self._profiles.keys())
+
+    def set_profile(self, key, parameters, sizes=None):
+        """
+        Set the profile of a product.
+
+        :param key: (manufacturer id, product type, product id)
+        :type key: tuple
+        :param parameters: {parameter index: value}, the value of a list
+        parameter can be the label of the item.
+        :type parameters: dict
+        :param sizes: {parameter index: size in bytes}. Defaults to the
+        size in the device database or 2.
+        :type sizes: dict, None
+        """
+        key = product_key(*key)
+        with self._lock:
+            self._load()
+            self._profiles[key] = dict(
+                parameters=dict(
+                    (int(index), value)
+                    for index, value in parameters.items()
+                ),
+                sizes=dict(
+                    (int(index), int(size))
+                    for index, size in (sizes or {}).items()
+                )
+            )
+            self._save()
+
+    def remove_profile(self, key):
+        """
+        Remove the profile of a product.
+
+        :param key: (manufacturer id, product type, product id)
+        :type key: tuple
+        """
+        key = product_key(*key)
+        with self._lock:
+            self._load()
+            if self._profiles.pop(key, None) is not None:
+                self._save()
+
+    def profile(self, key):
+        """
+        The parameters of the profile of a product.
+
+        :param key: (manufacturer id, product type, product id)
+        :type key: tuple, None
+        :return: {parameter index: value} or None
+        :rtype: dict or None
+        """
+        if key is None:
+            return None
+
+        key = product_key(*key)
+        with self._lock:
+            self._load()
+            if key not in self._profiles:
+                return None
+            return dict(self._profiles[key]['parameters'])
+
+    def _sizes(self, node):
+        key = node.product_key
+        with self._lock:
+            self._load()
+            if key not in self._profiles:
+                return {}
+            return dict(self._profiles[key]['sizes'])
+
+    @staticmethod
+    def _config_values(node):
+        res = {}
+        for value in node.values.values():
+            if (
+                value.command_class ==
+                zwave_command_classes.COMMAND_CLASS_CONFIGURATION
+            ):
+                res[value.index] = value
+        return res
+
+    @staticmethod
+    def _number(parameter, data):
+        # list values hold the label of the selected item
+        if isinstance(data, bool):
+            return int(data)
+
+        if isinstance(data, (str, unicode)):
+            if parameter is not None:
+                for number, label in parameter['items']:
+                    if label.lower() == data.lower():
+                        return number
+            try:
+                return int(data)
+            except ValueError:
+                return data
+
+        return data
+
+    def diff(self, node, parameters=None):
+        """
+        The parameters of a node that differ from its profile.
+
+        :param node: The node
+        :type node: ZWaveNode
+        :param parameters: {parameter index: value}. Defaults to the
+        profile of the node.
+        :type parameters: dict, None
+        :return: [(index, current value, value), ...], the current value is
+        None if OpenZWave does not have it.
+        :rtype: list
+        """
+        if parameters is None:
+            parameters = self.profile(node.product_key) or {}
+
+        database = dict(
+            (parameter['index'], parameter)
+            for parameter in node.config_parameters
+        )
+        values = self._config_values(node)
+
+        res = []
+        for index in sorted(parameters.keys()):
+            parameter = database.get(index, None)
+            desired = self._number(parameter, parameters[index])
+            if not isinstance(desired, (int, long)):
+                raise ValueError(
+                    'Invalid value for parameter %d : %r' %
+                    (index, parameters[index])
+                )
+
+            if index in values:
+                current = self._number(parameter, values[index].data)
+            else:
+                current = None
+
+            if current != desired:
+                res += [(index, current, desired)]
+
+        return res
+
+    def apply(self, node, parameters=None):
+        """
+        Write the parameters of a node that differ from its profile and
+        read them back.
+
+        :param node: The node
+        :type node: ZWaveNode
+        :param parameters: {parameter index: value}. Defaults to the
+        profile of the node.
+        :type parameters: dict, None
+        :return: The number of parameters written
+        :rtype: int
+        """
+        changes = self.diff(node, parameters)
+
+        sizes = self._sizes(node)
+        for parameter in node.config_parameters:
+            if parameter['size'] and parameter['index'] not in sizes:
+                sizes[parameter['index']] = parameter['size']
+
+        with self._lock:
+            old = self._progress.get(node.id, None)
+            if old is not None and old['timer'] is not None:
+                old['timer'].cancel()
+
+            self._progress[node.id] = dict(
+                total=len(changes),
+                pending=dict((index, value) for index, _, value in changes),
+                verified=[],
+                failed=[],
+                timer=None
+            )
+
+        if changes:
+            logger.debug(
+                u'Applying config profile to node [%s] : %s',
+                node.id,
+                changes
+            )
+
+            for index, _, value in changes:
+                node.set_config_param(
+                    index,
+                    value,
+                    sizes.get(index, DEFAULT_SIZE)
+                )
+            for index, _, _ in changes:
+                node.request_config_param(index)
+
+            self._start_timer(node.id)
+
+        self._send_progress(node)
+        return len(changes)
+
+    def _reads_held(self, node_id):
+        return any(
+            operation[0] == 'request_config_param'
+            for operation in
+            self._network.wake_up_scheduler.pending(node_id)
+        )
+
+    def _start_timer(self, node_id):
+        if self._reads_held(node_id):
+            # started when the node wakes up and gets the reads
+            return
+
+        with self._lock:
+            progress = self._progress.get(node_id, None)
+            if (
+                progress is None or
+                not progress['pending'] or
+                progress['timer'] is not None
+            ):
+                return
+
+            timer = threading.Timer(
+                self.verify_timeout,
+                self._on_timeout,
+                args=(node_id, progress)
+            )
+            timer.daemon = True
+            progress['timer'] = timer
+            timer.start()
+
+    def _on_timeout(self, node_id, progress):
+        with self._lock:
+            if self._progress.get(node_id, None) is not progress:
+                return
+
+            progress['timer'] = None
+            indexes = sorted(progress['pending'].keys())
+            progress['pending'].clear()
+            progress['failed'] += indexes
+
+        if not indexes:
+            return
+
+        logger.warning(
+            u'Config params %s of node [%s] were not reported back',
+            indexes,
+            node_id
+        )
+
+        node = self._network.nodes.get(node_id, None)
+        if node is not None:
+            self._send_progress(node)
+
+    def apply_all(self, nodes=None):
+        """
+        Apply the profiles to all the nodes that have one.
+
+        :param nodes: The nodes. Defaults to all nodes of the network.
+        :type nodes: list, None
+        :return: {node id: number of parameters written}
+        :rtype: dict
+        """
+        if nodes is None:
+            nodes = self._network.nodes.values()
+
+        res = {}
+        for node in nodes:
+            if self.profile(node.product_key) is not None:
+                res[node.id] = self.apply(node)
+        return res
+
+    def progress(self, node_id):
+        """
+        The progress of the last profile applied to a node.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :return: dict(total=, pending=[index, ...], verified=[index, ...],
+        failed=[index, ...]) or None
+        :rtype: dict or None
+        """
+        with self._lock:
+            progress = self._progress.get(node_id, None)
+            if progress is None:
+                return None
+
+            return dict(
+                total=progress['total'],
+                pending=sorted(progress['pending'].keys()),
+                verified=list(progress['verified']),
+                failed=list(progress['failed'])
+            )
+
+    def _send_progress(self, node):
+        progress = self.progress(node.id)
+
+        dispatcher.send(
+            self._network.SIGNAL_CONFIG_PROFILE_PROGRESS,
+            sender=self._network,
+            network=self._network,
+            node=node,
+            node_id=node.id,
+            **progress
+        )
+
+        if not progress['pending']:
+            dispatcher.send(
+                self._network.SIGNAL_CONFIG_PROFILE_COMPLETE,
+                sender=self._network,
+                network=self._network,
+                node=node,
+                node_id=node.id,
+                **progress
+            )
+
+    def _on_node_queries_complete(self, network=None, node=None, **_):
+        if (
+            not self.auto_apply or
+            network is not self._network or
+            node is None or
+            self.profile(node.product_key) is None
+        ):
+            return
+
+        try:
+            self.apply(node)
+        except:
+            logger.exception(
+                u'Unable to apply config profile to node [%s]',
+                node.id
+            )
+
+    def _on_notification(
+        self,
+        network=None,
+        nodeId=None,
+        notificationCode=None,
+        **_
+    ):
+        if (
+            network is not self._network or
+            nodeId is None or
+            str(notificationCode) != 'Awake'
+        ):
+            return
+
+        self._start_timer(nodeId)
+
+    def _on_value(self, network=None, node=None, value=None, **_):
+        if network is not self._network or node is None or value is None:
+            return
+
+        if (
+            value.command_class !=
+            zwave_command_classes.COMMAND_CLASS_CONFIGURATION
+        ):
+            return
+
+        with self._lock:
+            progress = self._progress.get(node.id, None)
+            if progress is None or value.index not in progress['pending']:
+                return
+
+            desired = progress['pending'].pop(value.index)
+            if not progress['pending'] and progress['timer'] is not None:
+                progress['timer'].cancel()
+                progress['timer'] = None
+
+        parameter = None
+        for item in node.config_parameters:
+            if item['index'] == value.index:
+                parameter = item
+                break
+
+        with self._lock:
+            if self._number(parameter, value.data) == desired:
+                progress['verified'] += [value.index]
+            else:
+                logger.warning(
+                    u'Config param %s of node [%s] is %r, expected %r',
+                    value.index,
+                    node.id,
+                    value.data,
+                    desired
+                )
+                progress['failed'] += [value.index]
+
+        self._send_progress(node)
@@ -40,6 +40,7 @@ import shutil # NOQA
 import time # NOQA
 import dispatcher # NOQA
 from zwave_object import ZWaveObject # NOQA
+from zwave_command_queue import ControllerCommandQueue # NOQA
 from zwave import PyStatDriver, PyControllerState # NOQA
 
 
@@ -247,6 +248,7 @@ class ZWaveController(ZWaveObject):
             self.STATE_NODEOK,
             self.STATE_NODEFAILED
         ]
+        self._command_queue = ControllerCommandQueue(self)
         logger.debug("Network controller object created.")
 
     def stop(self):
@@ -254,6 +256,7 @@ class ZWaveController(ZWaveObject):
         Stop the controller and all this threads.
 
         """
+        self._command_queue.stop()
         self.cancel_command()
         if self._timer_statistics is not None:
             self._timer_statistics.cancel()
@@ -647,6 +650,29 @@ class ZWaveController(ZWaveObject):
             return self._network.manager.getSendQueueCount(self.home_id)
         return -1
 
+    @property
+    def value_queue_count(self):
+        """
+        Get count of value writes waiting in the send queue of the network,
+        before they reach the outgoing send queue.
+
+        :return: The count of queued value writes.
+        :rtype: int
+
+        """
+        return len(self._network.send_queue)
+
+    @property
+    def value_queue_stats(self):
+        """
+        Get the statistics of the send queue of the network.
+
+        :return: See ValueSendQueue.stats
+        :rtype: dict
+
+        """
+        return self._network.send_queue.stats
+
     def hard_reset(self):
         """
         Hard Reset a PC Z-Wave Controller.
@@ -1211,6 +1237,11 @@ class ZWaveController(ZWaveObject):
                 self._ctrl_lock.release()
             except threading.ThreadError:
                 pass
+
+        self._command_queue.handle_state(
+            kwargs['controllerState'],
+            kwargs['nodeId']
+        )
         self._ctrl_last_state = kwargs['controllerState']
         self._ctrl_last_stateint = kwargs['controllerStateInt']
 
@@ -1229,6 +1260,46 @@ class ZWaveController(ZWaveObject):
             **kwargs
             )
 
+    @property
+    def command_queue(self):
+        """
+        The queue used to run controller commands one after the other.
+
+        :rtype: ControllerCommandQueue
+        """
+        return self._command_queue
+
+    def queue_command(self, command, *args, **kwargs):
+        """
+        Queue a controller command instead of failing when another command
+        is in progress.
+
+        The command is sent once the controller is free, the returned handle
+        is resolved with the state the controller reports at the end of the
+        command.
+
+            futures = list(
+                controller.queue_command(
+                    'request_node_neighbor_update',
+                    node_id,
+                    timeout=30
+                )
+                for node_id in network.nodes
+            )
+            for future in futures:
+                print future.command, future.node_id, future.result()
+
+        :param command: Name of the command method, ie: 'assign_return_route'
+        :type command: str
+        :param args: Arguments of the command method
+        :param timeout: Seconds the command is allowed to run before it is
+        cancelled. (default = 60)
+        :type timeout: float
+        :return: A handle to the queued command
+        :rtype: ControllerCommandFuture
+        """
+        return self._command_queue.put(command, *args, **kwargs)
+
     def _lock_controller(self):
         """Try to lock the controller and generate a notification if fails
         """
@@ -1300,6 +1371,7 @@ class ZWaveController(ZWaveObject):
             self._ctrl_lock.release()
         except threading.ThreadError:
             pass
+        self._command_queue.lock_released()
         if self.home_id is not None:
             return self._network.manager.cancelControllerCommand(self.home_id)
         return False
@@ -1313,6 +1385,7 @@ class ZWaveController(ZWaveObject):
             self._ctrl_lock.release()
         except threading.ThreadError:
             pass
+        self._command_queue.lock_released()
         if self.home_id is not None:
             return self._network.manager.cancelControllerCommand(self.home_id)
         return False
@@ -1425,4 +1498,5 @@ class ZWaveController(ZWaveObject):
                         logger.exception("Can't update %s", version_file)
 
             shutil.rmtree(dest, True)
+            self.network.invalidate_config_index()
 
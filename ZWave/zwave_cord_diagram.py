@@ -16,179 +16,494 @@
 # # You should have received a copy of the GNU General Public License along
 # # with EventGhost. If not, see <http://www.gnu.org/licenses/>.
 
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.path import Path
-import matplotlib.patches as patches
+from matplotlib.collections import PathCollection
 from matplotlib import text as mtext
 import math
+import time
+import colorsys
 import numpy as np
-import random
-from PIL import Image, ImageChops
-from io import BytesIO
-import zwave_utils
+import threading
+import dispatcher
+from collections import OrderedDict
+from PIL import Image
 
 LW = 0.3
 
+# the diagram is drawn inside a circle with a radius of 1.0, the axes only
+# show this much of the data so the image needs no cropping.
+LIMIT = 1.01
 
-class Node(object):
+# scale of the rendered image, 60% of the 600 dpi the image used to be
+# saved at.
+DPI = 360.0
 
-    def __init__(self, node, nodes, ax, index):
-        self.node = node
-        self.nodes = nodes
-        self.ax = ax
-        self.index = index
+MAX_SIZE = 8192
 
-        num_nodes = float(len(self.node.network.nodes.values()))
-        color_offset = zwave_utils.remap(num_nodes, 1.0, 255.0, 255.0, 1.0)
-        color_offset = ((color_offset / 1000.0) / 4.0)
+# the band around the diagram that belongs to the nodes when hit testing,
+# it covers the arc and the labels of a node.
+HIT_INNER = 0.9
+HIT_OUTER = 1.0
 
-        def get_color():
-            res = []
+ARC_CODES = [
+    Path.MOVETO,
+    Path.CURVE4,
+    Path.CURVE4,
+    Path.CURVE4,
+    Path.LINETO,
+    Path.CURVE4,
+    Path.CURVE4,
+    Path.CURVE4,
+    Path.CLOSEPOLY,
+]
 
-            new_c = random.randrange(40, 215)
-            while len(res) < 3:
-                for old_c in res:
-                    if (
-                        new_c * (1.0 - color_offset)
-                        < old_c <
-                        new_c * (1.0 + color_offset)
-                    ):
-                        new_c = random.randrange(40, 215)
-                        break
-                else:
-                    res += [new_c]
+CHORD_CODES = [Path.MOVETO] + [Path.CURVE4] * 12
 
-            return tuple(res)
+LABEL_POINTS = 100
 
-        self.color = get_color()
 
-        while True:
-            for n in self.nodes:
-                if (
-                    sum(self.color) * (1.0 - color_offset)
-                    < sum(n.color) <
-                    sum(self.color) * (1.0 + color_offset)
-                ):
-                    self.color = get_color()
-                    break
-            else:
-                break
+def _build_palette(count=256):
+    # hues are spread using the golden ratio so nodes with ids that are
+    # close together get colors that are far apart. every channel stays
+    # between 40 and 215 like the randomly picked colors used to.
+    golden = 0.618033988749895
+    res = []
 
-        self.color_converted = tuple(c / 256.0 for c in self.color)
+    for i in range(count):
+        hue = (i * golden) % 1.0
+        saturation = (0.55, 0.75, 0.65)[i % 3]
+        value = (0.95, 0.75, 0.85)[(i // 3) % 3]
+        rgb = colorsys.hsv_to_rgb(hue, saturation, value)
+        res += [tuple(int(40 + c * 175) for c in rgb)]
 
-        self._neighbors = None
+    return res
 
-    @property
-    def id(self):
-        return self.node.id
 
-    @property
-    def neighbors(self):
-        if self._neighbors is None:
-            neighbors = list(neighbor for neighbor in self.node.neighbors)
+# color of every node id
+PALETTE = _build_palette()
 
-            neighbor_array = [None] * len(self.nodes)
 
-            for neighbor in neighbors:
-                for node in self.nodes:
-                    if node.id == neighbor:
-                        neighbor_index = node.index
-                        neighbor_array[neighbor_index] = node
-                        break
+def polar2xy_array(r, theta):
+    """
+    Vectorized polar2xy, returns an array with a last axis of (x, y).
+    """
+    return np.stack((r * np.cos(theta), r * np.sin(theta)), axis=-1)
 
-            self._neighbors = neighbor_array[:]
-        return self._neighbors
+
+class ChordLayout(object):
+    """
+    The nodes of a diagram and the links between them.
+
+    The adjacency is taken from the neighbor matrix of the network once,
+    node i of the layout is the node at index i of the diagram.
+    """
+
+    def __init__(self, neighbor_matrix, node_ids):
+        ids = np.array(node_ids, dtype=np.intp)
+        matrix = neighbor_matrix.matrix
+
+        self.node_ids = tuple(node_ids)
+        self.index = dict((node_id, i) for i, node_id in enumerate(node_ids))
+        self.adjacency = matrix[np.ix_(ids, ids)]
+        self.degree = matrix[ids].sum(axis=1)
+        self.key = hash((
+            self.node_ids,
+            hash(self.adjacency.tobytes()),
+            hash(self.degree.tobytes())
+        ))
+
+    def geometry(self, rotation=0.0):
+        """
+        The geometry of the diagram rotated by rotation degrees.
+
+        :rtype: ChordGeometry
+        """
+        return ChordGeometry.create(self, rotation)
+
+    def hit_test(self, x, y, width, height, rotation=0):
+        """
+        Find the node at a point of the image.
+
+        :param x: X position in the image
+        :type x: int
+        :param y: Y position in the image
+        :type y: int
+        :param width: Width of the image
+        :type width: int
+        :param height: Height of the image
+        :type height: int
+        :param rotation: Rotation of the labels
+        :type rotation: int, float
+        :return: The index of the node or None
+        :rtype: int or None
+        """
+        if width <= 0 or height <= 0:
+            return None
+
+        half_w = width / 2.0
+        half_h = height / 2.0
+        x = (x - half_w) / half_w * LIMIT
+        y = (half_h - y) / half_h * LIMIT
+
+        if not HIT_INNER <= math.hypot(x, y) <= HIT_OUTER:
+            return None
+
+        hit_index = self.geometry(rotation).hit_index
+        count = len(hit_index)
+        angle = math.atan2(y, x) % (2.0 * math.pi)
+
+        index = hit_index[int(angle / (2.0 * math.pi) * count) % count]
+        if index < 0:
+            return None
+        return index
+
+
+class ChordGeometry(object):
+    """
+    Arc angles, chord end points and label paths of every node of a
+    diagram, computed with numpy for all of the nodes at once.
+
+    Instances are cached by the layout key and the rotation so the geometry
+    is only computed again when the nodes, the links or the rotation change.
+    """
+
+    CACHE_SIZE = 16
+    HIT_BUCKETS = 3600
+
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, layout, rotation=0.0):
+        self.layout = layout
+        self.rotation = rotation
+
+        count = len(layout.node_ids)
+        index = np.arange(count, dtype=float)
+
+        self.width = 300.0 / (300.0 * count) * (360.0 - 1.0 * count)
+        self.start = index * (self.width + 1.0) + (90.0 - (self.width / 2.0))
+        self.end = self.start + self.width
+
+        degree = layout.degree.astype(float)
+        self.chord_width = np.where(
+            degree > 0,
+            self.width / np.maximum(degree, 1.0),
+            0.0
+        )
+
+        # slot_start[i, j] is where the chord of node i to node j starts on
+        # the arc of node i. the slots are given out in node index order.
+        adjacency = layout.adjacency
+        rank = np.cumsum(adjacency, axis=1) - 1
+        self.slot_start = np.where(
+            adjacency,
+            self.start[:, None] + rank * self.chord_width[:, None],
+            np.nan
+        )
+
+        self._arc_paths = None
+        self._chord_paths = None
+        self._chords = None
+        self._labels = None
+        self._hit_index = None
+
+    @classmethod
+    def create(cls, layout, rotation=0.0):
+        """
+        Get the geometry of a layout from the cache, computing it if needed.
+
+        :rtype: ChordGeometry
+        """
+        key = (layout.key, round(float(rotation), 3))
+
+        with cls._cache_lock:
+            if key in cls._cache:
+                geometry = cls._cache.pop(key)
+                cls._cache[key] = geometry
+                return geometry
+
+        geometry = cls(layout, rotation)
+
+        with cls._cache_lock:
+            cls._cache[key] = geometry
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+        return geometry
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
 
     @property
-    def name(self):
-        return self.node.name
+    def hit_index(self):
+        """
+        The node at every 1/10th of a degree around the diagram.
+
+        The angles are those of the labels as they are seen in the image,
+        -1 is used where there is no node.
+
+        :rtype: list
+        """
+        if self._hit_index is None:
+            buckets = self.HIT_BUCKETS
+            hit_index = np.full(buckets, -1, dtype=np.intp)
+
+            x, y = self.labels[:2]
+            if len(x):
+                # the labels run clockwise, the first point of a label has
+                # the largest angle.
+                start = np.arctan2(y[:, -1], x[:, -1]) % (2.0 * np.pi)
+                end = np.arctan2(y[:, 0], x[:, 0]) % (2.0 * np.pi)
+                length = (end - start) % (2.0 * np.pi)
+
+                first = np.floor(start / (2.0 * np.pi) * buckets)
+                count = np.ceil(length / (2.0 * np.pi) * buckets)
+                steps = np.arange(int(count.max()) + 1)
+
+                cells = (first[:, None] + steps).astype(np.intp) % buckets
+                owner = np.repeat(
+                    np.arange(len(x))[:, None],
+                    len(steps),
+                    axis=1
+                )
+                inside = steps[None, :] <= count[:, None]
+                hit_index[cells[inside]] = owner[inside]
+
+            self._hit_index = hit_index.tolist()
+        return self._hit_index
+
+    def neighbor_pos(self, index):
+        """
+        The start and end angle of the chord slots on the arc of a node.
+
+        :return: {neighbor node id: (start, end)}
+        :rtype: dict
+        """
+        node_ids = self.layout.node_ids
+        chord_width = self.chord_width[index]
+        return dict(
+            (node_ids[j], (start, start + chord_width))
+            for j, start in enumerate(self.slot_start[index])
+            if not np.isnan(start)
+        )
 
     @property
-    def room(self):
-        return self.node.location
+    def chords(self):
+        """
+        The chords of the diagram.
+
+        A chord is drawn from node i to node j when both nodes list each
+        other as neighbors. Every link has a chord from each end.
+
+        :return: (source index array, target index array)
+        :rtype: tuple
+        """
+        if self._chords is None:
+            adjacency = self.layout.adjacency
+            mutual = adjacency & adjacency.T
+            np.fill_diagonal(mutual, False)
+            self._chords = np.nonzero(mutual)
+        return self._chords
 
     @property
-    def num_routes(self):
+    def arc_paths(self):
+        """
+        The outline of the arc of every node.
+
+        :rtype: list of matplotlib.path.Path
+        """
+        if self._arc_paths is None:
+            radius = 1.0
+            width = 0.1
+            inner = radius * (1 - width)
+
+            start = np.radians(self.start + self.rotation)
+            end = np.radians(self.end + self.rotation)
+            opt = 4.0 / 3.0 * np.tan((end - start) / 4.0) * radius
+            half = 0.5 * np.pi
+
+            verts = np.stack(
+                (
+                    polar2xy_array(radius, start),
+                    (
+                        polar2xy_array(radius, start) +
+                        polar2xy_array(opt, start + half)
+                    ),
+                    (
+                        polar2xy_array(radius, end) +
+                        polar2xy_array(opt, end - half)
+                    ),
+                    polar2xy_array(radius, end),
+                    polar2xy_array(inner, end),
+                    (
+                        polar2xy_array(inner, end) +
+                        polar2xy_array(opt * (1 - width), end - half)
+                    ),
+                    (
+                        polar2xy_array(inner, start) +
+                        polar2xy_array(opt * (1 - width), start + half)
+                    ),
+                    polar2xy_array(inner, start),
+                    polar2xy_array(radius, start),
+                ),
+                axis=1
+            )
 
-        def iter_neighbor(parent, found, checked):
-            for neighbor in parent.neighbors:
-                if neighbor is None:
-                    continue
+            self._arc_paths = list(Path(v, ARC_CODES) for v in verts)
+        return self._arc_paths
 
-                if neighbor != self:
-                    if neighbor in found or neighbor in checked:
-                        continue
+    @property
+    def chord_paths(self):
+        """
+        The outline of every chord, in the same order as chords.
+
+        :rtype: list of matplotlib.path.Path
+        """
+        if self._chord_paths is None:
+            chordwidth = 0.7
+            radius = 0.9
+            rchord = radius * (1 - chordwidth)
+            half = 0.5 * np.pi
 
-                    if neighbor.index == 0:
-                        found += [parent]
-                        continue
+            source, target = self.chords
+            rotation = self.rotation
 
-                    checked += [neighbor]
-                    found, checked = iter_neighbor(neighbor, found, checked)
+            start1 = self.slot_start[source, target] + rotation
+            end1 = start1 + self.chord_width[source]
+            start2 = self.slot_start[target, source] + rotation
+            end2 = start2 + self.chord_width[target]
 
-            return found, checked
+            start1, end1 = np.minimum(start1, end1), np.maximum(start1, end1)
+            start2, end2 = np.minimum(start2, end2), np.maximum(start2, end2)
 
-        return len(iter_neighbor(self, [], [])[0])
+            start1 = np.radians(start1)
+            end1 = np.radians(end1)
+            start2 = np.radians(start2)
+            end2 = np.radians(end2)
 
-    def hit_test(self, x, y, rotation, w, h):
+            opt1 = 4.0 / 3.0 * np.tan((end1 - start1) / 4.0) * radius
+            opt2 = 4.0 / 3.0 * np.tan((end2 - start2) / 4.0) * radius
+
+            verts = np.stack(
+                (
+                    polar2xy_array(radius, start1),
+                    (
+                        polar2xy_array(radius, start1) +
+                        polar2xy_array(opt1, start1 + half)
+                    ),
+                    (
+                        polar2xy_array(radius, end1) +
+                        polar2xy_array(opt1, end1 - half)
+                    ),
+                    polar2xy_array(radius, end1),
+                    polar2xy_array(rchord, end1),
+                    polar2xy_array(rchord, start2),
+                    polar2xy_array(radius, start2),
+                    (
+                        polar2xy_array(radius, start2) +
+                        polar2xy_array(opt2, start2 + half)
+                    ),
+                    (
+                        polar2xy_array(radius, end2) +
+                        polar2xy_array(opt2, end2 - half)
+                    ),
+                    polar2xy_array(radius, end2),
+                    polar2xy_array(rchord, end2),
+                    polar2xy_array(rchord, start1),
+                    polar2xy_array(radius, start1),
+                ),
+                axis=1
+            )
 
-        center_x = w / 2
-        center_y = h / 2
-        start_x, start_y = self.start_coords(rotation, center_x, center_y)
-        end_x, end_y = self.end_coords(rotation, center_x, center_y)
+            self._chord_paths = list(Path(v, CHORD_CODES) for v in verts)
+        return self._chord_paths
 
-        if start_x < x < end_x and start_y < y < end_y:
-            return True
+    @property
+    def labels(self):
+        """
+        The curves the room and the name of every node are written on.
 
-        if start_x > x > end_x and start_y < y < end_y:
-            return True
+        :return: (x, y, inner x, inner y) arrays with a row per node
+        :rtype: tuple
+        """
+        if self._labels is None:
+            start = np.radians(self.start + self.rotation + 0.25)
+            end = np.radians(self.end + self.rotation - 0.25)
+            steps = np.linspace(0.0, 1.0, LABEL_POINTS)
+            angles = start[:, None] + (end - start)[:, None] * steps
 
-        if start_x > x > end_x and start_y > y > end_y:
-            return True
+            x = 0.97 * -np.cos(angles)
+            y = 0.97 * np.sin(angles)
+            self._labels = (x, y, 0.96 * x, 0.96 * y)
+        return self._labels
 
-        if start_x < x < end_x and start_y > y > end_y:
-            return True
 
-    def end_coords(self, rotation, w, h):
-        x_start, y_start = self.text_location(rotation)[:2]
+class Node(object):
 
-        x_end = ((0.95 * x_start) * w) + w
-        y_end = (-(0.95 * y_start) * h) + h
+    def __init__(self, node, nodes, ax, index, layout):
+        self.node = node
+        self.nodes = nodes
+        self.ax = ax
+        self.index = index
+        self.layout = layout
 
-        return list(
-            (int(round(x)), int(round(y))) for x, y in zip(x_end, y_end)
-        )[-1]
+        self.color = PALETTE[int(node.id) % len(PALETTE)]
+        self.color_converted = tuple(c / 256.0 for c in self.color)
 
-    def start_coords(self, rotation, w, h):
-        x_start, y_start = self.text_location(rotation)[:2]
+        self._neighbors = None
 
-        x_start = (x_start * w) + w
-        y_start = (-y_start * h) + h
+    @property
+    def id(self):
+        return self.node.id
 
-        return list(
-            (int(round(x)), int(round(y))) for x, y in zip(x_start, y_start)
-        )[0]
+    @property
+    def neighbors(self):
+        if self._neighbors is None:
+            nodes = dict((node.id, node) for node in self.nodes)
+            neighbor_array = [None] * len(self.nodes)
+
+            for neighbor in self.node.neighbors:
+                if neighbor in nodes:
+                    node = nodes[neighbor]
+                    neighbor_array[node.index] = node
+
+            self._neighbors = neighbor_array[:]
+        return self._neighbors
+
+    @property
+    def name(self):
+        return self.node.name
+
+    @property
+    def room(self):
+        return self.node.location
+
+    @property
+    def num_routes(self):
+        return self.node.network.neighbor_matrix.num_routes(self.id)
+
+    def hit_test(self, x, y, rotation, w, h):
+        return self.layout.hit_test(x, y, w, h, rotation) == self.index
+
+    @property
+    def geometry(self):
+        return self.layout.geometry()
 
     @property
     def width(self):
-        width = (
-            300.0 /
-            (300.0 * float(len(self.nodes))) *
-            (360.0 - 1.0 * float(len(self.nodes)))
-        )
-        return width
-        # return (360.0 / float(len(self.nodes))) - 2.0
+        return self.geometry.width
 
     @property
     def start_pos(self):
-        return (
-            (float(self.index) * (self.width + 1.0)) +
-            (90.0 - (self.width / 2.0))
-        )
+        return self.geometry.start[self.index]
 
     @property
     def end_pos(self):
-        return self.start_pos + self.width
+        return self.geometry.end[self.index]
 
     @property
     def neighbor_ids(self):
@@ -199,20 +514,11 @@ class Node(object):
 
     @property
     def neighbor_pos(self):
-        start = self.start_pos
-        res = {}
-
-        # noinspection PyShadowingBuiltins
-        for id in self.neighbor_ids:
-            end = start + self.chord_width
-            res[id] = (start, end)
-            start = end
-
-        return res
+        return self.geometry.neighbor_pos(self.index)
 
     @property
     def chord_width(self):
-        return self.width / float(len(self.node.neighbors))
+        return self.geometry.chord_width[self.index]
 
     def get_neighbor_pos(self, neighbor_id):
         neighbor_pos = self.neighbor_pos
@@ -221,22 +527,12 @@ class Node(object):
             return neighbor_pos[neighbor_id]
 
     def text_location(self, rotation=0):
-        start = self.start_pos + rotation
-        end = self.end_pos + rotation
-        linespace = np.linspace(
-            (start + 0.25) * np.pi / 180.0,
-            (end - 0.25) * np.pi / 180.0,
-            100
-        )
-
-        x = 0.97 * -np.cos(linespace)
-        y = 0.97 * np.sin(linespace)
+        x, y, inner_x, inner_y = self.layout.geometry(rotation).labels
+        index = self.index
+        return x[index], y[index], inner_x[index], inner_y[index]
 
-        return x, y, 0.96 * x, 0.96 * y,
-
-    @zwave_utils.thread_call
-    def write_text(self):
-        x_1, y_1, x_2, y_2 = self.text_location()
+    def write_text(self, rotation=0):
+        x_1, y_1, x_2, y_2 = self.text_location(rotation)
         if self.index == 0:
             font_size = len(self.nodes) * 0.16
         else:
@@ -263,151 +559,6 @@ class Node(object):
             axes=self.ax,
         )
 
-    @zwave_utils.thread_call
-    def create_node(self):
-        start = self.start_pos
-        end = self.end_pos
-
-        radius = 1.0
-        color = self.color_converted
-        width = 0.1
-
-        start *= np.pi / 180.0
-        end *= np.pi / 180.0
-        opt = 4.0 / 3.0 * np.tan((end - start) / 4.0) * radius
-
-        inner = radius * (1 - width)
-        verts = [
-            polar2xy(radius, start),
-            (
-                polar2xy(radius, start) +
-                polar2xy(opt, start + 0.5 * np.pi)
-            ),
-            (
-                polar2xy(radius, end) +
-                polar2xy(opt, end - 0.5 * np.pi)
-            ),
-            polar2xy(radius, end),
-            polar2xy(inner, end),
-            (
-                polar2xy(inner, end) +
-                polar2xy(opt * (1 - width), end - 0.5 * np.pi)
-            ),
-            (
-                polar2xy(inner, start) +
-                polar2xy(opt * (1 - width), start + 0.5 * np.pi)
-            ),
-            polar2xy(inner, start),
-            polar2xy(radius, start),
-            ]
-
-        codes = [
-            Path.MOVETO,
-            Path.CURVE4,
-            Path.CURVE4,
-            Path.CURVE4,
-            Path.LINETO,
-            Path.CURVE4,
-            Path.CURVE4,
-            Path.CURVE4,
-            Path.CLOSEPOLY,
-        ]
-
-        path = Path(verts, codes)
-        patch = patches.PathPatch(
-            path,
-            facecolor=color + (0.5,),
-            edgecolor=color + (0.4,),
-            antialiased=True,
-            lw=LW
-        )
-        self.ax.add_patch(patch)
-
-    @zwave_utils.thread_call
-    def create_chords(self):
-        chordwidth = 0.7
-        radius = 0.9
-
-        neighbors = self.neighbors
-
-        for neighbor in neighbors:
-            if neighbor is None:
-                continue
-
-            color = self.color_converted
-
-            if self.index != 0 and neighbor.chord_width > self.chord_width:
-                color = neighbor.color_converted
-
-            neighbor_pos = self.get_neighbor_pos(neighbor.id)
-            node_pos = neighbor.get_neighbor_pos(self.id)
-
-            if None in (neighbor_pos, node_pos):
-                continue
-
-            start1, end1 = neighbor_pos
-            start2, end2 = node_pos
-
-            # start, end should be in [0, 360)
-            if start1 > end1:
-                start1, end1 = end1, start1
-            if start2 > end2:
-                start2, end2 = end2, start2
-            start1 *= np.pi / 180.0
-            end1 *= np.pi / 180.0
-            start2 *= np.pi / 180.0
-            end2 *= np.pi / 180.0
-            opt1 = 4.0 / 3.0 * np.tan((end1 - start1) / 4.0) * radius
-            opt2 = 4.0 / 3.0 * np.tan((end2 - start2) / 4.0) * radius
-            rchord = radius * (1 - chordwidth)
-            verts = [
-                polar2xy(radius, start1),
-                (
-                    polar2xy(radius, start1) +
-                    polar2xy(opt1, start1 + 0.5 * np.pi)
-                ),
-                polar2xy(radius, end1) + polar2xy(opt1, end1 - 0.5 * np.pi),
-                polar2xy(radius, end1),
-                polar2xy(rchord, end1),
-                polar2xy(rchord, start2),
-                polar2xy(radius, start2),
-                (
-                    polar2xy(radius, start2) +
-                    polar2xy(opt2, start2 + 0.5 * np.pi)
-                ),
-                polar2xy(radius, end2) + polar2xy(opt2, end2 - 0.5 * np.pi),
-                polar2xy(radius, end2),
-                polar2xy(rchord, end2),
-                polar2xy(rchord, start1),
-                polar2xy(radius, start1),
-            ]
-
-            codes = [
-                Path.MOVETO,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-                Path.CURVE4,
-            ]
-
-            path = Path(verts, codes)
-            patch = patches.PathPatch(
-                path,
-                facecolor=color + (0.5,),
-                edgecolor=color + (0.4,),
-                antialiased=True,
-                lw=LW
-            )
-            self.ax.add_patch(patch)
-
 
 def get_coord(magnitude, degrees):
     # angle = np.radians(degrees)
@@ -426,93 +577,761 @@ def polar2xy(r, theta):
     return np.array([r * np.cos(theta), r * np.sin(theta)])
 
 
+def chord_damage(old, new, margin=0.01):
+    """
+    The areas of the diagram covered by chords that differ between two
+    geometries of the same nodes.
+
+    :param old: Geometry before the change
+    :type old: ChordGeometry
+    :param new: Geometry after the change
+    :type new: ChordGeometry
+    :param margin: Added around every area to cover the line width
+    :type margin: float
+    :return: [(x0, y0, x1, y1), ...] in diagram coordinates
+    :rtype: list
+    """
+    def chords(geometry):
+        node_ids = geometry.layout.node_ids
+        source, target = geometry.chords
+        return dict(
+            ((node_ids[i], node_ids[j]), path.vertices)
+            for i, j, path in zip(source, target, geometry.chord_paths)
+        )
+
+    old_chords = chords(old)
+    new_chords = chords(new)
+    res = []
+
+    for key in set(old_chords) | set(new_chords):
+        old_verts = old_chords.get(key, None)
+        new_verts = new_chords.get(key, None)
+
+        if (
+            old_verts is not None and
+            new_verts is not None and
+            np.allclose(old_verts, new_verts)
+        ):
+            continue
+
+        for verts in (old_verts, new_verts):
+            if verts is None:
+                continue
+
+            x0, y0 = verts.min(axis=0)
+            x1, y1 = verts.max(axis=0)
+            res += [(x0 - margin, y0 - margin, x1 + margin, y1 + margin)]
+
+    return res
+
+
 class Plot(object):
 
-    def __init__(self, network):
+    # seconds to wait after a change on the network before the diagram is
+    # updated, changes that come in bursts get handled together.
+    UPDATE_DELAY = 1.0
+
+    def __init__(self, network, node_ids=None):
         self.network = network
+        self.node_ids = node_ids
+
+        self.fig = Figure()
+        self.fig.patch.set_alpha(0.0)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_axes([0, 0, 1, 1])
+        self.rotation = 0
+        self.layout = None
+        self.inches = 0.0
+        self.nodes = []
+        self._drawn = False
+        self._lock = threading.RLock()
+        self._collections = {}
+        self._listeners = []
+        self._timer = None
 
-        node_id_list = []
-        node_list = [network.controller.node] + network.nodes.values()
-        for node in node_list:
-            node_id_list += [node.id]
+        self._load(self._node_list())
 
-        node_id_list = sorted(node_id_list, key=int)
+    def _node_list(self):
+        network = self.network
+        node_list = [network.controller.node] + network.nodes.values()
+        if self.node_ids is not None:
+            node_list = list(
+                node for node in node_list
+                if node.id in self.node_ids or
+                node is network.controller.node
+            )
+        return sorted(node_list, key=lambda n: int(n.id))
 
-        self.fig = plt.figure(
-            figsize=(len(node_id_list) / 4, len(node_id_list) / 4)
+    def _load(self, node_list):
+        self.layout = ChordLayout(
+            self.network.neighbor_matrix,
+            list(node.id for node in node_list)
         )
-        self.ax = plt.axes([0, 0, 1, 1])
+
+        # the figure only covers the diagram, the scale of the diagram
+        # compared to the font size is the same as a figure of
+        # len(node_list) / 4 inches, at least 2, covering -1.1 to 1.1
+        self.inches = max(len(node_list) / 4.0, 2.0) * (LIMIT / 1.1)
+        self.fig.set_size_inches(self.inches, self.inches, forward=False)
+
         self.nodes = []
+        for i, node in enumerate(node_list):
+            self.nodes += [Node(node, self.nodes, self.ax, i, self.layout)]
+
+        self._drawn = False
+
+    def update(self):
+        """
+        Bring the diagram up to date with the network.
+
+        When only the neighbors of nodes changed the chords are the only
+        thing that gets created again, a node being added or removed
+        changes the whole diagram.
+
+        :return: The areas of the diagram that changed as (x0, y0, x1, y1)
+        in diagram coordinates, None if all of the diagram changed.
+        :rtype: list or None
+        """
+        with self._lock:
+            node_list = self._node_list()
+            layout = ChordLayout(
+                self.network.neighbor_matrix,
+                list(node.id for node in node_list)
+            )
 
-        for i, node_id in enumerate(node_id_list):
-            for node in node_list:
-                if node.id == node_id:
-                    self.nodes += [Node(node, self.nodes, self.ax, i)]
-            else:
-                continue
+            if layout.key == self.layout.key:
+                return []
+
+            if layout.node_ids != self.layout.node_ids:
+                self._load(node_list)
+                return None
+
+            damage = chord_damage(self.layout.geometry(), layout.geometry())
+
+            self.layout = layout
+            for node in self.nodes:
+                node.layout = layout
+                node._neighbors = None
+
+            if self._drawn:
+                collection = self._collections.pop('chords', None)
+                if collection is not None:
+                    collection.remove()
+
+                geometry = layout.geometry(self.rotation)
+                self._add_collection(
+                    'chords',
+                    geometry.chord_paths,
+                    self._chord_colors(geometry)
+                )
+
+            return damage
+
+    def add_listener(self, callback):
+        """
+        Call a function when the diagram changes.
+
+        The plot starts to watch the network for added and removed nodes
+        and for neighbor updates when the first listener is added.
+
+        :param callback: Called with the plot and the damage returned by
+        update
+        :type callback: callable
+        """
+        if callback in self._listeners:
+            return
+
+        self._listeners += [callback]
+        if len(self._listeners) == 1:
+            for signal in self._signals:
+                dispatcher.connect(self._on_network_change, signal)
+
+    def remove_listener(self, callback):
+        """
+        Stop calling a function when the diagram changes.
+
+        :param callback: The function passed to add_listener
+        :type callback: callable
+        """
+        if callback not in self._listeners:
+            return
+
+        self._listeners.remove(callback)
+        if not self._listeners:
+            for signal in self._signals:
+                dispatcher.disconnect(self._on_network_change, signal)
+
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
 
     @property
-    def image(self):
-        self.ax.set_xlim(-1.1, 1.1)
-        self.ax.set_ylim(-1.1, 1.1)
+    def _signals(self):
+        return (
+            self.network.SIGNAL_NODE_ADDED,
+            self.network.SIGNAL_NODE_REMOVED,
+            self.network.SIGNAL_CONTROLLER_COMMAND,
+            self.network.SIGNAL_HEAL_PROGRESS,
+        )
+
+    def _on_network_change(self, sender, network=None, **_):
+        if network is not self.network:
+            return
+
+        # the neighbor matrix gets marked out of date by the same signals,
+        # waiting makes sure that has happened.
+        if self._timer is not None:
+            self._timer.cancel()
+
+        self._timer = threading.Timer(self.UPDATE_DELAY, self._notify)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _notify(self):
+        self._timer = None
+        damage = self.update()
+
+        if damage == []:
+            return
+
+        for callback in self._listeners[:]:
+            callback(self, damage)
 
-        threads = []
+    def _chord_colors(self, geometry, colors=None):
+        if colors is None:
+            colors = self._node_colors()
+
+        source, target = geometry.chords
+        chord_width = geometry.chord_width
+        use_target = (source != 0) & (chord_width[target] > chord_width[source])
+        return np.where(
+            use_target[:, None],
+            colors[target],
+            colors[source]
+        )
+
+    def _node_colors(self):
+        return np.array(
+            list(node.color_converted for node in self.nodes)
+        ).reshape(-1, 3)
+
+    def _add_collection(self, name, paths, rgb):
+        if not len(paths):
+            return
+
+        alpha = np.ones((len(rgb), 1))
+        collection = PathCollection(
+            paths,
+            facecolors=np.hstack((rgb, alpha * 0.5)),
+            edgecolors=np.hstack((rgb, alpha * 0.4)),
+            linewidths=LW,
+            antialiaseds=True
+        )
+        self.ax.add_collection(collection)
+        self._collections[name] = collection
+
+    def create_collections(self):
+        """
+        Add the arcs and the chords of every node to the axes as two
+        collections.
+        """
+        geometry = self.layout.geometry(self.rotation)
+        colors = self._node_colors()
+
+        self._collections = {}
+        self._add_collection('arcs', geometry.arc_paths, colors)
+        self._add_collection(
+            'chords',
+            geometry.chord_paths,
+            self._chord_colors(geometry, colors)
+        )
+
+    def write_text(self):
+        # the labels are placed using -cos, so they have to be turned the
+        # other way for the labels to follow the arcs.
         for node in self.nodes:
-            threads += [
-                node.create_node(),
-                node.create_chords(),
-                node.write_text()
-            ]
+            node.write_text(-self.rotation)
+
+    def draw(self, rotation=0):
+        """
+        Create the artists of the diagram rotated by rotation degrees.
 
-        while threads:
-            for t in threads[:]:
-                if not t.isAlive():
-                    threads.remove(t)
+        The artists are only created again if the rotation changes.
 
+        :param rotation: Counter clockwise rotation in degrees
+        :type rotation: int, float
+        """
+        if self._drawn and rotation == self.rotation:
+            return
+
+        self.ax.clear()
+        self.ax.patch.set_alpha(0.0)
         self.ax.axis('off')
 
-        buf = BytesIO()
-        plt.savefig(
-            buf,
-            format='png',
-            dpi=600,
-            transparent=True,
-            bbox_inches='tight',
-            pad_inches=0.02
-        )
-        buf.seek(0)
-        image = Image.open(buf)
+        self.rotation = rotation
+        self.create_collections()
+        self.write_text()
+        self._drawn = True
 
-        bg = Image.new(
-            image.mode,
-            image.size,
-            image.getpixel((0, 0))
+    @property
+    def size(self):
+        """
+        The default width and height of the image in pixels.
+
+        :rtype: int
+        """
+        return min(int(self.inches * DPI), MAX_SIZE)
+
+    def _set_view(self, size, x, y, width, height):
+        # shows the part of an image that is size pixels wide starting at
+        # pixel x, y. The dpi is what keeps the font size in scale with the
+        # rest of the diagram.
+        dpi = float(size) / self.inches
+        pixel = 2.0 * LIMIT / size
+
+        self.fig.set_dpi(dpi)
+        self.fig.set_size_inches(
+            (width + 0.01) / dpi,
+            (height + 0.01) / dpi,
+            forward=False
         )
 
-        diff = ImageChops.difference(image, bg)
-        diff = ImageChops.add(diff, diff, 2.0, -100)
-        bbox = diff.getbbox()
-        if bbox:
-            img = image.crop(bbox)
-            img = img.resize(
-                (int(image.size[0] * 0.6), int(image.size[0] * 0.6)),
-                Image.ANTIALIAS
-            )
-        else:
-            img = image.resize(
-                (int(image.size[0] * 0.6), int(image.size[0] * 0.6)),
-                Image.ANTIALIAS
+        x_min = -LIMIT + x * pixel
+        y_max = LIMIT - y * pixel
+        self.ax.set_xlim(x_min, x_min + width * pixel)
+        self.ax.set_ylim(y_max - height * pixel, y_max)
+
+    def render(self, size=None, rotation=0):
+        """
+        Draw the diagram into an RGBA buffer.
+
+        The diagram fills the whole image so there is nothing to crop, the
+        buffer belongs to the Agg canvas of the plot and is not copied.
+
+        :param size: Width and height of the image in pixels. Defaults to
+        DPI pixels per inch of the figure, up to MAX_SIZE.
+        :type size: int, None
+        :param rotation: Counter clockwise rotation in degrees
+        :type rotation: int, float
+        :return: (width, height, buffer)
+        :rtype: tuple
+        """
+        if size is None:
+            size = self.size
+
+        with self._lock:
+            self.draw(rotation)
+            self._set_view(size, 0, 0, size, size)
+            self.canvas.draw()
+
+            width, height = self.canvas.get_width_height()
+            return width, height, self.canvas.buffer_rgba()
+
+    def render_tile(self, size, x, y, width, height, rotation=0):
+        """
+        Draw part of the diagram.
+
+        :param size: Width and height of the whole image in pixels
+        :type size: int
+        :param x: Left edge of the tile in the whole image
+        :type x: int
+        :param y: Top edge of the tile in the whole image
+        :type y: int
+        :param width: Width of the tile
+        :type width: int
+        :param height: Height of the tile
+        :type height: int
+        :param rotation: Counter clockwise rotation in degrees
+        :type rotation: int, float
+        :rtype: PIL.Image.Image
+        """
+        with self._lock:
+            self.draw(rotation)
+            self._set_view(size, x, y, width, height)
+            self.canvas.draw()
+
+            img = Image.frombuffer(
+                'RGBA',
+                self.canvas.get_width_height(),
+                self.canvas.buffer_rgba(),
+                'raw',
+                'RGBA',
+                0,
+                1
             )
+            # crop copies the pixels out of the canvas buffer, the buffer
+            # gets used again for the next tile
+            return img.crop((0, 0, width, height))
+
+    def save(self, path, size=None, rotation=0, facecolor=None, fmt=None):
+        """
+        Write the diagram to a file.
+
+        :param path: File to write
+        :type path: str
+        :param size: Width and height of the image in pixels. Defaults to
+        DPI pixels per inch of the figure, up to MAX_SIZE.
+        :type size: int, None
+        :param rotation: Counter clockwise rotation in degrees
+        :type rotation: int, float
+        :param facecolor: Background color, None for a transparent
+        background.
+        :type facecolor: str, tuple, None
+        :param fmt: 'png', 'svg' or any other format matplotlib can write.
+        Defaults to the extension of path.
+        :type fmt: str, None
+        """
+        if size is None:
+            size = self.size
+
+        with self._lock:
+            self.draw(rotation)
+            self._set_view(size, 0, 0, size, size)
+
+            # the patch of the figure keeps its alpha when savefig changes
+            # the color of it.
+            if facecolor is not None:
+                self.fig.patch.set_alpha(1.0)
+            try:
+                self.fig.savefig(
+                    path,
+                    dpi=self.fig.dpi,
+                    format=fmt,
+                    facecolor='none' if facecolor is None else facecolor,
+                    edgecolor='none'
+                )
+            finally:
+                self.fig.patch.set_alpha(0.0)
+                # savefig hands the figure to a canvas of the format while
+                # writing, the Agg canvas is the one the tiles use.
+                self.fig.set_canvas(self.canvas)
 
-        image.close()
+    @property
+    def image(self):
+        width, height, buf = self.render()
+        img = Image.frombuffer(
+            'RGBA',
+            (width, height),
+            buf,
+            'raw',
+            'RGBA',
+            0,
+            1
+        )
         return img, self.nodes
 
     def close(self):
+        for callback in self._listeners[:]:
+            self.remove_listener(callback)
+
         self.ax.clear()
         del self.ax
         # plt.close()
 
 
+def _rotate_box(box, rotation):
+    # the bounding box of a box that is rotated counter clockwise around
+    # the center of the diagram.
+    if not rotation:
+        return box
+
+    x0, y0, x1, y1 = box
+    angle = math.radians(rotation)
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+
+    xs = []
+    ys = []
+    for x, y in ((x0, y0), (x0, y1), (x1, y0), (x1, y1)):
+        xs += [x * cos - y * sin]
+        ys += [x * sin + y * cos]
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class TilePyramid(object):
+    """
+    Tiles of a diagram at power of two scales.
+
+    Level 0 is the default size of the plot, every level up doubles the
+    size and every level down halves it. Tiles are rendered from the plot
+    the first time they are needed and kept in a LRU cache. The tiles a
+    region is missing are drawn with a single draw of the plot that covers
+    all of them, and cut up into tiles afterwards.
+    """
+
+    TILE_SIZE = 256
+    MIN_LEVEL = -6
+    MAX_LEVEL = 3
+
+    def __init__(self, plot, cache_size=256):
+        """
+        :param plot: The diagram
+        :type plot: Plot
+        :param cache_size: Number of tiles to keep
+        :type cache_size: int
+        """
+        self.plot = plot
+        self.base_size = plot.size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def level_size(self, level):
+        """
+        The width and height of the image at a level.
+
+        :rtype: int
+        """
+        return max(int(round(self.base_size * 2.0 ** level)), 1)
+
+    def level_for(self, size):
+        """
+        The smallest level that is at least size pixels wide.
+
+        :rtype: int
+        """
+        level = int(
+            math.ceil(math.log(max(size, 1) / float(self.base_size), 2))
+        )
+        return max(self.MIN_LEVEL, min(self.MAX_LEVEL, level))
+
+    def clear(self):
+        """
+        Forget every tile.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def invalidate(self, damage=None):
+        """
+        Forget the tiles that cover the parts of the diagram that changed.
+
+        :param damage: Areas as (x0, y0, x1, y1) in diagram coordinates,
+        None when all of the diagram changed.
+        :type damage: list, None
+        """
+        with self._lock:
+            if damage is None:
+                self.base_size = self.plot.size
+                self._cache.clear()
+                return
+
+            if not damage:
+                return
+
+            rotated = {}
+            tile_size = self.TILE_SIZE
+
+            for key in list(self._cache.keys()):
+                level, rotation, tile_x, tile_y = key
+
+                if rotation not in rotated:
+                    rotated[rotation] = list(
+                        _rotate_box(box, rotation) for box in damage
+                    )
+
+                pixel = 2.0 * LIMIT / self.level_size(level)
+                x0 = -LIMIT + tile_x * tile_size * pixel
+                x1 = x0 + tile_size * pixel
+                y1 = LIMIT - tile_y * tile_size * pixel
+                y0 = y1 - tile_size * pixel
+
+                for box_x0, box_y0, box_x1, box_y1 in rotated[rotation]:
+                    if (
+                        box_x0 < x1 and x0 < box_x1 and
+                        box_y0 < y1 and y0 < box_y1
+                    ):
+                        del self._cache[key]
+                        break
+
+    def tile(self, level, tile_x, tile_y, rotation=0):
+        """
+        A tile of the image at a level.
+
+        :rtype: PIL.Image.Image
+        """
+        key = (level, rotation, tile_x, tile_y)
+
+        with self._lock:
+            if key in self._cache:
+                img = self._cache.pop(key)
+                self._cache[key] = img
+                return img
+
+        return self._render(level, [(tile_x, tile_y)], rotation)[key]
+
+    def _render(self, level, tiles, rotation):
+        # draws the box around the tiles once and cuts it into the tiles
+        size = self.level_size(level)
+        tile_size = self.TILE_SIZE
+
+        left = min(tile_x for tile_x, _ in tiles) * tile_size
+        top = min(tile_y for _, tile_y in tiles) * tile_size
+        right = min(
+            (max(tile_x for tile_x, _ in tiles) + 1) * tile_size,
+            size
+        )
+        bottom = min(
+            (max(tile_y for _, tile_y in tiles) + 1) * tile_size,
+            size
+        )
+
+        region = self.plot.render_tile(
+            size,
+            left,
+            top,
+            right - left,
+            bottom - top,
+            rotation
+        )
+
+        res = {}
+        for tile_x, tile_y in tiles:
+            x = tile_x * tile_size - left
+            y = tile_y * tile_size - top
+            res[(level, rotation, tile_x, tile_y)] = region.crop((
+                x,
+                y,
+                min(x + tile_size, region.size[0]),
+                min(y + tile_size, region.size[1])
+            ))
+
+        with self._lock:
+            for key, img in res.items():
+                self._cache[key] = img
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return res
+
+    def compose(
+        self,
+        size,
+        x,
+        y,
+        width,
+        height,
+        rotation=0,
+        resample=Image.NEAREST
+    ):
+        """
+        Part of the diagram drawn size pixels wide.
+
+        Only the tiles that are inside of the region get rendered. The tiles
+        come from the smallest level that is at least size pixels wide and
+        are scaled down to size.
+
+        :param size: Width and height of the whole image
+        :type size: int
+        :param x: Left edge of the region
+        :type x: int
+        :param y: Top edge of the region
+        :type y: int
+        :param width: Width of the region
+        :type width: int
+        :param height: Height of the region
+        :type height: int
+        :param rotation: Counter clockwise rotation in degrees
+        :type rotation: int, float
+        :param resample: PIL resampling filter used to scale the tiles
+        :type resample: int
+        :return: The image and the position of its top left corner. The
+        image can be a pixel bigger than the region.
+        :rtype: tuple
+        """
+        level = self.level_for(size)
+        level_size = self.level_size(level)
+        scale = float(level_size) / size
+
+        left = max(int(math.floor(x * scale)), 0)
+        top = max(int(math.floor(y * scale)), 0)
+        right = min(int(math.ceil((x + width) * scale)), level_size)
+        bottom = min(int(math.ceil((y + height) * scale)), level_size)
+
+        region = Image.new(
+            'RGBA',
+            (max(right - left, 1), max(bottom - top, 1)),
+            (0, 0, 0, 0)
+        )
+
+        tile_size = self.TILE_SIZE
+        tiles = list(
+            (tile_x, tile_y)
+            for tile_y in range(
+                top // tile_size,
+                (bottom - 1) // tile_size + 1
+            )
+            for tile_x in range(
+                left // tile_size,
+                (right - 1) // tile_size + 1
+            )
+        )
+
+        images = {}
+        missing = []
+        with self._lock:
+            for tile_x, tile_y in tiles:
+                key = (level, rotation, tile_x, tile_y)
+                if key in self._cache:
+                    images[key] = self._cache.pop(key)
+                    self._cache[key] = images[key]
+                else:
+                    missing += [(tile_x, tile_y)]
+
+        if missing:
+            images.update(self._render(level, missing, rotation))
+
+        for tile_x, tile_y in tiles:
+            region.paste(
+                images[(level, rotation, tile_x, tile_y)],
+                (tile_x * tile_size - left, tile_y * tile_size - top)
+            )
+
+        out_size = (
+            max(int(round(region.size[0] / scale)), 1),
+            max(int(round(region.size[1] / scale)), 1)
+        )
+        if out_size != region.size:
+            region = region.resize(out_size, resample)
+
+        return region, (int(round(left / scale)), int(round(top / scale)))
+
+
+def benchmark(network, steps=(8, 16, 32, 64, 128, 232)):
+    """
+    Time how long it takes to render the diagram of a network.
+
+    The diagram is rendered for the first n nodes of the network for every
+    n in steps that the network has nodes for.
+
+    :param network: The network to draw
+    :type network: ZWaveNetwork
+    :param steps: Node counts to render
+    :type steps: list, tuple
+    :return: [(node count, seconds), ...]
+    :rtype: list
+    """
+    node_ids = sorted(network.nodes.keys())
+    res = []
+
+    for count in steps:
+        if count > len(node_ids) + 1:
+            break
+
+        ChordGeometry.clear_cache()
+        start = time.time()
+
+        plot = Plot(network, node_ids[:count - 1])
+        image = plot.image[0]
+        plot.close()
+
+        res += [(count, time.time() - start)]
+        del image
+
+    return res
+
+
 class CurvedText(mtext.Text):
     """
     A text object that follows an arbitrary curve.
@@ -544,7 +1363,25 @@ class CurvedText(mtext.Text):
             t.set_zorder(self.__zorder + 1)
 
     def draw(self, renderer, *args, **kwargs):
-        self.update_positions(renderer)
+        # when only part of the diagram is drawn the characters of text
+        # that is not in view are hidden instead of being laid out.
+        visible = self.in_view()
+        for c, t in self.__characters:
+            t.set_visible(visible)
+
+        if visible:
+            self.update_positions(renderer)
+
+    def in_view(self, margin=0.05):
+        x_min, x_max = self.axes.get_xlim()
+        y_min, y_max = self.axes.get_ylim()
+
+        return (
+            np.min(self.__x) - margin < x_max and
+            np.max(self.__x) + margin > x_min and
+            np.min(self.__y) - margin < y_max and
+            np.max(self.__y) + margin > y_min
+        )
 
     def update_positions(self, renderer):
         x_lim = self.axes.get_xlim()
@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Render the network diagram without EventGhost.
+
+The network is built from a zwcfg_*.xml file written by OpenZWave or from a
+snapshot saved with SnapshotNetwork.save, and drawn with the Agg backend of
+the bundled matplotlib.
+
+usage: zwave_diagram_export.py [-h] [-o OUTPUT] [-s SIZE] [-f FORMAT]
+                               [-r ROTATION] [-b BACKGROUND] [-p PROCESSES]
+                               source [source ...]
+
+A source that is a folder is searched for zwcfg_*.xml and *.json files, the
+images of those are written to the same sub folders of OUTPUT.
+"""
+
+import os
+import sys
+import site
+import json
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+import xml.etree.ElementTree as ElementTree
+
+LIBS_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'libs'
+)
+
+site.addsitedir(LIBS_FOLDER)
+NUMPY_LIBS = os.path.join(LIBS_FOLDER, 'numpy', '.libs')
+
+if NUMPY_LIBS not in os.environ['PATH']:
+    os.environ['PATH'] += os.pathsep + NUMPY_LIBS
+
+import numpy as np # NOQA
+from zwave_neighbors import ZWaveNeighborMatrix # NOQA
+from zwave_cord_diagram import Plot, ChordGeometry # NOQA
+
+logger = logging.getLogger('openzwave')
+
+FORMATS = ('png', 'svg', 'pdf')
+
+
+class SnapshotNode(object):
+    """
+    The parts of a node the diagram uses.
+    """
+
+    def __init__(self, network, node_id, name=u'', location=u'', neighbors=()):
+        self.network = network
+        self.id = node_id
+        self.name = name
+        self.location = location
+        self.neighbors = set(neighbors)
+
+    def __repr__(self):
+        return '<SnapshotNode %s: %s>' % (self.id, self.name)
+
+    @property
+    def node_id(self):
+        return self.id
+
+    @property
+    def object_id(self):
+        return self.id
+
+    def to_dict(self):
+        return dict(
+            node_id=self.id,
+            name=self.name,
+            location=self.location,
+            neighbors=sorted(self.neighbors)
+        )
+
+
+class SnapshotController(object):
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def node_id(self):
+        return self.node.id
+
+
+class SnapshotNeighborMatrix(ZWaveNeighborMatrix):
+    """
+    Neighbor matrix that is filled from the nodes of a snapshot.
+
+    There is no manager to ask for neighbors, so the matrix is never
+    refreshed and nothing is connected to the dispatcher.
+    """
+
+    # noinspection PyMissingConstructor
+    def __init__(self, network):
+        self._network = network
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((self.SIZE, self.SIZE), dtype=bool)
+        self._present = np.zeros(self.SIZE, dtype=bool)
+        self._dirty = set()
+        self._dirty_all = False
+
+        nodes = [network.controller.node] + network.nodes.values()
+        for node in nodes:
+            self._present[node.id] = True
+            neighbors = list(n for n in node.neighbors if 0 < n < self.SIZE)
+            self._matrix[node.id, neighbors] = True
+
+    def _refresh(self):
+        pass
+
+
+class SnapshotNetwork(object):
+    """
+    A network that has been read from a file.
+
+    Has the attributes of ZWaveNetwork the diagram needs: home_id,
+    controller, nodes and neighbor_matrix.
+    """
+
+    def __init__(self, home_id, controller_id, nodes):
+        """
+        :param home_id: Home id of the network
+        :type home_id: int
+        :param controller_id: Node id of the controller
+        :type controller_id: int
+        :param nodes: [dict(node_id=, name=, location=, neighbors=), ...]
+        :type nodes: list
+        """
+        self.home_id = home_id
+        self.controller = None
+        self.nodes = {}
+
+        for node in nodes:
+            node_id = int(node['node_id'])
+            node = SnapshotNode(
+                self,
+                node_id,
+                node.get('name', u''),
+                node.get('location', u''),
+                list(int(n) for n in node.get('neighbors', ()))
+            )
+            if node_id == controller_id:
+                self.controller = SnapshotController(node)
+            else:
+                self.nodes[node_id] = node
+
+        if self.controller is None:
+            self.controller = SnapshotController(
+                SnapshotNode(self, controller_id)
+            )
+
+        self.neighbor_matrix = SnapshotNeighborMatrix(self)
+
+    def __repr__(self):
+        return '<SnapshotNetwork %s: %d nodes>' % (
+            self.home_id_str,
+            len(self.nodes) + 1
+        )
+
+    @property
+    def home_id_str(self):
+        return '0x' + hex(self.home_id)[2:].rstrip('L').upper()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a zwcfg xml file or a json snapshot.
+
+        :param path: The file to read
+        :type path: str
+        :rtype: SnapshotNetwork
+        """
+        if path.lower().endswith('.json'):
+            return cls.from_snapshot(path)
+        return cls.from_xml(path)
+
+    @classmethod
+    def from_xml(cls, path):
+        """
+        Read the network from a zwcfg_*.xml file.
+
+        Versions of OpenZWave that do not save the neighbors of the nodes
+        give a diagram without any chords.
+
+        :param path: The zwcfg_*.xml file
+        :type path: str
+        :rtype: SnapshotNetwork
+        """
+        root = ElementTree.parse(path).getroot()
+
+        def tag(element):
+            # the elements are in the open-zwave namespace
+            return element.tag.rsplit('}', 1)[-1]
+
+        nodes = []
+        for element in root:
+            if tag(element) != 'Node':
+                continue
+
+            neighbors = []
+            for child in element:
+                if tag(child) == 'Neighbors' and child.text:
+                    neighbors = list(
+                        int(n) for n in child.text.split(',') if n.strip()
+                    )
+
+            nodes += [dict(
+                node_id=int(element.get('id')),
+                name=element.get('name', u''),
+                location=element.get('location', u''),
+                neighbors=neighbors
+            )]
+
+        if not any(node['neighbors'] for node in nodes):
+            logger.warning(u'No neighbors found in : %s', path)
+
+        return cls(
+            int(root.get('home_id'), 16),
+            int(root.get('node_id')),
+            nodes
+        )
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """
+        Read the network from a file written by save.
+
+        :param path: The json file
+        :type path: str
+        :rtype: SnapshotNetwork
+        """
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        return cls(
+            int(data['home_id'], 16),
+            int(data['controller_id']),
+            data['nodes']
+        )
+
+    @classmethod
+    def from_network(cls, network):
+        """
+        Copy the nodes of a running network.
+
+        :param network: The network to copy
+        :type network: ZWaveNetwork
+        :rtype: SnapshotNetwork
+        """
+        controller_node = network.controller.node
+        nodes = [controller_node] + network.nodes.values()
+
+        return cls(
+            network.home_id,
+            controller_node.id,
+            list(
+                dict(
+                    node_id=node.id,
+                    name=node.name,
+                    location=node.location,
+                    neighbors=list(node.neighbors)
+                ) for node in nodes
+            )
+        )
+
+    def to_dict(self):
+        nodes = [self.controller.node] + self.nodes.values()
+        return dict(
+            home_id=self.home_id_str,
+            controller_id=self.controller.node_id,
+            nodes=list(
+                node.to_dict() for node in sorted(nodes, key=lambda n: n.id)
+            )
+        )
+
+    def save(self, path):
+        """
+        Write the network to a json snapshot.
+
+        :param path: The file to write
+        :type path: str
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4, sort_keys=True)
+
+
+def export(
+    network,
+    output,
+    sizes=(None,),
+    formats=('png',),
+    rotation=0,
+    background='black'
+):
+    """
+    Write the diagram of a network to image files.
+
+    The files are named output_<size>.<format>.
+
+    :param network: The network to draw
+    :type network: ZWaveNetwork, SnapshotNetwork
+    :param output: Path of the files without the size and the extension
+    :type output: str
+    :param sizes: Widths of the images in pixels, None is the default size
+    :type sizes: list, tuple
+    :param formats: File formats to write
+    :type formats: list, tuple
+    :param rotation: Counter clockwise rotation in degrees
+    :type rotation: int, float
+    :param background: Background color, None for a transparent background
+    :type background: str, None
+    :return: The files that have been written
+    :rtype: list
+    """
+    plot = Plot(network)
+    res = []
+
+    try:
+        for size in sizes:
+            if size is None:
+                size = plot.size
+
+            for fmt in formats:
+                path = '%s_%d.%s' % (output, size, fmt)
+                plot.save(path, size, rotation, background, fmt)
+                res += [path]
+    finally:
+        plot.close()
+
+    return res
+
+
+def _export_file(job):
+    # runs in the worker processes, errors are handed back instead of
+    # raised so one broken site does not stop the batch.
+    source, output, sizes, formats, rotation, background = job
+    start = time.time()
+
+    try:
+        folder = os.path.dirname(output)
+        if folder and not os.path.exists(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+
+        files = export(
+            SnapshotNetwork.load(source),
+            output,
+            sizes,
+            formats,
+            rotation,
+            background
+        )
+    except Exception as err:
+        return source, [], '%s: %s' % (err.__class__.__name__, err), 0.0
+    finally:
+        ChordGeometry.clear_cache()
+
+    return source, files, None, time.time() - start
+
+
+def find_sources(paths, output):
+    """
+    The files to render and where to write their images.
+
+    :param paths: zwcfg xml files, json snapshots and folders holding them
+    :type paths: list
+    :param output: Folder the images are written to
+    :type output: str
+    :return: [(source, output path without size and extension), ...]
+    :rtype: list
+    """
+    res = []
+
+    def name(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def is_source(file_name):
+        lower_name = file_name.lower()
+        return (
+            (lower_name.startswith('zwcfg_') and lower_name.endswith('.xml'))
+            or lower_name.endswith('.json')
+        )
+
+    for path in paths:
+        if not os.path.isdir(path):
+            res += [(path, os.path.join(output, name(path)))]
+            continue
+
+        for folder, _, file_names in os.walk(path):
+            relative = os.path.relpath(folder, path)
+            for file_name in sorted(file_names):
+                if is_source(file_name):
+                    res += [(
+                        os.path.join(folder, file_name),
+                        os.path.normpath(
+                            os.path.join(output, relative, name(file_name))
+                        )
+                    )]
+
+    return res
+
+
+def export_many(
+    sources,
+    sizes=(None,),
+    formats=('png',),
+    rotation=0,
+    background='black',
+    processes=None
+):
+    """
+    Render many networks using a pool of processes.
+
+    :param sources: [(source, output path without size and extension), ...]
+    as returned by find_sources
+    :type sources: list
+    :param processes: Number of worker processes, defaults to the number
+    of cpus.
+    :type processes: int, None
+    :return: [(source, files written, error or None, seconds), ...]
+    :rtype: list
+    """
+    jobs = list(
+        (source, output, tuple(sizes), tuple(formats), rotation, background)
+        for source, output in sources
+    )
+
+    if len(jobs) < 2 or processes == 1:
+        return list(_export_file(job) for job in jobs)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_export_file, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render Z-Wave network diagrams.'
+    )
+    parser.add_argument(
+        'source',
+        nargs='+',
+        help='zwcfg_*.xml file, json snapshot or a folder holding them'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default='.',
+        help='folder the images are written to'
+    )
+    parser.add_argument(
+        '-s', '--size',
+        type=int,
+        action='append',
+        help='width of the image in pixels, can be given more than once'
+    )
+    parser.add_argument(
+        '-f', '--format',
+        choices=FORMATS,
+        action='append',
+        help='image format, can be given more than once (default: png)'
+    )
+    parser.add_argument(
+        '-r', '--rotation',
+        type=float,
+        default=0.0,
+        help='counter clockwise rotation in degrees'
+    )
+    parser.add_argument(
+        '-b', '--background',
+        default='black',
+        help='background color, "none" for a transparent background'
+    )
+    parser.add_argument(
+        '-p', '--processes',
+        type=int,
+        default=None,
+        help='number of worker processes (default: number of cpus)'
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    background = args.background
+    if background.lower() == 'none':
+        background = None
+
+    sources = find_sources(args.source, args.output)
+    if not sources:
+        parser.error('no zwcfg_*.xml or json files found')
+
+    results = export_many(
+        sources,
+        args.size or (None,),
+        args.format or ('png',),
+        args.rotation,
+        background,
+        args.processes
+    )
+
+    failed = 0
+    for source, files, error, duration in results:
+        if error is None:
+            print('%s (%.1fs)' % (source, duration))
+            for path in files:
+                print('    ' + path)
+        else:
+            failed += 1
+            print('%s FAILED %s' % (source, error))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
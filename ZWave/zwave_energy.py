@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Energy used by the nodes of a network, worked out from the history of
+their Meter values.
+
+Meters report either a counter in kWh or the power in W, many report
+both. The kWh used is the sum of the increases of a counter. A counter
+that goes back down was reset, the reading after the reset is what was
+used since the reset. Optionally a counter that goes from near the
+rollover value to near 0 is treated as having rolled over instead. Power
+readings are integrated over time, intervals longer than max_gap are
+counted as gaps and left out.
+
+When a node has both, the counter is used and the power readings fill in
+the energy that was used between the last reading before a reset and the
+reset itself.
+
+The samples of all of the meters are put end to end into single arrays.
+The usage of every interval is worked out once for the longest window and
+summed up, the totals of each window are differences of the sums. The
+interval that straddles the start or the end of a window is counted by
+the part of it that is inside the window, so the totals of consecutive
+windows add up to the total of the whole period.
+"""
+
+import time
+import logging
+import numpy as np
+import zwave_history
+import zwave_command_classes
+
+logger = logging.getLogger('openzwave')
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+MONTH = 30 * DAY
+
+ENERGY_UNITS = ('kwh',)
+POWER_UNITS = ('w',)
+
+# keeps the meters apart when the times of all meters are in one array
+_GROUP_OFFSET = 1e11
+
+
+def meter_kind(value):
+    """
+    :param value: A Meter value
+    :type value: ZWaveValue
+    :return: 'energy' for a kWh counter, 'power' for a W reading or None
+    :rtype: str or None
+    """
+    units = (value.units or '').strip().lower()
+    if units in ENERGY_UNITS:
+        return 'energy'
+    if units in POWER_UNITS:
+        return 'power'
+    return None
+
+
+def counter_intervals(groups, times, readings, max_gap, rollover=None):
+    """
+    The increase of the counters of a number of meters between each two
+    readings.
+
+    :param groups: The meter of each reading, with the readings of a meter
+    next to each other and in time order.
+    :type groups: numpy.ndarray
+    :param times: The times of the readings
+    :type times: numpy.ndarray
+    :param readings: The counter readings
+    :type readings: numpy.ndarray
+    :param max_gap: Intervals longer than this many seconds are gaps
+    :type max_gap: float
+    :param rollover: The value the counters roll over at, None when the
+    counters do not roll over
+    :type rollover: float, None
+    :return: dict(group=, start=, usage=, resets=, rollovers=, gaps=) with
+    an array holding a field of every interval
+    :rtype: dict
+    """
+    same = groups[1:] == groups[:-1]
+    dt = np.diff(times)
+    delta = np.diff(readings)
+
+    back = same & (delta < 0)
+    if rollover:
+        rolled = (
+            back &
+            (readings[:-1] > rollover * 0.9) &
+            (readings[1:] < rollover * 0.1)
+        )
+        delta = np.where(rolled, delta + rollover, delta)
+    else:
+        rolled = np.zeros(len(back), bool)
+
+    reset = back & ~rolled
+    delta = np.where(reset, readings[1:], delta)
+
+    return dict(
+        group=groups[:-1],
+        start=times[:-1],
+        usage=np.where(same, delta, 0.0),
+        resets=reset,
+        rollovers=rolled,
+        gaps=np.where(same & (dt > max_gap), dt, 0.0)
+    )
+
+
+def power_intervals(groups, times, watts, max_gap):
+    """
+    The kWh used by a number of meters between each two power readings.
+
+    :param groups: The meter of each reading, see counter_intervals
+    :type groups: numpy.ndarray
+    :param times: The times of the readings
+    :type times: numpy.ndarray
+    :param watts: The power readings in W
+    :type watts: numpy.ndarray
+    :param max_gap: Intervals longer than this many seconds are gaps and
+    are not counted
+    :type max_gap: float
+    :return: dict(group=, start=, usage=, gaps=) with an array holding a
+    field of every interval
+    :rtype: dict
+    """
+    same = groups[1:] == groups[:-1]
+    dt = np.diff(times)
+    counted = same & (dt <= max_gap)
+
+    return dict(
+        group=groups[:-1],
+        start=times[:-1],
+        usage=np.where(
+            counted,
+            0.5 * (watts[:-1] + watts[1:]) * dt / 3.6e6,
+            0.0
+        ),
+        gaps=np.where(same & (dt > max_gap), dt, 0.0)
+    )
+
+
+class Totals(object):
+    """
+    Sums of the fields of intervals per meter over any window.
+
+    The fields are summed up once at every reading, the totals of a window
+    are the differences of the sums at the start and at the end of the
+    window. Between two readings the sums of the amounts are interpolated,
+    so an interval that straddles the start or the end is counted by the
+    part of it inside the window. Resets and rollovers are counted in the
+    window that holds the reading after them.
+    """
+
+    # fields that are counted instead of prorated
+    EVENTS = ('resets', 'rollovers')
+
+    def __init__(self, groups, times, intervals, count):
+        """
+        :param groups: The meter of each reading, see counter_intervals
+        :type groups: numpy.ndarray
+        :param times: The times of the readings
+        :type times: numpy.ndarray
+        :param intervals: See counter_intervals and power_intervals
+        :type intervals: dict
+        :param count: The number of meters
+        :type count: int
+        """
+        self.count = count
+        self._keys = groups * _GROUP_OFFSET + times
+        self._sums = {}
+
+        for name, field in intervals.items():
+            if name not in ('group', 'start'):
+                self._sums[name] = np.concatenate(
+                    ([0.0], np.cumsum(field, dtype=float))
+                )
+
+    def _at(self, name, keys):
+        sums = self._sums[name]
+        if name in self.EVENTS:
+            found = np.searchsorted(self._keys, keys, 'right')
+            return sums[np.maximum(found - 1, 0)]
+        return np.interp(keys, self._keys, sums)
+
+    def __call__(self, start, end):
+        """
+        :param start: Start of the window in seconds since the epoch
+        :type start: float
+        :param end: End of the window
+        :type end: float
+        :return: {field: numpy.ndarray of length count}
+        :rtype: dict
+        """
+        res = {}
+        if not len(self._keys):
+            for name in self._sums:
+                res[name] = np.zeros(self.count)
+            return res
+
+        meters = np.arange(self.count) * _GROUP_OFFSET
+        for name in self._sums:
+            res[name] = (
+                self._at(name, meters + end) -
+                self._at(name, meters + start)
+            )
+        return res
+
+
+def _concatenate(series):
+    if not series:
+        return np.zeros(0, int), np.zeros(0), np.zeros(0)
+
+    groups = np.repeat(
+        np.arange(len(series)),
+        list(len(times) for times, _ in series)
+    )
+    times = np.concatenate(list(t for t, _ in series))
+    readings = np.concatenate(list(r for _, r in series))
+    return groups, times, readings
+
+
+class ZWaveEnergy(object):
+    """
+    Energy used by the nodes and rooms of a network.
+    """
+
+    def __init__(self, network, max_gap=HOUR, rollover=None, points=2000):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param max_gap: Readings further apart than this many seconds are a
+        gap, power is not integrated over a gap
+        :type max_gap: float
+        :param rollover: The value the kWh counters roll over at. None
+        treats every decrease of a counter as a reset.
+        :type rollover: float, None
+        :param points: The samples of a meter are combined into the
+        buckets of the history so there are at least this many over the
+        longest window of a report
+        :type points: int
+        """
+        self.network = network
+        self.max_gap = max_gap
+        self.rollover = rollover
+        self.points = points
+
+    def _resolution(self, length):
+        # one of the bucket lengths of the history, so windows of different
+        # lengths read the same buckets and their totals add up
+        res = None
+        for _, interval, _ in zwave_history.TIERS:
+            if interval and interval <= float(length) / self.points:
+                res = interval
+        return res
+
+    def meters(self, nodes=None):
+        """
+        The energy and power Meter values of nodes.
+
+        :param nodes: Defaults to all of the nodes of the network
+        :type nodes: list, None
+        :return: [(node, value, kind), ...]
+        :rtype: list
+        """
+        if nodes is None:
+            nodes = self.network.nodes.values()
+
+        res = []
+        for node in nodes:
+            for value in node.values:
+                if (
+                    value.command_class !=
+                    zwave_command_classes.COMMAND_CLASS_METER
+                ):
+                    continue
+
+                kind = meter_kind(value)
+                if kind is not None:
+                    res += [(node, value, kind)]
+        return res
+
+    @staticmethod
+    def _node_meters(meters):
+        # the lowest instance is the whole device, higher instances are
+        # the channels of multi channel meters
+        counters = {}
+        powers = {}
+        for node, value, kind in meters:
+            found = counters if kind == 'energy' else powers
+            if (
+                node.id not in found or
+                found[node.id].instance > value.instance
+            ):
+                found[node.id] = value
+        return counters, powers
+
+    def _series(self, values, start, end, resolution, field):
+        history = self.network.history
+        res = []
+        for value in values:
+            samples = history.samples(value, start, end, resolution)
+            res += [(samples['time'], samples[field].astype(float))]
+        return _concatenate(res)
+
+    @staticmethod
+    def _room(node):
+        try:
+            room = node.location
+        except AttributeError:
+            room = None
+        return room or 'Not Assigned'
+
+    def report(self, start=None, end=None, nodes=None):
+        """
+        The energy used from start to end.
+
+        :param start: Seconds since the epoch. Defaults to a month before
+        end.
+        :type start: float, None
+        :param end: Seconds since the epoch. Defaults to now.
+        :type end: float, None
+        :param nodes: Defaults to all of the nodes of the network
+        :type nodes: list, None
+        :return: dict(start=, end=, total=, nodes={node_id: dict(kwh=,
+        source=, counter_kwh=, power_kwh=, missed_kwh=, resets=,
+        rollovers=, gap_seconds=)}, rooms={room: kwh})
+        :rtype: dict
+        """
+        if end is None:
+            end = time.time()
+        if start is None:
+            start = end - MONTH
+
+        return self.reports((end - start,), end, nodes)[end - start]
+
+    def reports(self, windows=(DAY, WEEK, MONTH), end=None, nodes=None):
+        """
+        Reports for rolling windows that end at the same time. The samples
+        are read and the intervals worked out once for the longest window.
+
+        :param windows: The lengths of the windows in seconds
+        :type windows: tuple
+        :param end: Seconds since the epoch. Defaults to now.
+        :type end: float, None
+        :param nodes: Defaults to all of the nodes of the network
+        :type nodes: list, None
+        :return: {window: report}, see report
+        :rtype: dict
+        """
+        if end is None:
+            end = time.time()
+
+        counters, powers = self._node_meters(self.meters(nodes))
+        counter_nodes = sorted(counters.keys())
+        power_nodes = sorted(powers.keys())
+
+        # the readings around the window are needed for the intervals
+        # that straddle its start and its end
+        first = end - max(windows) - self.max_gap
+        last = end + self.max_gap
+        resolution = self._resolution(max(windows))
+
+        c_groups, c_times, c_readings = self._series(
+            list(counters[i] for i in counter_nodes),
+            first,
+            last,
+            resolution,
+            'max'
+        )
+        p_groups, p_times, p_watts = self._series(
+            list(powers[i] for i in power_nodes),
+            first,
+            last,
+            resolution,
+            'mean'
+        )
+
+        counted = counter_intervals(
+            c_groups,
+            c_times,
+            c_readings,
+            self.max_gap,
+            self.rollover
+        )
+        integrated = power_intervals(
+            p_groups,
+            p_times,
+            p_watts,
+            self.max_gap
+        )
+
+        # energy used between the last reading before a reset and the
+        # reset, from the power readings of the same node
+        missed = np.zeros(len(counted['usage']))
+        reset_at = np.flatnonzero(counted['resets'])
+        if len(reset_at) and len(p_times):
+            power_group = dict((n, i) for i, n in enumerate(power_nodes))
+            pairs = np.array(list(
+                power_group.get(n, -1) for n in counter_nodes
+            ))
+            groups = pairs[c_groups[reset_at]]
+            reset_at = reset_at[groups >= 0]
+            groups = groups[groups >= 0]
+
+            keys = p_groups * _GROUP_OFFSET + p_times
+            cumulative = np.concatenate(
+                ([0.0], np.cumsum(integrated['usage']))
+            )
+            used = (
+                np.interp(
+                    groups * _GROUP_OFFSET + c_times[reset_at + 1],
+                    keys,
+                    cumulative
+                ) -
+                np.interp(
+                    groups * _GROUP_OFFSET + c_times[reset_at],
+                    keys,
+                    cumulative
+                )
+            )
+            missed[reset_at] = np.maximum(
+                used - c_readings[reset_at + 1],
+                0.0
+            )
+        counted['missed'] = missed
+
+        rooms = {}
+        for node_id in set(counter_nodes + power_nodes):
+            rooms[node_id] = self._room(self.network.nodes[node_id])
+
+        counter_totals = Totals(
+            c_groups,
+            c_times,
+            counted,
+            len(counter_nodes)
+        )
+        power_totals = Totals(
+            p_groups,
+            p_times,
+            integrated,
+            len(power_nodes)
+        )
+
+        res = {}
+        for window in windows:
+            res[window] = self._report(
+                end - window,
+                end,
+                counter_nodes,
+                counter_totals(end - window, end),
+                power_nodes,
+                power_totals(end - window, end),
+                rooms
+            )
+        return res
+
+    @staticmethod
+    def _report(start, end, counter_nodes, counted, power_nodes,
+                integrated, rooms):
+        res_nodes = {}
+        res_rooms = {}
+
+        for i, node_id in enumerate(power_nodes):
+            res_nodes[node_id] = dict(
+                kwh=float(integrated['usage'][i]),
+                source='power',
+                counter_kwh=None,
+                power_kwh=float(integrated['usage'][i]),
+                missed_kwh=0.0,
+                resets=0,
+                rollovers=0,
+                gap_seconds=float(integrated['gaps'][i])
+            )
+
+        for i, node_id in enumerate(counter_nodes):
+            info = res_nodes.setdefault(node_id, dict(power_kwh=None))
+            info.update(
+                source='counter',
+                counter_kwh=float(counted['usage'][i]),
+                missed_kwh=float(counted['missed'][i]),
+                resets=int(counted['resets'][i]),
+                rollovers=int(counted['rollovers'][i]),
+                gap_seconds=float(counted['gaps'][i])
+            )
+            info['kwh'] = info['counter_kwh'] + info['missed_kwh']
+
+        for node_id, info in res_nodes.items():
+            room = rooms[node_id]
+            res_rooms[room] = res_rooms.get(room, 0.0) + info['kwh']
+
+        return dict(
+            start=start,
+            end=end,
+            total=sum(res_rooms.values()),
+            nodes=res_nodes,
+            rooms=res_rooms
+        )
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.eventghost.net/>.
+
+import time
+import logging
+import threading
+import dispatcher
+import zwave_command_classes
+
+logger = logging.getLogger('openzwave')
+
+METHOD_SWITCH_ALL = 'SwitchAll'
+METHOD_UNICAST = 'Unicast'
+
+# level that turns a dimmer on at its last level
+LEVEL_ON = 255
+
+SWITCH_ALL_OFF = (u'Off Enabled', u'On and Off Enabled')
+SWITCH_ALL_ON = (u'On Enabled', u'On and Off Enabled')
+
+
+def switch_value(node):
+    """
+    The value that switches a node, the level of a SwitchMultilevel node or
+    the status of a SwitchBinary node.
+
+    :param node: The node
+    :type node: ZWaveNode
+    :rtype: ZWaveValue or None
+    """
+    value = node.values.find(
+        zwave_command_classes.COMMAND_CLASS_SWITCH_MULTILEVEL,
+        'Level'
+    )
+    if value is None:
+        value = node.values.find(
+            zwave_command_classes.COMMAND_CLASS_SWITCH_BINARY,
+            'Status'
+        )
+    return value
+
+
+def _value_target(value, level):
+    binary = zwave_command_classes.COMMAND_CLASS_SWITCH_BINARY
+    if value.command_class == binary:
+        return bool(level)
+    if level is True:
+        return LEVEL_ON
+    if level is False:
+        return 0
+    return int(level)
+
+
+def _is_at(value, target):
+    data = value.reported_data
+    if data is None:
+        return False
+    if target is True or target == LEVEL_ON:
+        return bool(data)
+    if target is False or target == 0:
+        return not data
+    return data == target
+
+
+class GroupSetResult(object):
+    """
+    The progress of a group set.
+
+    duration is the wall clock time from the first command sent to the
+    last confirmation.
+    """
+
+    def __init__(self, values, level, method):
+        self.values = values
+        self.level = level
+        self.method = method
+        self.targets = dict(
+            (node_id, _value_target(value, level))
+            for node_id, value in values.items()
+        )
+        self.confirmed = {}
+        self.followed_up = []
+        self.failed = []
+        self.start_time = None
+        self.end_time = None
+        self._event = threading.Event()
+
+    def __repr__(self):
+        return '<GroupSetResult %s: %d/%d confirmed>' % (
+            self.method,
+            len(self.confirmed),
+            len(self.values)
+        )
+
+    @property
+    def pending(self):
+        """
+        The ids of the nodes that have not confirmed.
+
+        :rtype: list
+        """
+        return sorted(
+            node_id for node_id in self.values
+            if node_id not in self.confirmed
+        )
+
+    @property
+    def duration(self):
+        """
+        Seconds from the first command sent to the last confirmation.
+
+        :rtype: float or None
+        """
+        if self.start_time is None or not self.confirmed:
+            return None
+        return max(self.confirmed.values()) - self.start_time
+
+    def done(self):
+        return self._event.isSet()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the group set to finish.
+
+        :param timeout: Seconds to wait
+        :type timeout: float, None
+        :return: True if it finished
+        :rtype: bool
+        """
+        return self._event.wait(timeout)
+
+
+class ZWaveGroupSetter(object):
+    """
+    Switches a set of nodes to the same level with as few commands as
+    possible.
+
+    When the nodes are every node of the network that takes part in
+    SwitchAll for the direction, and the level is off or on, the SwitchAll
+    broadcast is used. Otherwise the commands to every node are queued at
+    once and go out through the send queue of the network as one paced
+    stream. Nodes that have not reported the level within timeout are sent
+    the command on their own, nodes that still have not reported within
+    follow_up_timeout have failed.
+
+    Associations are not used, OpenZWave can not make the controller send
+    to an association group of another node.
+    """
+
+    def __init__(
+        self,
+        network,
+        timeout=2.0,
+        follow_up_timeout=5.0,
+        min_switch_all=3
+    ):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param timeout: Seconds the nodes have to confirm the first command
+        :type timeout: float
+        :param follow_up_timeout: Seconds the nodes have to confirm the
+        follow up command
+        :type follow_up_timeout: float
+        :param min_switch_all: The smallest number of nodes the SwitchAll
+        broadcast is used for
+        :type min_switch_all: int
+        """
+        self._network = network
+        self.timeout = timeout
+        self.follow_up_timeout = follow_up_timeout
+        self.min_switch_all = min_switch_all
+
+        self._active = []
+        self._condition = threading.Condition()
+
+        dispatcher.connect(self._on_value, network.SIGNAL_VALUE_CHANGED)
+        dispatcher.connect(self._on_value, network.SIGNAL_VALUE_REFRESHED)
+
+    def _switch_all_state(self, values, level):
+        # True or False for the broadcast, None if it can not be used
+        if len(values) < self.min_switch_all:
+            return None
+
+        if level is True or level == LEVEL_ON:
+            state, modes = True, SWITCH_ALL_ON
+        elif not level:
+            state, modes = False, SWITCH_ALL_OFF
+        else:
+            return None
+
+        for node in self._network.nodes.values():
+            mode = node.values.find(
+                zwave_command_classes.COMMAND_CLASS_SWITCH_ALL,
+                'Switch All'
+            )
+            if node.id in values:
+                if mode is None or mode.reported_data not in modes:
+                    return None
+            elif mode is not None and (
+                mode.reported_data is None or
+                mode.reported_data in modes
+            ):
+                # the broadcast would switch a node not in the group
+                return None
+
+        return state
+
+    def set(self, nodes, level):
+        """
+        Switch a set of nodes to a level.
+
+        :param nodes: The nodes, ones without a SwitchBinary or
+        SwitchMultilevel value are left out.
+        :type nodes: iterable of ZWaveNode
+        :param level: 0 - 99, 255 for the last level of the dimmers, True
+        or False. Binary switches are turned on by any level above 0.
+        :type level: int, bool
+        :return: The progress, runs in the background
+        :rtype: GroupSetResult
+        """
+        values = {}
+        for node in nodes:
+            value = switch_value(node)
+            if value is not None:
+                values[node.id] = value
+
+        state = self._switch_all_state(values, level)
+        if state is None:
+            method = METHOD_UNICAST
+        else:
+            method = METHOD_SWITCH_ALL
+
+        result = GroupSetResult(values, level, method)
+
+        thread = threading.Thread(target=self._run, args=(result, state))
+        thread.daemon = True
+        thread.start()
+        return result
+
+    def _wait(self, result, timeout):
+        end = time.time() + timeout
+        with self._condition:
+            while result.pending:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+    def _run(self, result, state):
+        with self._condition:
+            result.start_time = time.time()
+            for node_id, value in result.values.items():
+                if _is_at(value, result.targets[node_id]):
+                    result.confirmed[node_id] = result.start_time
+            self._active += [result]
+
+        try:
+            if result.method == METHOD_SWITCH_ALL:
+                self._network.switch_all(state)
+            else:
+                for node_id in result.pending:
+                    result.values[node_id].data = result.targets[node_id]
+
+            self._wait(result, self.timeout)
+
+            result.followed_up = result.pending
+            send_queue = self._network.send_queue
+            for node_id in result.followed_up:
+                value = result.values[node_id]
+                # the first write is given up on, it holds the slot of the
+                # value in the send queue until the queue times it out
+                send_queue.reported(value)
+                # the first write can still be pending, put it in again
+                send_queue.put(value, result.targets[node_id])
+
+            if result.followed_up:
+                self._wait(result, self.follow_up_timeout)
+        except:
+            logger.exception(u'Group set failed')
+
+        with self._condition:
+            self._active.remove(result)
+            result.failed = result.pending
+            result.end_time = time.time()
+
+        logger.info(
+            u'Group set to %s using %s: %d nodes, %d followed up, '
+            u'%d failed, %s seconds',
+            result.level,
+            result.method,
+            len(result.values),
+            len(result.followed_up),
+            len(result.failed),
+            result.duration
+        )
+        result._event.set()
+
+    def _on_value(self, network=None, node=None, value=None, **_):
+        if network is not self._network or node is None or value is None:
+            return
+
+        now = time.time()
+        with self._condition:
+            for result in self._active:
+                if (
+                    result.values.get(node.id, None) is value and
+                    node.id not in result.confirmed and
+                    _is_at(value, result.targets[node.id])
+                ):
+                    result.confirmed[node.id] = now
+                    self._condition.notify_all()
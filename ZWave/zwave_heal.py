@@ -0,0 +1,527 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import logging
+import threading
+import dispatcher
+
+logger = logging.getLogger('openzwave')
+
+
+class ZWaveHealScheduler(object):
+    """
+    Heals the nodes of a network a few at a time instead of sending
+    healNetwork to every node at once.
+
+    Nodes that have never been healed, that drop messages or that have a
+    poor link quality are healed first. The scheduler backs off while the
+    controller send queue is busy and for traffic_pause seconds after the
+    controller wrote a value, but never longer than max_traffic_wait
+    seconds in a row. Nodes that do not finish healing within
+    node_timeout are queued again, up to max_retries times, after that
+    they are counted as failed. The pending work is written to the user
+    directory so an interrupted heal resumes when the network is started
+    again.
+
+    Progress is dispatched using the SIGNAL_HEAL_STARTED,
+    SIGNAL_HEAL_PROGRESS and SIGNAL_HEAL_COMPLETE signals of the network.
+    """
+
+    STATE_FILE = 'heal_state.json'
+
+    def __init__(
+        self,
+        network,
+        batch_size=1,
+        max_queue_count=3,
+        traffic_pause=10.0,
+        node_timeout=60.0,
+        max_traffic_wait=300.0,
+        max_retries=2
+    ):
+        """
+        Initialize the heal scheduler.
+
+        :param network: The network to heal
+        :type network: ZWaveNetwork
+        :param batch_size: Number of nodes healed at the same time
+        :type batch_size: int
+        :param max_queue_count: The send queue count the controller has to
+        be at or under before the next batch is started
+        :type max_queue_count: int
+        :param traffic_pause: Seconds of quiet needed after user traffic
+        before healing continues
+        :type traffic_pause: float
+        :param node_timeout: Seconds to wait for a node to finish healing
+        :type node_timeout: float
+        :param max_traffic_wait: The longest a batch waits for the user
+        traffic to stop
+        :type max_traffic_wait: float
+        :param max_retries: The number of times a node that timed out is
+        queued again
+        :type max_retries: int
+        """
+        self._network = network
+        self.batch_size = batch_size
+        self.max_queue_count = max_queue_count
+        self.traffic_pause = traffic_pause
+        self.node_timeout = node_timeout
+        self.max_traffic_wait = max_traffic_wait
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._node_event = threading.Event()
+        self._thread = None
+        self._update_node_route = False
+        self._pending = []
+        self._active = set()
+        self._healed = 0
+        self._total = 0
+        self._durations = []
+        self._last_heal = {}
+        self._retries = {}
+        self._failed = []
+        self._last_traffic = 0.0
+
+        self._load()
+
+        dispatcher.connect(
+            self._on_controller_command,
+            network.SIGNAL_CONTROLLER_COMMAND
+        )
+        dispatcher.connect(
+            self._on_network_ready,
+            network.SIGNAL_NETWORK_READY
+        )
+
+    @property
+    def is_running(self):
+        """
+        Is a heal in progress.
+
+        :rtype: bool
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def progress(self):
+        """
+        The number of healed nodes and the number of nodes to heal.
+
+        :rtype: tuple
+        """
+        return self._healed, self._total
+
+    @property
+    def failed(self):
+        """
+        The ids of the nodes that did not finish healing in the last heal.
+
+        :rtype: list
+        """
+        return list(self._failed)
+
+    @property
+    def eta(self):
+        """
+        Estimated number of seconds left before the heal is finished.
+
+        :rtype: float or None
+        """
+        if not self._durations:
+            return None
+
+        average = sum(self._durations) / len(self._durations)
+        remaining = len(self._pending) + len(self._active)
+        batches = -(-remaining // max(self.batch_size, 1))
+        return average * batches
+
+    def last_heal(self, node_id):
+        """
+        The last time a node was healed.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :return: A timestamp or None if the node has never been healed
+        :rtype: float or None
+        """
+        return self._last_heal.get(node_id, None)
+
+    def start(self, update_node_route=False, node_ids=None):
+        """
+        Start healing the network.
+
+        :param update_node_route: Whether to perform return routes
+        initialization.
+        :type update_node_route: bool
+        :param node_ids: Only heal these nodes. Defaults to all of the nodes.
+        :type node_ids: list, None
+        :return: True if the heal was started. False otherwise
+        :rtype: bool
+        """
+        if self.is_running:
+            logger.warning(u'Heal is already running')
+            return False
+
+        if self._network.state < self._network.STATE_AWAKE:
+            logger.warning(u'Network must be awake')
+            return False
+
+        if node_ids is None:
+            node_ids = self._network.nodes.keys()
+
+        with self._lock:
+            self._update_node_route = update_node_route
+            self._pending = self._order(node_ids)
+            self._active.clear()
+            self._healed = 0
+            self._total = len(self._pending)
+            self._durations = []
+            self._retries = {}
+            self._failed = []
+            self._save()
+
+        return self._start_thread()
+
+    def resume(self):
+        """
+        Resume a heal that was interrupted.
+
+        :return: True if there was a heal to resume. False otherwise
+        :rtype: bool
+        """
+        if self.is_running or not self._pending:
+            return False
+
+        if self._network.state < self._network.STATE_AWAKE:
+            logger.warning(u'Network must be awake')
+            return False
+
+        with self._lock:
+            self._pending = self._order(
+                node_id for node_id in self._pending
+                if node_id in self._network.nodes
+            )
+
+        logger.info(
+            u'Resuming network heal, %s nodes left',
+            len(self._pending)
+        )
+        return self._start_thread()
+
+    def stop(self, clear=False):
+        """
+        Stop healing the network.
+
+        :param clear: Forget the nodes that have not been healed yet.
+        :type clear: bool
+        """
+        self._event.set()
+        self._node_event.set()
+
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+
+        with self._lock:
+            self._pending = list(self._active) + self._pending
+            self._active.clear()
+            if clear:
+                self._pending = []
+            self._save()
+
+    def notify_traffic(self):
+        """
+        Tell the scheduler there is user traffic on the network, the send
+        queue of the network calls this for every value written.
+        """
+        self._last_traffic = time.time()
+
+    def _start_thread(self):
+        self._event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        dispatcher.send(
+            self._network.SIGNAL_HEAL_STARTED,
+            sender=self._network,
+            network=self._network,
+            total=self._total,
+            remaining=len(self._pending)
+        )
+        return True
+
+    def _order(self, node_ids):
+        nodes = self._network.nodes
+        now = time.time()
+
+        def key(node_id):
+            node = nodes[node_id]
+            try:
+                stats = node.stats
+            except:
+                stats = {}
+
+            sent = float(stats.get('sentCnt', 0))
+            failed = float(stats.get('sentFailed', 0))
+            retries = float(stats.get('retries', 0))
+            quality = stats.get('quality', 0)
+            rtt = stats.get('averageRequestRTT', 0)
+
+            if sent:
+                failed_ratio = (failed + retries) / sent
+            else:
+                failed_ratio = 0.0
+
+            last_heal = self._last_heal.get(node_id, None)
+            if last_heal is None:
+                staleness = now
+            else:
+                staleness = now - last_heal
+
+            return (
+                last_heal is not None,
+                -failed_ratio,
+                quality,
+                -rtt,
+                -staleness
+            )
+
+        return sorted(
+            (node_id for node_id in node_ids if node_id in nodes),
+            key=key
+        )
+
+    def _wait_for_network(self):
+        controller = self._network.controller
+        give_up = time.time() + self.max_traffic_wait
+
+        while not self._event.isSet():
+            if self._network.state < self._network.STATE_AWAKE:
+                return False
+
+            now = time.time()
+            quiet = now - self._last_traffic
+            if quiet < self.traffic_pause and now < give_up:
+                self._event.wait(
+                    min(self.traffic_pause - quiet, give_up - now)
+                )
+                continue
+
+            if controller.send_queue_count > self.max_queue_count:
+                self._event.wait(0.5)
+                continue
+
+            return True
+
+        return False
+
+    def _run(self):
+        while not self._event.isSet():
+            if not self._wait_for_network():
+                break
+
+            with self._lock:
+                if not self._pending:
+                    break
+
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    node_id = self._pending.pop(0)
+                    node = self._network.nodes.get(node_id, None)
+                    if node is None:
+                        self._total -= 1
+                        continue
+                    if node.is_sleeping:
+                        logger.debug(
+                            u'Heal skipping sleeping node : %s',
+                            node_id
+                        )
+                        self._total -= 1
+                        continue
+                    batch += [node]
+
+                self._active = set(node.id for node in batch)
+
+            if not batch:
+                continue
+
+            start = time.time()
+            self._node_event.clear()
+
+            for node in batch:
+                logger.debug(u'Heal network node : %s', node.id)
+                node.heal(self._update_node_route)
+
+            while self._active and not self._event.isSet():
+                self._node_event.wait(self.node_timeout)
+                self._node_event.clear()
+
+                if time.time() - start >= self.node_timeout:
+                    logger.warning(
+                        u'Heal timed out for nodes : %s',
+                        list(self._active)
+                    )
+                    break
+
+            if self._event.isSet():
+                break
+
+            stop = time.time()
+
+            with self._lock:
+                timed_out = self._active
+                self._active = set()
+                healed = list(
+                    node for node in batch
+                    if node.id not in timed_out
+                )
+
+                for node_id in timed_out:
+                    retries = self._retries.get(node_id, 0)
+                    if retries < self.max_retries:
+                        self._retries[node_id] = retries + 1
+                        self._pending.append(node_id)
+                    else:
+                        self._retries.pop(node_id, None)
+                        self._failed.append(node_id)
+                        self._total -= 1
+
+                for node in healed:
+                    self._last_heal[node.id] = stop
+                    self._retries.pop(node.id, None)
+                self._healed += len(healed)
+                if healed:
+                    self._durations = (
+                        self._durations + [stop - start]
+                    )[-10:]
+                self._save()
+
+            for node in healed:
+                dispatcher.send(
+                    self._network.SIGNAL_HEAL_PROGRESS,
+                    sender=self._network,
+                    network=self._network,
+                    node=node,
+                    node_id=node.id,
+                    healed=self._healed,
+                    total=self._total,
+                    eta=self.eta
+                )
+
+        if not self._event.isSet() and not self._pending:
+            logger.info(u'Network heal complete')
+            dispatcher.send(
+                self._network.SIGNAL_HEAL_COMPLETE,
+                sender=self._network,
+                network=self._network,
+                healed=self._healed,
+                total=self._total,
+                failed=list(self._failed)
+            )
+
+    def _on_controller_command(
+        self,
+        sender,
+        network=None,
+        node_id=None,
+        **kwargs
+    ):
+        if network is not self._network or node_id not in self._active:
+            return
+
+        controller = self._network.controller
+        state = kwargs.get('controllerState', None)
+
+        if (
+            state in controller.STATES_UNLOCKED and
+            state != controller.STATE_NORMAL
+        ):
+            with self._lock:
+                self._active.discard(node_id)
+            self._node_event.set()
+
+    def _on_network_ready(self, sender, network=None, **_):
+        if network is self._network:
+            self.resume()
+
+    @property
+    def _state_file(self):
+        controller = self._network.controller
+        if controller is None or controller.options is None:
+            return None
+
+        user_path = controller.options.user_path
+        if not user_path:
+            return None
+
+        return os.path.join(user_path, self.STATE_FILE)
+
+    def _load(self):
+        path = self._state_file
+        if path is None or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            logger.exception(u'Unable to load heal state : %s', path)
+            return
+
+        self._update_node_route = data.get('update_node_route', False)
+        self._pending = data.get('pending', [])
+        self._healed = data.get('healed', 0)
+        self._total = data.get('total', len(self._pending))
+        self._durations = data.get('durations', [])
+        self._failed = data.get('failed', [])
+        self._retries = dict(
+            (int(node_id), retries)
+            for node_id, retries in data.get('retries', {}).items()
+        )
+        self._last_heal = dict(
+            (int(node_id), last_heal)
+            for node_id, last_heal in data.get('last_heal', {}).items()
+        )
+
+    def _save(self):
+        path = self._state_file
+        if path is None:
+            return
+
+        data = dict(
+            update_node_route=self._update_node_route,
+            pending=self._pending,
+            healed=self._healed,
+            total=self._total,
+            durations=self._durations,
+            failed=self._failed,
+            retries=self._retries,
+            last_heal=self._last_heal
+        )
+
+        try:
+            with open(path, 'w') as f:
+                json.dump(data, f)
+        except IOError:
+            logger.exception(u'Unable to save heal state : %s', path)
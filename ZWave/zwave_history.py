@@ -0,0 +1,677 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+History of the SensorMultilevel, Meter and Battery values of a network.
+
+Every report of a value is stored three times, as the raw sample and
+rolled up into one minute and one hour buckets. Each of these tiers
+appends to a small in memory chunk, when the chunk is full, or when the
+store is flushed, the rows are written to a ring file. A ring file grows
+with the rows written to it up to a fixed number of rows, after that the
+oldest rows are overwritten, so both the memory and the disk used by a
+value are bounded. The ring file is only memory mapped while it is
+written or read.
+
+A row holds the start time of the bucket and the min, max, sum and count
+of the samples in it, a raw row is a bucket of one sample. Queries read
+the rows of the finest tier that still holds the start of the range.
+"""
+
+import os
+import time
+import logging
+import threading
+import numpy as np
+import zwave_command_classes
+
+logger = logging.getLogger('openzwave')
+
+ROW = np.dtype([
+    ('time', '<f8'),
+    ('min', '<f8'),
+    ('max', '<f8'),
+    ('sum', '<f8'),
+    ('count', '<u4')
+])
+
+SAMPLE = np.dtype([
+    ('time', '<f8'),
+    ('min', '<f8'),
+    ('max', '<f8'),
+    ('mean', '<f8'),
+    ('count', '<u4')
+])
+
+# name, bucket length in seconds, rows kept on disk
+TIERS = (
+    ('raw', 0, 100000),
+    ('minute', 60, 60 * 24 * 31),
+    ('hour', 3600, 24 * 366 * 5)
+)
+
+AGGREGATES = ('mean', 'min', 'max', 'count', 'first', 'last')
+
+COMMAND_CLASSES = (
+    zwave_command_classes.COMMAND_CLASS_SENSOR_MULTILEVEL,
+    zwave_command_classes.COMMAND_CLASS_METER,
+    zwave_command_classes.COMMAND_CLASS_BATTERY
+)
+
+
+class RingFile(object):
+    """
+    Up to a fixed number of rows in a memory mapped file, the oldest rows
+    are overwritten when it is full.
+
+    The file starts with the position of the oldest row and the number of
+    rows. It is made bigger as rows are written, doubling every time, until
+    it holds capacity rows.
+    """
+
+    HEADER_SIZE = 16
+    MIN_ROWS = 256
+
+    def __init__(self, path, capacity):
+        """
+        :param path: The file
+        :type path: str
+        :param capacity: The number of rows the file holds
+        :type capacity: int
+        """
+        self.path = path
+        self.capacity = capacity
+        self._header = None
+        self._rows = None
+
+        allocated = None
+        if os.path.exists(path):
+            size = os.path.getsize(path) - self.HEADER_SIZE
+            if (
+                size > 0 and
+                size % ROW.itemsize == 0 and
+                size // ROW.itemsize <= capacity
+            ):
+                allocated = size // ROW.itemsize
+            else:
+                logger.warning(u'History file size changed : %s', path)
+
+        if allocated is None:
+            allocated = min(self.MIN_ROWS, capacity)
+            with open(path, 'wb') as f:
+                f.truncate(self.HEADER_SIZE + allocated * ROW.itemsize)
+
+        self._map(allocated)
+
+        start, length = (int(i) for i in self._header)
+        if start >= allocated or length > allocated:
+            logger.warning(u'History file is damaged : %s', path)
+            self._header[:] = (0, 0)
+
+    def _map(self, allocated):
+        self.allocated = allocated
+        self._header = np.memmap(self.path, '<u8', 'r+', 0, (2,))
+        self._rows = np.memmap(
+            self.path,
+            ROW,
+            'r+',
+            self.HEADER_SIZE,
+            (allocated,)
+        )
+
+    def _grow(self, needed):
+        allocated = min(max(self.allocated * 2, needed), self.capacity)
+
+        start, length = (int(i) for i in self._header)
+        if start:
+            # only a file made with a smaller capacity has wrapped around
+            # before it was grown, move the rows to the start of the file
+            rows = np.concatenate(self.segments())
+            self._rows[:length] = rows
+            self._header[:] = (0, length)
+
+        self.flush()
+        self._rows = None
+        self._header = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(self.HEADER_SIZE + allocated * ROW.itemsize)
+        self._map(allocated)
+
+    def __len__(self):
+        return int(self._header[1])
+
+    def write(self, rows):
+        """
+        :param rows: The rows to append
+        :type rows: numpy.ndarray
+        """
+        if not len(rows):
+            return
+
+        rows = rows[-self.capacity:]
+        count = len(rows)
+        start, length = (int(i) for i in self._header)
+
+        if self.allocated < self.capacity and length + count > self.allocated:
+            self._grow(length + count)
+            start, length = (int(i) for i in self._header)
+
+        allocated = self.allocated
+        pos = (start + length) % allocated
+        first = min(count, allocated - pos)
+        self._rows[pos:pos + first] = rows[:first]
+        self._rows[:count - first] = rows[first:]
+
+        length += count
+        if length > allocated:
+            start = (start + length - allocated) % allocated
+            length = allocated
+
+        self._header[:] = (start, length)
+
+    def segments(self):
+        """
+        The rows in the order they were written, as one or two views of the
+        file.
+
+        :rtype: list
+        """
+        start, length = (int(i) for i in self._header)
+        end = start + length
+
+        if end <= self.allocated:
+            return [self._rows[start:end]]
+        return [self._rows[start:], self._rows[:end - self.allocated]]
+
+    def first_time(self):
+        segments = self.segments()
+        if len(segments[0]):
+            return float(segments[0]['time'][0])
+
+    def flush(self):
+        self._rows.flush()
+        self._header.flush()
+
+    def close(self):
+        self.flush()
+        # the file is unmapped once the last view of it is released
+        self._rows = None
+        self._header = None
+
+
+class Tier(object):
+    """
+    The rows of one resolution of a value, a chunk in memory in front of a
+    ring file.
+    """
+
+    def __init__(self, path, interval, capacity, chunk_size):
+        """
+        :param path: The ring file
+        :type path: str
+        :param interval: Length of a bucket in seconds, 0 for raw samples
+        :type interval: int
+        :param capacity: Rows kept in the ring file
+        :type capacity: int
+        :param chunk_size: Rows kept in memory before they are written
+        :type chunk_size: int
+        """
+        self.path = path
+        self.interval = interval
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self._ring = None
+        self._chunk = None
+        self._length = 0
+        self._bucket = None
+        # first time in the ring file, read once instead of mapping the
+        # file for every lookup. False until it is known.
+        self._ring_first = False
+
+    @property
+    def ring(self):
+        if self._ring is None:
+            self._ring = RingFile(self.path, self.capacity)
+        return self._ring
+
+    def _release(self):
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    def add(self, timestamp, data):
+        if not self.interval:
+            self._append((timestamp, data, data, data, 1))
+            return
+
+        start = timestamp - timestamp % self.interval
+        bucket = self._bucket
+
+        if bucket is not None and bucket[0] != start:
+            self._append(tuple(bucket))
+            bucket = None
+
+        if bucket is None:
+            self._bucket = [start, data, data, data, 1]
+        else:
+            bucket[1] = min(bucket[1], data)
+            bucket[2] = max(bucket[2], data)
+            bucket[3] += data
+            bucket[4] += 1
+
+    def _append(self, row):
+        if self._chunk is None:
+            self._chunk = np.zeros(self.chunk_size, ROW)
+
+        self._chunk[self._length] = row
+        self._length += 1
+
+        if self._length == self.chunk_size:
+            self.spill()
+
+    def spill(self):
+        """
+        Write the chunk to the ring file and release it.
+        """
+        if self._length:
+            ring = self.ring
+            ring.write(self._chunk[:self._length])
+            # the oldest rows move once the ring file wraps around
+            self._ring_first = ring.first_time()
+            self._release()
+        self._chunk = None
+        self._length = 0
+
+    def close(self):
+        if self._bucket is not None:
+            # the bucket is written unfinished, rows with the same time are
+            # combined when they are read
+            self._append(tuple(self._bucket))
+            self._bucket = None
+        self.spill()
+        self._release()
+
+    def first_time(self):
+        if self._ring_first is False:
+            self._ring_first = None
+            if os.path.exists(self.path):
+                try:
+                    self._ring_first = self.ring.first_time()
+                finally:
+                    self._release()
+
+        if self._ring_first is not None:
+            return self._ring_first
+
+        if self._length:
+            return float(self._chunk['time'][0])
+        if self._bucket is not None:
+            return self._bucket[0]
+
+    def rows(self, start, end):
+        """
+        The rows from start up to and including end. The bucket that holds
+        start is included.
+
+        :rtype: numpy.ndarray
+        """
+        if self.interval:
+            start = start - self.interval + 1e-9
+
+        parts = []
+        if self._ring is not None or os.path.exists(self.path):
+            parts += self.ring.segments()
+        if self._length:
+            parts += [self._chunk[:self._length]]
+        if self._bucket is not None:
+            parts += [np.array([tuple(self._bucket)], ROW)]
+
+        res = []
+        for part in parts:
+            times = part['time']
+            first = np.searchsorted(times, start, 'left')
+            last = np.searchsorted(times, end, 'right')
+            if last > first:
+                res += [np.array(part[first:last])]
+
+        # the rows are copies, the views of the ring file can go
+        del parts
+        self._release()
+
+        if not res:
+            return np.zeros(0, ROW)
+        return np.concatenate(res)
+
+
+class ValueHistory(object):
+    """
+    The stored samples of a value.
+    """
+
+    def __init__(self, folder, value_id, chunk_size):
+        """
+        :param folder: The history folder of the network
+        :type folder: str
+        :param value_id: The id of the value
+        :type value_id: int
+        :param chunk_size: Rows kept in memory per tier
+        :type chunk_size: int
+        """
+        self.value_id = value_id
+        self._last_time = 0.0
+        self.tiers = list(
+            Tier(
+                os.path.join(folder, '%016X.%s' % (value_id, name)),
+                interval,
+                capacity,
+                chunk_size
+            )
+            for name, interval, capacity in TIERS
+        )
+
+    def add(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        # the rows of a tier have to stay in order for the range lookups
+        timestamp = max(timestamp, self._last_time)
+        self._last_time = timestamp
+
+        for tier in self.tiers:
+            tier.add(timestamp, data)
+
+    def spill(self):
+        for tier in self.tiers:
+            tier.spill()
+
+    def close(self):
+        for tier in self.tiers:
+            tier.close()
+
+    def _tier(self, start, resolution):
+        for tier in self.tiers:
+            if resolution and tier.interval > resolution:
+                break
+            first = tier.first_time()
+            if first is not None and first <= start:
+                return tier
+
+        # nothing goes back that far, use the finest tier that has data
+        for tier in self.tiers:
+            if tier.first_time() is not None:
+                return tier
+        return None
+
+    def samples(self, start=None, end=None, resolution=None):
+        """
+        The samples of a time range.
+
+        :param start: Start of the range in seconds since the epoch.
+        Defaults to the oldest sample.
+        :type start: float, None
+        :param end: End of the range. Defaults to now.
+        :type end: float, None
+        :param resolution: Combine the samples into buckets of this many
+        seconds
+        :type resolution: int, None
+        :return: Array with the fields time, min, max, mean and count
+        :rtype: numpy.ndarray
+        """
+        if start is None:
+            start = 0.0
+        if end is None:
+            end = time.time()
+
+        tier = self._tier(start, resolution)
+        if tier is None:
+            return np.zeros(0, SAMPLE)
+
+        rows = tier.rows(start, end)
+        if resolution and resolution > tier.interval:
+            rows = _downsample(rows, resolution)
+        elif len(rows) > 1 and tier.interval:
+            # unfinished buckets written when the store was closed
+            rows = _downsample(rows, tier.interval)
+
+        res = np.zeros(len(rows), SAMPLE)
+        for name in ('time', 'min', 'max', 'count'):
+            res[name] = rows[name]
+        res['mean'] = rows['sum'] / np.maximum(rows['count'], 1)
+        return res
+
+    def aggregate(self, func='mean', start=None, end=None):
+        """
+        A single figure for a time range.
+
+        :param func: One of mean, min, max, count, first or last
+        :type func: str
+        :param start: Start of the range in seconds since the epoch
+        :type start: float, None
+        :param end: End of the range. Defaults to now.
+        :type end: float, None
+        :rtype: float, int or None
+        """
+        if func not in AGGREGATES:
+            raise ValueError('Unknown aggregate : ' + repr(func))
+
+        if start is None:
+            start = 0.0
+        if end is None:
+            end = time.time()
+
+        tier = self._tier(start, None)
+        if tier is None:
+            return None
+        rows = tier.rows(start, end)
+
+        if not len(rows):
+            return None
+        if func == 'count':
+            return int(rows['count'].sum())
+        if func == 'min':
+            return float(rows['min'].min())
+        if func == 'max':
+            return float(rows['max'].max())
+        if func == 'mean':
+            return float(rows['sum'].sum() / rows['count'].sum())
+
+        if func == 'last' and tier.interval:
+            # the raw tier always holds the newest samples
+            raw = self.tiers[0].rows(start, end)
+            if len(raw):
+                return float(raw['sum'][-1])
+
+        if tier.interval:
+            # the samples in a bucket are not kept
+            row = rows[0] if func == 'first' else rows[-1]
+            return float(row['sum'] / row['count'])
+
+        return float(rows['sum'][0 if func == 'first' else -1])
+
+
+def _downsample(rows, resolution):
+    if not len(rows):
+        return rows
+
+    buckets = rows['time'] - rows['time'] % resolution
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+    res = np.zeros(len(starts), ROW)
+    res['time'] = buckets[starts]
+    res['min'] = np.minimum.reduceat(rows['min'], starts)
+    res['max'] = np.maximum.reduceat(rows['max'], starts)
+    res['sum'] = np.add.reduceat(rows['sum'], starts)
+    res['count'] = np.add.reduceat(rows['count'], starts)
+    return res
+
+
+class ZWaveHistory(object):
+    """
+    The history of the SensorMultilevel, Meter and Battery values of a
+    network.
+
+    The memory used is at most one chunk per tier of every value, the
+    chunks are written to disk every flush_interval seconds and released.
+    """
+
+    def __init__(self, network, folder=None, chunk_size=256,
+                 flush_interval=60.0):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param folder: Where the ring files are kept. Defaults to the
+        history folder in the user path of the network.
+        :type folder: str, None
+        :param chunk_size: Rows kept in memory per tier of a value
+        :type chunk_size: int
+        :param flush_interval: Seconds between writing the chunks to disk
+        :type flush_interval: float
+        """
+        self.network = network
+        self._folder = folder
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self._histories = {}
+        self._lock = threading.RLock()
+        self._event = threading.Event()
+        self._thread = None
+
+    @property
+    def folder(self):
+        if self._folder is None:
+            # noinspection PyProtectedMember
+            options = self.network._options
+            if options is None or not options.user_path:
+                return None
+            self._folder = os.path.join(options.user_path, 'history')
+
+        if not os.path.exists(self._folder):
+            os.makedirs(self._folder)
+        return self._folder
+
+    def _history(self, value):
+        # None is cached for the values that are not kept
+        try:
+            return self._histories[value.id]
+        except KeyError:
+            pass
+
+        history = None
+        if value.command_class in COMMAND_CLASSES:
+            folder = self.folder
+            if folder is not None:
+                history = ValueHistory(folder, value.id, self.chunk_size)
+
+        self._histories[value.id] = history
+        return history
+
+    def record(self, value, data=None, timestamp=None):
+        """
+        Store a report of a value. Values that are not SensorMultilevel,
+        Meter or Battery values, or whose data is not a number, are ignored.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :param data: The data reported. Defaults to the data of the value.
+        :param timestamp: When it was reported. Defaults to now.
+        :type timestamp: float, None
+        """
+        if data is None:
+            data = value.data
+
+        if (
+            isinstance(data, bool) or
+            not isinstance(data, (int, long, float))
+        ):
+            return
+
+        with self._lock:
+            history = self._history(value)
+            if history is None:
+                return
+
+            history.add(float(data), timestamp)
+
+            if self._thread is None:
+                self._event.clear()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='ZWaveHistory'
+                )
+                self._thread.daemon = True
+                self._thread.start()
+
+    def history(self, value):
+        """
+        :param value: The value
+        :type value: ZWaveValue
+        :rtype: ValueHistory or None
+        """
+        with self._lock:
+            return self._history(value)
+
+    def samples(self, value, start=None, end=None, resolution=None):
+        """
+        See ValueHistory.samples
+        """
+        with self._lock:
+            history = self._history(value)
+            if history is None:
+                return np.zeros(0, SAMPLE)
+            return history.samples(start, end, resolution)
+
+    def aggregate(self, value, func='mean', start=None, end=None):
+        """
+        See ValueHistory.aggregate
+        """
+        with self._lock:
+            history = self._history(value)
+            if history is None:
+                return None
+            return history.aggregate(func, start, end)
+
+    def _run(self):
+        while not self._event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except:
+                logger.exception(u'Unable to write the value history.')
+
+    def flush(self):
+        """
+        Write the chunks in memory to disk.
+        """
+        with self._lock:
+            for history in self._histories.values():
+                if history is not None:
+                    history.spill()
+
+    def close(self):
+        """
+        Stop the flush thread and close the ring files.
+        """
+        self._event.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+
+        with self._lock:
+            for history in self._histories.values():
+                if history is not None:
+                    history.close()
+            self._histories.clear()
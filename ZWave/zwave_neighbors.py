@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import dispatcher
+import numpy as np
+
+logger = logging.getLogger('openzwave')
+
+
+class ZWaveNeighborMatrix(object):
+    """
+    Adjacency matrix of the network.
+
+    Row n of the matrix holds the neighbors node n reported, the matrix is
+    indexed by node id. The neighbors of a node are only fetched from the
+    manager again after the node has had a neighbor update or has been
+    healed, or when the node is added to the network.
+    """
+
+    SIZE = 256
+
+    def __init__(self, network):
+        """
+        :param network: The network the matrix is for
+        :type network: ZWaveNetwork
+        """
+        self._network = network
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((self.SIZE, self.SIZE), dtype=bool)
+        self._present = np.zeros(self.SIZE, dtype=bool)
+        self._dirty = set()
+        self._dirty_all = True
+
+        dispatcher.connect(
+            self._on_controller_command,
+            network.SIGNAL_CONTROLLER_COMMAND
+        )
+        dispatcher.connect(
+            self._on_heal_progress,
+            network.SIGNAL_HEAL_PROGRESS
+        )
+        dispatcher.connect(
+            self._on_node_added,
+            network.SIGNAL_NODE_ADDED
+        )
+        dispatcher.connect(
+            self._on_node_removed,
+            network.SIGNAL_NODE_REMOVED
+        )
+        dispatcher.connect(
+            self._on_network_ready,
+            network.SIGNAL_NETWORK_READY
+        )
+
+    def invalidate(self, node_id=None):
+        """
+        Fetch the neighbors of a node again the next time the matrix is read.
+
+        :param node_id: The node to refresh. Defaults to every node.
+        :type node_id: int, None
+        """
+        with self._lock:
+            if node_id is None:
+                self._dirty_all = True
+            else:
+                self._dirty.add(node_id)
+
+    @property
+    def matrix(self):
+        """
+        The adjacency matrix, matrix[a, b] is True if node a reports node b
+        as a neighbor.
+
+        :rtype: numpy.ndarray
+        """
+        self._refresh()
+        return self._matrix
+
+    @property
+    def links(self):
+        """
+        The adjacency matrix with the direction of the links removed.
+
+        :rtype: numpy.ndarray
+        """
+        matrix = self.matrix
+        return matrix | matrix.T
+
+    @property
+    def node_ids(self):
+        """
+        The node ids in the matrix.
+
+        :rtype: list
+        """
+        self._refresh()
+        return np.flatnonzero(self._present).tolist()
+
+    def neighbors(self, node_id):
+        """
+        The neighbors of a node.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :rtype: list
+        """
+        return np.flatnonzero(self.matrix[node_id]).tolist()
+
+    def degree(self, node_id=None):
+        """
+        The number of neighbors of a node.
+
+        :param node_id: The id of the node. Defaults to every node.
+        :type node_id: int, None
+        :return: The number of neighbors or an array indexed by node id
+        :rtype: int or numpy.ndarray
+        """
+        degree = self.matrix.sum(axis=1)
+        if node_id is None:
+            return degree
+        return int(degree[node_id])
+
+    def reachable(self, node_id, exclude=()):
+        """
+        The nodes that can be reached from a node.
+
+        :param node_id: The id of the node to start from
+        :type node_id: int
+        :param exclude: Node ids that are not used as a hop
+        :type exclude: list, tuple
+        :rtype: list
+        """
+        return np.flatnonzero(self._reach(node_id, exclude)).tolist()
+
+    def hops(self, node_id=None):
+        """
+        The number of hops from a node to every other node.
+
+        :param node_id: The id of the node to start from. Defaults to the
+        controller.
+        :type node_id: int, None
+        :return: An array indexed by node id, -1 for nodes that can not be
+        reached.
+        :rtype: numpy.ndarray
+        """
+        if node_id is None:
+            node_id = self._controller_id
+
+        links = self.links
+        hops = np.full(self.SIZE, -1, dtype=np.int16)
+
+        if node_id is None:
+            return hops
+
+        frontier = np.zeros(self.SIZE, dtype=bool)
+        frontier[node_id] = True
+        seen = frontier.copy()
+        count = 0
+
+        while frontier.any():
+            hops[frontier] = count
+            count += 1
+            frontier = links[frontier].any(axis=0) & ~seen
+            seen |= frontier
+
+        return hops
+
+    def num_routes(self, node_id):
+        """
+        The number of nodes next to the controller that can be reached from
+        a node without routing through the controller.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :rtype: int
+        """
+        controller_id = self._controller_id
+        if controller_id is None:
+            return 0
+
+        reach = self._reach(node_id, (controller_id,))
+        reach[controller_id] = False
+        return int((reach & self.matrix[:, controller_id]).sum())
+
+    def articulation_points(self):
+        """
+        The nodes that the controller needs to reach other nodes.
+
+        If one of these nodes fails, some of the network is cut off from
+        the controller.
+
+        :rtype: list
+        """
+        controller_id = self._controller_id
+        if controller_id is None:
+            return []
+
+        base = self._reach(controller_id).sum()
+        res = []
+
+        for node_id in np.flatnonzero(self._present):
+            if node_id == controller_id:
+                continue
+
+            reach = self._reach(controller_id, (node_id,))
+            reach[node_id] = False
+            if reach.sum() < base - 1:
+                res += [int(node_id)]
+
+        return res
+
+    @property
+    def _controller_id(self):
+        controller = self._network.controller
+        if controller is None or controller.node is None:
+            return None
+        return controller.node_id
+
+    def _reach(self, node_id, exclude=()):
+        links = self.links
+        blocked = np.zeros(self.SIZE, dtype=bool)
+        blocked[list(exclude)] = True
+
+        seen = np.zeros(self.SIZE, dtype=bool)
+        seen[node_id] = True
+        frontier = seen.copy()
+
+        while frontier.any():
+            frontier = links[frontier & ~blocked].any(axis=0) & ~seen
+            seen |= frontier
+
+        return seen
+
+    def _refresh(self):
+        with self._lock:
+            if not self._dirty_all and not self._dirty:
+                return
+
+            if self._dirty_all:
+                node_ids = list(self._network.nodes.keys())
+                controller_id = self._controller_id
+                if controller_id is not None:
+                    node_ids += [controller_id]
+
+                self._matrix[:] = False
+                self._present[:] = False
+                self._dirty_all = False
+            else:
+                node_ids = list(self._dirty)
+
+            self._dirty.clear()
+
+            manager = self._network.manager
+            home_id = self._network.home_id
+
+            for node_id in node_ids:
+                self._present[node_id] = True
+                self._matrix[node_id] = False
+                try:
+                    neighbors = manager.getNodeNeighbors(home_id, node_id)
+                except:
+                    logger.exception(
+                        u'Unable to get the neighbors of node : %s',
+                        node_id
+                    )
+                    continue
+
+                self._matrix[node_id, list(neighbors)] = True
+
+    def _on_controller_command(
+        self,
+        sender,
+        network=None,
+        node_id=None,
+        **kwargs
+    ):
+        if network is not self._network or node_id is None:
+            return
+
+        controller = network.controller
+        state = kwargs.get('controllerState', None)
+
+        if (
+            state in controller.STATES_UNLOCKED and
+            state != controller.STATE_NORMAL
+        ):
+            self.invalidate(node_id)
+
+    def _on_heal_progress(self, sender, network=None, node_id=None, **_):
+        if network is self._network and node_id is not None:
+            self.invalidate(node_id)
+
+    def _on_node_added(self, sender, network=None, node_id=None, **_):
+        if network is self._network and node_id is not None:
+            self.invalidate(node_id)
+
+    def _on_node_removed(self, sender, network=None, node_id=None, **_):
+        if network is not self._network or node_id is None:
+            return
+
+        with self._lock:
+            self._dirty.discard(node_id)
+            self._present[node_id] = False
+            self._matrix[node_id] = False
+            self._matrix[:, node_id] = False
+
+    def _on_network_ready(self, sender, network=None, **_):
+        if network is self._network:
+            self.invalidate()
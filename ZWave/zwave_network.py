@@ -25,6 +25,19 @@ import zwave
 import zwave_command_classes
 from zwave_object import ZWaveObject
 from zwave_controller import ZWaveController
+from zwave_energy import ZWaveEnergy
+from zwave_config_index import ZWaveConfigIndex
+from zwave_heal import ZWaveHealScheduler
+from zwave_history import ZWaveHistory
+from zwave_wake_up import ZWaveWakeUpScheduler
+from zwave_config_profile import ZWaveConfigProfiles
+from zwave_poll import ZWavePollScheduler
+from zwave_unsolicited import ZWaveUnsolicitedReports
+from zwave_value import WriteLatencies
+from zwave_command_queue import ValueSendQueue
+from zwave_group_set import ZWaveGroupSetter
+from zwave_neighbors import ZWaveNeighborMatrix
+from zwave_ramp import ZWaveRampScheduler, ZWaveFadeGroup
 from zwave_node import ZWaveNodeInterface
 from zwave_option import ZWaveOption
 from zwave_scene import ZWaveScene
@@ -79,6 +92,11 @@ class ZWaveNetwork(ZWaveObject):
         * SIGNAL_NOTIFICATION = 'Notification'
         * SIGNAL_CONTROLLER_COMMAND = 'ControllerCommand'
         * SIGNAL_CONTROLLER_WAITING = 'ControllerWaiting'
+        * SIGNAL_HEAL_STARTED = 'HealStarted'
+        * SIGNAL_HEAL_PROGRESS = 'HealProgress'
+        * SIGNAL_HEAL_COMPLETE = 'HealComplete'
+        * SIGNAL_CONFIG_PROFILE_PROGRESS = 'ConfigProfileProgress'
+        * SIGNAL_CONFIG_PROFILE_COMPLETE = 'ConfigProfileComplete'
 
     The table presented below sets notifications in the order they might
     typically be received, and grouped into a few logically related
@@ -285,6 +303,11 @@ class ZWaveNetwork(ZWaveObject):
     SIGNAL_CONTROLLER_COMMAND = 'ControllerCommand'
     SIGNAL_CONTROLLER_WAITING = 'ControllerWaiting'
     SIGNAL_CONTROLLER_STATS = 'ControllerStats'
+    SIGNAL_HEAL_STARTED = 'HealStarted'
+    SIGNAL_HEAL_PROGRESS = 'HealProgress'
+    SIGNAL_HEAL_COMPLETE = 'HealComplete'
+    SIGNAL_CONFIG_PROFILE_PROGRESS = 'ConfigProfileProgress'
+    SIGNAL_CONFIG_PROFILE_COMPLETE = 'ConfigProfileComplete'
 
     STATE_STOP = 0
     STATE_FAILED = 1
@@ -332,6 +355,20 @@ class ZWaveNetwork(ZWaveObject):
         self._semaphore_nodes = threading.Semaphore()
         self._id_separator = '.'
         self.network_event = threading.Event()
+        self._heal_scheduler = ZWaveHealScheduler(self)
+        self._config_index = None
+        self._config_index_lock = threading.Lock()
+        self._ramp_scheduler = ZWaveRampScheduler(self)
+        self._history = ZWaveHistory(self)
+        self._energy = ZWaveEnergy(self)
+        self._wake_up_scheduler = ZWaveWakeUpScheduler(self)
+        self._config_profiles = ZWaveConfigProfiles(self)
+        self._poll_scheduler = ZWavePollScheduler(self)
+        self._unsolicited_reports = ZWaveUnsolicitedReports(self)
+        self._write_latencies = WriteLatencies()
+        self._send_queue = ValueSendQueue(self)
+        self._group_setter = ZWaveGroupSetter(self)
+        self._neighbor_matrix = ZWaveNeighborMatrix(self)
 
         self._started = False
         if auto_start:
@@ -362,6 +399,7 @@ class ZWaveNetwork(ZWaveObject):
         self._manager.addWatcher(self.zwcallback)
         self._manager.addDriver(self._options.device)
         self._started = True
+        self._poll_scheduler.start()
 
     # noinspection PyBroadException,PyPep8
     def stop(self, fire=True):
@@ -376,6 +414,12 @@ class ZWaveNetwork(ZWaveObject):
             return
 
         logger.info(u"Stop Openzwave network.")
+        if self._heal_scheduler.is_running:
+            self._heal_scheduler.stop()
+        self._ramp_scheduler.stop()
+        self._poll_scheduler.stop()
+        self._send_queue.stop()
+        self._history.flush()
         if self.controller is not None:
             self.controller.stop()
         self.write_config()
@@ -434,6 +478,10 @@ class ZWaveNetwork(ZWaveObject):
         """
         self._manager.destroy()
         self._options.destroy()
+        self._history.close()
+        if self._config_index is not None:
+            self._config_index.close()
+            self._config_index = None
         self._manager = None
         self._options = None
 
@@ -628,6 +676,25 @@ class ZWaveNetwork(ZWaveObject):
         else:
             self.manager.switchAllOff(self.home_id)
 
+    def group_set(self, nodes, level):
+        """
+        Switch a set of SwitchBinary and SwitchMultilevel nodes to a level.
+
+        The SwitchAll broadcast is used when it switches exactly these
+        nodes, otherwise the commands are sent as one paced stream. Nodes
+        that do not confirm are sent the command again.
+
+        :param nodes: The nodes
+        :type nodes: iterable of ZWaveNode
+        :param level: 0 - 99, 255 for the last level of the dimmers, True
+        or False
+        :type level: int, bool
+        :return: The progress, with the time from the first command to the
+        last confirmation
+        :rtype: zwave_group_set.GroupSetResult
+        """
+        return self._group_setter.set(nodes, level)
+
     def test(self, count=1):
         """
         Send a number of test messages to every node and record results.
@@ -637,7 +704,25 @@ class ZWaveNetwork(ZWaveObject):
         """
         self.manager.testNetwork(self.home_id, count)
 
-    def heal(self, update_node_route=False):
+    def heal(self, update_node_route=False, node_ids=None):
+        """
+        Heal network by requesting nodes rediscover their neighbors.
+
+        The nodes are healed a few at a time by the heal scheduler so the
+        controller is not saturated and automations keep running. Progress
+        is reported with the SIGNAL_HEAL_* signals.
+
+        :param update_node_route: Optional Whether to perform return routes
+        initialization. (default = false).
+        :type update_node_route: bool
+        :param node_ids: Optional list of node ids to heal. (default = all)
+        :type node_ids: list, None
+        :return: True if the heal has been started. False otherwise
+        :rtype: bool
+        """
+        return self._heal_scheduler.start(update_node_route, node_ids)
+
+    def heal_all(self, update_node_route=False):
         """
         Heal network by requesting nodes rediscover their neighbors.
         Sends a ControllerCommand_RequestNodeNeighborUpdate to every node.
@@ -653,8 +738,171 @@ class ZWaveNetwork(ZWaveObject):
             logger.warning(u'Network must be awake')
             return False
         self.manager.healNetwork(self.home_id, update_node_route)
+        self._neighbor_matrix.invalidate()
         return True
 
+    @property
+    def heal_scheduler(self):
+        """
+        The scheduler used to heal the network.
+
+        :rtype: ZWaveHealScheduler
+        """
+        return self._heal_scheduler
+
+    @property
+    def neighbor_matrix(self):
+        """
+        The adjacency matrix of the network.
+
+        :rtype: ZWaveNeighborMatrix
+        """
+        return self._neighbor_matrix
+
+    @property
+    def config_index(self):
+        """
+        The compiled index of the OpenZWave device database.
+
+        The index is opened the first time it is used and compiled again
+        if the xml files in the config folder have changed.
+
+        :rtype: ZWaveConfigIndex or None
+        """
+        with self._config_index_lock:
+            if self._config_index is None and self._options is not None:
+                try:
+                    self._config_index = ZWaveConfigIndex.load(
+                        self._options.config_path
+                    )
+                except:
+                    logger.exception(u'Unable to load the config index.')
+
+            return self._config_index
+
+    def invalidate_config_index(self):
+        """
+        Close the config index, it is checked against the xml files again
+        the next time it is used.
+        """
+        with self._config_index_lock:
+            if self._config_index is not None:
+                self._config_index.close()
+                self._config_index = None
+
+    @property
+    def history(self):
+        """
+        The stored samples of the SensorMultilevel, Meter and Battery
+        values.
+
+        :rtype: ZWaveHistory
+        """
+        return self._history
+
+    @property
+    def energy(self):
+        """
+        The energy used by the nodes and rooms, from the history of the
+        Meter values.
+
+        :rtype: ZWaveEnergy
+        """
+        return self._energy
+
+    @property
+    def wake_up_scheduler(self):
+        """
+        Holds the configuration and refresh requests of sleeping nodes
+        until they wake up.
+
+        :rtype: ZWaveWakeUpScheduler
+        """
+        return self._wake_up_scheduler
+
+    @property
+    def config_profiles(self):
+        """
+        The configuration profiles of the products.
+
+        :rtype: ZWaveConfigProfiles
+        """
+        return self._config_profiles
+
+    @property
+    def poll_scheduler(self):
+        """
+        The scheduler that polls the values.
+
+        :rtype: ZWavePollScheduler
+        """
+        return self._poll_scheduler
+
+    @property
+    def unsolicited_reports(self):
+        """
+        Finds the polled values that report on their own.
+
+        :rtype: ZWaveUnsolicitedReports
+        """
+        return self._unsolicited_reports
+
+    @property
+    def write_latencies(self):
+        """
+        How long the writes to values take to be confirmed.
+
+        :rtype: WriteLatencies
+        """
+        return self._write_latencies
+
+    @property
+    def send_queue(self):
+        """
+        The queue the writes to values go through.
+
+        :rtype: ValueSendQueue
+        """
+        return self._send_queue
+
+    @property
+    def group_setter(self):
+        """
+        Switches sets of nodes, see group_set.
+
+        :rtype: ZWaveGroupSetter
+        """
+        return self._group_setter
+
+    @property
+    def ramp_scheduler(self):
+        """
+        The scheduler running the level ramps of the network.
+
+        :rtype: ZWaveRampScheduler
+        """
+        return self._ramp_scheduler
+
+    def create_fade_group(self, node_ids=None):
+        """
+        Create a group of dimmers and color lights that fade together.
+
+        :param node_ids: The ids of the nodes to put into the group.
+        Defaults to every dimmer and color light on the network.
+        :type node_ids: list, None
+        :rtype: ZWaveFadeGroup
+        """
+        if node_ids is None:
+            node_ids = self._nodes.keys()
+
+        return ZWaveFadeGroup(
+            self,
+            list(
+                self._nodes[node_id] for node_id in node_ids
+                if node_id in self._nodes
+            )
+        )
+
     def get_value(self, value_id):
         """
         Retrieve a value on the network.
@@ -34,6 +34,7 @@ class ZWaveNode(ZWaveObject):
     """
 
     _isReady = False
+    _value_accessors = {}
 
     def __init__(self, object_id, network=None, use_cache=False):
         """
@@ -50,8 +51,10 @@ class ZWaveNode(ZWaveObject):
             self._cls_ids = []
 
         self._values = ValuesContainer()
+        self._value_slots = {}
         self._is_locked = False
         self._isReady = False
+        self._product_key = None
 
         ZWaveObject.__init__(
             self,
@@ -283,9 +286,12 @@ class ZWaveNode(ZWaveObject):
         """
         The neighbors of the node.
 
-        :rtype: list
+        The neighbors are read from the neighbor matrix of the network
+        which only asks the node again after a neighbor update or a heal.
+
+        :rtype: set
         """
-        return self.__get('NodeNeighbors')
+        return set(self._network.neighbor_matrix.neighbors(self.object_id))
 
     @property
     def num_groups(self):
@@ -530,6 +536,10 @@ class ZWaveNode(ZWaveObject):
         self._values[value_id] = value_id
         value = self._values[value_id]
 
+        for accessor in self._value_accessors.get(value.command_class, ()):
+            if accessor.matches(value):
+                accessor.bind(self, value)
+
         return value
 
     def change_value(self, value_id):
@@ -581,7 +591,16 @@ class ZWaveNode(ZWaveObject):
         return self._network.manager.refreshValue(value.id)
 
     def remove_value(self, value_id):
-        return self.values.pop(value_id, False)
+        value = self.values.pop(value_id, False)
+
+        if value:
+            for accessor in self._value_accessors.get(
+                value.command_class,
+                ()
+            ):
+                accessor.unbind(self, value)
+
+        return value
 
     def set_field(self, field, value):
         """
@@ -641,6 +660,60 @@ class ZWaveNode(ZWaveObject):
         """
         self.__set('NodeManufacturerName', value)
 
+    @property
+    def product_key(self):
+        """
+        The key of the node in the device database.
+
+        :return: (manufacturer id, product type, product id) or None if the
+        node has not reported them yet.
+        :rtype: tuple or None
+        """
+        if self._product_key is None:
+            try:
+                key = (
+                    int(self.manufacturer_id, 16),
+                    int(self.product_type, 16),
+                    int(self.product_id, 16)
+                )
+            except (TypeError, ValueError):
+                return None
+
+            if key == (0, 0, 0):
+                return None
+            self._product_key = key
+
+        return self._product_key
+
+    @property
+    def config_parameters(self):
+        """
+        The configuration parameters of the node from the device database.
+
+        :return: [dict(index=, label=, type=, min=, max=, size=, value=,
+        units=, help=, items=[(value, label), ...], ...), ...]
+        :rtype: list
+        """
+        key = self.product_key
+        index = self._network.config_index
+        if key is None or index is None:
+            return []
+        return index.parameters(*key)
+
+    @property
+    def association_groups(self):
+        """
+        The association groups of the node from the device database.
+
+        :return: [dict(index=, label=, max_associations=), ...]
+        :rtype: list
+        """
+        key = self.product_key
+        index = self._network.config_index
+        if key is None or index is None:
+            return []
+        return index.groups(*key)
+
     @property
     def generic(self):
         """
@@ -867,6 +940,9 @@ class ZWaveNode(ZWaveObject):
         :rtype: bool
         """
         logger.debug(u'refresh_info for node [%s]', self.object_id)
+        if self._network.wake_up_scheduler.hold(self, 'refresh_info'):
+            return True
+
         return self._network.manager.refreshNodeInfo(
             self.home_id,
             self.object_id
@@ -881,6 +957,9 @@ class ZWaveNode(ZWaveObject):
         :rtype: bool
         """
         logger.debug(u'request_state for node [%s]', self.object_id)
+        if self._network.wake_up_scheduler.hold(self, 'request_state'):
+            return True
+
         return self._network.manager.requestNodeState(
             self.home_id,
             self.object_id
@@ -981,6 +1060,10 @@ class ZWaveNode(ZWaveObject):
 
         """
         logger.debug(u'Requesting config params for node [%s]', self.object_id)
+        scheduler = self._network.wake_up_scheduler
+        if scheduler.hold(self, 'request_all_config_params'):
+            return
+
         self._network.manager.requestAllConfigParams(
             self.home_id,
             self.object_id
@@ -1009,6 +1092,10 @@ class ZWaveNode(ZWaveObject):
             param,
             self.object_id
         )
+        scheduler = self._network.wake_up_scheduler
+        if scheduler.hold(self, 'request_config_param', param):
+            return
+
         self._network.manager.requestConfigParam(
             self.home_id,
             self.object_id,
@@ -1032,7 +1119,8 @@ class ZWaveNode(ZWaveObject):
         :param size: Is an optional number of bytes to be sent for the
         parameter value. Defaults to 2.
         :type size: int
-        :return:
+        :return: When the node is asleep the parameter is written when it
+        wakes up, the last value set for a parameter wins.
         :rtype: bool
         """
         logger.debug(
@@ -1040,6 +1128,10 @@ class ZWaveNode(ZWaveObject):
             param,
             self.object_id
         )
+        scheduler = self._network.wake_up_scheduler
+        if scheduler.hold(self, 'set_config_param', param, value, size):
+            return True
+
         return self.__set('ConfigParam', param, value, size)
 
     @property
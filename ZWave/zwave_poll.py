@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.eventghost.net/>.
+
+import os
+import json
+import time
+import heapq
+import logging
+import itertools
+import threading
+import dispatcher
+
+logger = logging.getLogger('openzwave')
+
+PRIORITY_WATCHED = 0
+PRIORITY_CHANGED = 1
+PRIORITY_NORMAL = 2
+
+
+class PolledValue(object):
+    """
+    The poll state of a value.
+    """
+
+    def __init__(self, value, period, due):
+        self.value = value
+        self.period = period
+        self.interval = period
+        self.due = due
+        self.watched = False
+        self.polled = 0.0
+        self.changed = 0.0
+        self.polls = 0
+        self.poll_changes = 0
+        self.unsolicited = 0
+
+    @property
+    def is_waiting(self):
+        """
+        Has the value been polled and not changed since.
+
+        :rtype: bool
+        """
+        return self.polled > self.changed
+
+
+class ZWavePollScheduler(object):
+    """
+    Polls values from a single thread, each at its own interval.
+
+    Replaces the poll loop of OpenZWave, which polls every polled value of
+    the network in turn no matter how often it changes. Here every value
+    has its own period, the poll intensity is the number of periods between
+    polls. The interval of a value grows by backoff every time a poll
+    returns nothing new, up to max_period, and goes back to the period as
+    soon as a poll finds a change. A value that changes without being
+    polled reports on its own and is only polled every max_period.
+
+    Values that are watched are never backed off and are polled before the
+    others, followed by the values that changed in the last recent
+    seconds. No more than budget polls per second are sent for the whole
+    network. Nodes that sleep are not polled.
+
+    The intensities of the polled values are written to the user directory
+    and the values are polled again when they are added in the next
+    session.
+    """
+
+    STATE_FILE = 'poll_state.json'
+
+    def __init__(
+        self,
+        network,
+        period=30.0,
+        max_period=3600.0,
+        budget=1.0,
+        backoff=1.5,
+        response_time=5.0,
+        recent=300.0
+    ):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param period: Seconds between the polls of a value with an
+        intensity of 1
+        :type period: float
+        :param max_period: The longest interval a value is backed off to
+        :type max_period: float
+        :param budget: The maximum number of polls per second, has to be
+        more than 0
+        :type budget: float
+        :param backoff: The interval of a value is multiplied by this when
+        a poll returns nothing new
+        :type backoff: float
+        :param response_time: Changes this many seconds after a poll are
+        taken as the answer to the poll
+        :type response_time: float
+        :param recent: Values that changed in the last this many seconds
+        are polled before the others
+        :type recent: float
+        """
+        self._network = network
+        self.period = period
+        self.max_period = max_period
+        self.budget = budget
+        self.backoff = backoff
+        self.response_time = response_time
+        self.recent = recent
+
+        self._values = {}
+        self._intensities = {}
+        self._loaded = False
+        self._queue = []
+        self._counter = itertools.count()
+        self._last_poll = 0.0
+        self._polls = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        dispatcher.connect(
+            self._on_value_added,
+            network.SIGNAL_VALUE_ADDED
+        )
+        dispatcher.connect(
+            self._on_value_changed,
+            network.SIGNAL_VALUE_CHANGED
+        )
+        dispatcher.connect(
+            self._on_value_removed,
+            network.SIGNAL_VALUE_REMOVED
+        )
+
+    def enable(self, value, intensity=1):
+        """
+        Start polling a value.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :param intensity: The number of periods between polls
+        :type intensity: int
+        :return: True if the value is polled
+        :rtype: bool
+        """
+        if intensity < 1:
+            self.disable(value)
+            return False
+
+        now = time.time()
+        period = self.period * intensity
+
+        with self._condition:
+            entry = self._values.get(value.id, None)
+            if entry is None:
+                # spread the first polls over the period
+                entry = PolledValue(
+                    value,
+                    period,
+                    now + period * (len(self._values) % 10) / 10.0
+                )
+                self._values[value.id] = entry
+            else:
+                entry.period = period
+                entry.interval = period
+                entry.due = min(entry.due, now + period)
+
+            self._push(entry)
+            self._start()
+            self._condition.notify()
+
+            self._load()
+            if self._intensities.get(value.id, None) != intensity:
+                self._intensities[value.id] = intensity
+                self._save()
+
+        return True
+
+    def disable(self, value):
+        """
+        Stop polling a value.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :return: True if the value was polled
+        :rtype: bool
+        """
+        with self._condition:
+            self._load()
+            if self._intensities.pop(value.id, None) is not None:
+                self._save()
+
+            return self._values.pop(value.id, None) is not None
+
+    def watch(self, value, watched=True):
+        """
+        Mark a value as watched, ie: because it is displayed. Watched values
+        are polled first and their interval is never backed off.
+
+        :param value: The value, it has to be polled
+        :type value: ZWaveValue
+        :param watched: True to watch, False to stop watching
+        :type watched: bool
+        """
+        with self._condition:
+            entry = self._values.get(value.id, None)
+            if entry is None:
+                return
+
+            entry.watched = watched
+            if watched and entry.interval > entry.period:
+                entry.interval = entry.period
+                entry.due = min(entry.due, time.time() + entry.period)
+                self._push(entry)
+                self._condition.notify()
+
+    def is_polled(self, value):
+        """
+        :param value: The value
+        :type value: ZWaveValue
+        :rtype: bool
+        """
+        return value.id in self._values
+
+    def interval(self, value):
+        """
+        The current number of seconds between the polls of a value.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :rtype: float or None
+        """
+        entry = self._values.get(value.id, None)
+        if entry is not None:
+            return entry.interval
+
+    def entry(self, value_id):
+        """
+        The poll state of a value.
+
+        :param value_id: The id of the value
+        :type value_id: int
+        :rtype: PolledValue or None
+        """
+        return self._values.get(value_id, None)
+
+    @property
+    def stats(self):
+        """
+        :return: dict(values=, polls=, polls_per_minute=), polls_per_minute
+        is what the current intervals add up to.
+        :rtype: dict
+        """
+        with self._condition:
+            entries = list(self._values.values())
+            polls = self._polls
+
+        return dict(
+            values=len(entries),
+            polls=polls,
+            polls_per_minute=sum(60.0 / e.interval for e in entries)
+        )
+
+    def start(self):
+        """
+        Start the scheduler thread if there are values to poll.
+        """
+        with self._condition:
+            if self._values:
+                self._start()
+
+    def stop(self):
+        """
+        Stop the scheduler thread, the values stay polled and polling
+        starts again with start.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    @property
+    def _state_file(self):
+        controller = self._network.controller
+        if controller is None or controller.options is None:
+            return None
+
+        user_path = controller.options.user_path
+        if not user_path:
+            return None
+
+        return os.path.join(user_path, self.STATE_FILE)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        path = self._state_file
+        if path is None or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            logger.exception(u'Unable to load poll state : %s', path)
+            return
+
+        self._intensities.update(
+            (long(value_id), int(intensity))
+            for value_id, intensity in data.items()
+        )
+
+    def _save(self):
+        path = self._state_file
+        if path is None:
+            return
+
+        data = dict(
+            (str(value_id), intensity)
+            for value_id, intensity in self._intensities.items()
+        )
+
+        try:
+            with open(path, 'w') as f:
+                json.dump(data, f)
+        except IOError:
+            logger.exception(u'Unable to save poll state : %s', path)
+
+    def _push(self, entry):
+        heapq.heappush(
+            self._queue,
+            (entry.due, next(self._counter), entry)
+        )
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _is_queued(self, entry, due):
+        return (
+            self._values.get(entry.value.id, None) is entry and
+            entry.due == due
+        )
+
+    def _priority(self, entry, now):
+        if entry.watched:
+            return PRIORITY_WATCHED
+        if now - entry.changed < self.recent:
+            return PRIORITY_CHANGED
+        return PRIORITY_NORMAL
+
+    def _next(self, now):
+        # pick the most important of the values that are due
+        due_entries = []
+        while self._queue and self._queue[0][0] <= now:
+            due, _, entry = heapq.heappop(self._queue)
+            if self._is_queued(entry, due):
+                due_entries += [entry]
+
+        if not due_entries:
+            return None
+
+        due_entries.sort(key=lambda e: (self._priority(e, now), e.due))
+        for entry in due_entries[1:]:
+            self._push(entry)
+        return due_entries[0]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+
+                if not self._running:
+                    break
+
+                due, _, entry = self._queue[0]
+                if not self._is_queued(entry, due):
+                    heapq.heappop(self._queue)
+                    continue
+
+                due = max(due, self._last_poll + 1.0 / self.budget)
+                now = time.time()
+
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+
+                entry = self._next(now)
+                if entry is None:
+                    continue
+
+                if entry.is_waiting and not entry.watched:
+                    # the last poll returned nothing new
+                    entry.interval = min(
+                        entry.interval * self.backoff,
+                        max(self.max_period, entry.period)
+                    )
+
+                entry.due = now + entry.interval
+                self._push(entry)
+
+                node = entry.value.node
+                if not (
+                    node.is_listening_device or
+                    node.is_frequent_listening_device
+                ):
+                    continue
+
+                entry.polled = now
+                entry.polls += 1
+                self._polls += 1
+                self._last_poll = now
+
+            try:
+                self._network.manager.refreshValue(entry.value.id)
+            except:
+                logger.exception(
+                    u'Unable to poll value %s',
+                    entry.value.id
+                )
+
+    def _on_value_added(self, network=None, value=None, **_):
+        if network is not self._network or value is None:
+            return
+
+        with self._condition:
+            self._load()
+            intensity = self._intensities.get(value.id, None)
+
+        # values polled by OpenZWave are moved over to the scheduler, the
+        # poll loop of OpenZWave would poll them as well
+        manager = network.manager
+        try:
+            if manager.isPolled(value.id):
+                if intensity is None:
+                    intensity = manager.getPollIntensity(value.id)
+                manager.disablePoll(value.id)
+        except:
+            logger.exception(u'Unable to read the poll of %s', value.id)
+
+        if intensity is not None:
+            value.enable_poll(max(intensity, 1))
+
+    def _on_value_changed(self, network=None, value=None, **_):
+        if network is not self._network or value is None:
+            return
+
+        now = time.time()
+
+        # the reports that follow a write are the answer to the write, the
+        # value is confirmed before the change is sent
+        state = value.write_state
+        written = state['pending'] or (
+            state['confirmed'] is not None and
+            now - state['confirmed'] <= self.response_time
+        )
+
+        with self._condition:
+            entry = self._values.get(value.id, None)
+            if entry is None:
+                return
+
+            if written:
+                entry.changed = now
+                return
+
+            if entry.is_waiting and now - entry.polled <= self.response_time:
+                entry.poll_changes += 1
+                entry.interval = entry.period
+            else:
+                # the value reports on its own
+                entry.unsolicited += 1
+                if not entry.watched:
+                    entry.interval = max(self.max_period, entry.period)
+
+            entry.changed = now
+            entry.due = now + entry.interval
+            self._push(entry)
+
+    # noinspection PyShadowingBuiltins
+    def _on_value_removed(self, network=None, id=None, **_):
+        if network is not self._network:
+            return
+
+        with self._condition:
+            self._values.pop(id, None)
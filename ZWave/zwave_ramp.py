@@ -0,0 +1,578 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import heapq
+import itertools
+import logging
+import threading
+import dispatcher
+import zwave_command_classes
+
+logger = logging.getLogger('openzwave')
+
+
+class Ramp(object):
+    """
+    A single value moving from a start level to a target level over a
+    period of time.
+    """
+
+    def __init__(
+        self,
+        value,
+        start,
+        target,
+        duration,
+        interval,
+        start_time=None
+    ):
+        """
+        :param value: The value to ramp
+        :type value: ZWaveValue
+        :param start: Level at the start of the ramp
+        :type start: int
+        :param target: Level at the end of the ramp
+        :type target: int
+        :param duration: Length of the ramp in seconds
+        :type duration: float
+        :param interval: Seconds between two commands
+        :type interval: float
+        :param start_time: When the ramp starts. Defaults to now.
+        :type start_time: float, None
+        """
+        if start_time is None:
+            start_time = time.time()
+
+        self.value = value
+        self.start = start
+        self.target = target
+        self.duration = duration
+        self.interval = interval
+        self.start_time = start_time
+        self.last_level = start
+
+    @property
+    def end_time(self):
+        return self.start_time + self.duration
+
+    def level(self, now):
+        """
+        The level the value should be at.
+
+        :param now: A timestamp
+        :type now: float
+        :rtype: int
+        """
+        if self.duration <= 0 or now >= self.end_time:
+            return self.target
+
+        ratio = (now - self.start_time) / self.duration
+        return int(round(self.start + (self.target - self.start) * ratio))
+
+    def is_done(self, now):
+        return now >= self.end_time
+
+
+class ColorRamp(Ramp):
+    """
+    A color value moving from one color to another. Colors are strings
+    in the #RRGGBB or #RRGGBBWW format used by the SwitchColor command
+    class.
+    """
+
+    def __init__(
+        self,
+        value,
+        start,
+        target,
+        duration,
+        interval,
+        start_time=None
+    ):
+        Ramp.__init__(
+            self,
+            value,
+            start,
+            target,
+            duration,
+            interval,
+            start_time
+        )
+        self._start_channels = self._to_channels(start)
+        self._target_channels = self._to_channels(target)
+
+        length = max(len(self._start_channels), len(self._target_channels))
+        self._start_channels += [0] * (length - len(self._start_channels))
+        self._target_channels += [0] * (length - len(self._target_channels))
+
+    @staticmethod
+    def _to_channels(color):
+        color = str(color or '').lstrip('#')
+        return list(
+            int(color[i:i + 2], 16) for i in range(0, len(color) - 1, 2)
+        )
+
+    def level(self, now):
+        if self.duration <= 0 or now >= self.end_time:
+            return self.target
+
+        ratio = (now - self.start_time) / self.duration
+        return '#' + ''.join(
+            '%02X' % int(round(start + (target - start) * ratio))
+            for start, target in zip(
+                self._start_channels,
+                self._target_channels
+            )
+        )
+
+
+class ZWaveRampScheduler(object):
+    """
+    Runs all of the level ramps of a network from a single thread.
+
+    Commands for every active ramp are sent as one paced stream so the
+    mesh is not flooded when a lot of dimmers are ramped at the same time.
+    The time between steps of a ramp is stretched to the round trip time
+    measured for the node, the step size grows accordingly so the ramp
+    still finishes on time. Devices that expose a dimming duration are
+    sent a single command and ramp on their own.
+    """
+
+    def __init__(self, network, min_interval=0.05, rtt_factor=1.5):
+        """
+        Initialize the ramp scheduler.
+
+        :param network: The network the ramps run on
+        :type network: ZWaveNetwork
+        :param min_interval: Minimum number of seconds between two commands
+        sent by the scheduler
+        :type min_interval: float
+        :param rtt_factor: The step interval of a ramp is never shorter than
+        the round trip time of the node multiplied by this factor
+        :type rtt_factor: float
+        """
+        self._network = network
+        self.min_interval = min_interval
+        self.rtt_factor = rtt_factor
+
+        self._ramps = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._sent = {}
+        self._rtt = {}
+        self._last_send = 0.0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        dispatcher.connect(
+            self._on_value_changed,
+            network.SIGNAL_VALUE_CHANGED
+        )
+
+    def ramp(self, value, target, speed=0.17, step=1):
+        """
+        Ramp a value to a level.
+
+        :param value: The value to ramp
+        :type value: ZWaveValue
+        :param target: The level to ramp to
+        :type target: int
+        :param speed: Seconds between each step
+        :type speed: float
+        :param step: Size of each step
+        :type step: int
+        :return: The ramp
+        :rtype: Ramp
+        """
+        start = value.data
+        steps = abs(target - start) / float(max(step, 1))
+        return self.fade(value, target, steps * speed, speed)
+
+    def fade(
+        self,
+        value,
+        target,
+        duration,
+        interval=None,
+        start_time=None,
+        ramp_cls=Ramp
+    ):
+        """
+        Move a value to a level over a period of time.
+
+        :param value: The value to ramp
+        :type value: ZWaveValue
+        :param target: The level to ramp to
+        :type target: int
+        :param duration: Seconds the ramp should take
+        :type duration: float
+        :param interval: Preferred seconds between each step
+        :type interval: float, None
+        :param start_time: When the ramp starts. Used to put several ramps
+        on the same timeline.
+        :type start_time: float, None
+        :param ramp_cls: The class used to compute the steps
+        :type ramp_cls: Ramp
+        :return: The ramp
+        :rtype: Ramp
+        """
+        self.cancel(value)
+
+        if interval is None:
+            interval = self.min_interval
+
+        interval = max(
+            interval,
+            self.min_interval,
+            self.round_trip_time(value.node) * self.rtt_factor
+        )
+
+        ramp = ramp_cls(
+            value,
+            value.data,
+            target,
+            duration,
+            interval,
+            start_time
+        )
+
+        if ramp_cls is Ramp and self._send_duration(value, target, duration):
+            ramp.last_level = target
+            return ramp
+
+        with self._condition:
+            self._ramps[value.id] = ramp
+            self._push(ramp.start_time, ramp)
+            self._start()
+            self._condition.notify()
+
+        return ramp
+
+    def fade_color(
+        self,
+        value,
+        color,
+        duration,
+        interval=None,
+        start_time=None
+    ):
+        """
+        Move a color value to a color over a period of time.
+
+        :param value: The color value
+        :type value: ZWaveValue
+        :param color: The color to fade to (#RRGGBB or #RRGGBBWW)
+        :type color: str
+        :param duration: Seconds the fade should take
+        :type duration: float
+        :param interval: Preferred seconds between each step
+        :type interval: float, None
+        :param start_time: When the fade starts.
+        :type start_time: float, None
+        :return: The ramp
+        :rtype: ColorRamp
+        """
+        return self.fade(
+            value,
+            color,
+            duration,
+            interval,
+            start_time,
+            ColorRamp
+        )
+
+    def cancel(self, value):
+        """
+        Stop the ramp running on a value.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :return: True if a ramp was stopped
+        :rtype: bool
+        """
+        with self._condition:
+            return self._ramps.pop(value.id, None) is not None
+
+    def is_ramping(self, value):
+        """
+        Is a ramp running on a value.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :rtype: bool
+        """
+        return value.id in self._ramps
+
+    def round_trip_time(self, node):
+        """
+        The round trip time for a node in seconds.
+
+        Uses the time measured between a ramp command and the value change
+        it caused, falling back to the node statistics.
+
+        :param node: The node
+        :type node: ZWaveNode
+        :rtype: float
+        """
+        if node.id in self._rtt:
+            return self._rtt[node.id]
+
+        try:
+            return node.stats.get('averageRequestRTT', 0) / 1000.0
+        except:
+            return 0.0
+
+    def stop(self):
+        """
+        Stop all ramps and the scheduler thread.
+        """
+        with self._condition:
+            self._running = False
+            self._ramps.clear()
+            del self._queue[:]
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def _push(self, due, ramp):
+        heapq.heappush(self._queue, (due, next(self._counter), ramp))
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    # noinspection PyProtectedMember
+    def _send_duration(self, value, target, duration):
+        node = value.node
+
+        for val in node.values.values():
+            if (
+                val.command_class == value.command_class and
+                val.instance == value.instance and
+                val.label == 'Dimming Duration'
+            ):
+                break
+        else:
+            return False
+
+        if val._type == 'Byte':
+            if duration <= 127:
+                duration = int(round(duration))
+            else:
+                duration = min(254, 127 + int(round(duration / 60.0)))
+        else:
+            duration = int(round(duration))
+
+        logger.debug(
+            u'Ramp node %s to %s using dimming duration %s',
+            node.id,
+            target,
+            duration
+        )
+        val.data = duration
+        value.data = target
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+
+                if not self._running:
+                    break
+
+                due, _, ramp = self._queue[0]
+                due = max(due, self._last_send + self.min_interval)
+                now = time.time()
+
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+
+                heapq.heappop(self._queue)
+                value_id = ramp.value.id
+                if self._ramps.get(value_id, None) is not ramp:
+                    continue
+
+                level = ramp.level(now)
+
+                if ramp.is_done(now):
+                    del self._ramps[value_id]
+                else:
+                    self._push(now + ramp.interval, ramp)
+
+                if level == ramp.last_level and not ramp.is_done(now):
+                    continue
+
+                ramp.last_level = level
+                self._last_send = now
+                self._sent[value_id] = now
+
+            try:
+                # through the value so the level shows as pending
+                ramp.value.data = level
+            except:
+                logger.exception(u'Ramp failed for value %s', value_id)
+                with self._condition:
+                    self._ramps.pop(value_id, None)
+
+    def _on_value_changed(self, sender, network=None, value=None, **_):
+        if network is not self._network or value is None:
+            return
+
+        sent = self._sent.pop(value.id, None)
+        if sent is None:
+            return
+
+        rtt = time.time() - sent
+        node_id = value.node.id
+
+        if node_id in self._rtt:
+            self._rtt[node_id] = self._rtt[node_id] * 0.8 + rtt * 0.2
+        else:
+            self._rtt[node_id] = rtt
+
+
+class ZWaveFadeGroup(object):
+    """
+    Fades a set of dimmers and color lights on a shared timeline.
+
+    Every light in the group starts and ends its fade at the same time.
+    The steps of all of the lights are sent by the ramp scheduler of the
+    network as one paced stream.
+    """
+
+    def __init__(self, network, nodes=()):
+        """
+        :param network: The network the nodes are on
+        :type network: ZWaveNetwork
+        :param nodes: The nodes in the group
+        :type nodes: iterable of ZWaveNode
+        """
+        self._network = network
+        self._nodes = []
+        self._ramps = []
+
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return self._nodes[:]
+
+    def add(self, node):
+        if (
+            node not in self._nodes and (
+                node == zwave_command_classes.COMMAND_CLASS_SWITCH_MULTILEVEL
+                or node == zwave_command_classes.COMMAND_CLASS_SWITCH_COLOR
+            )
+        ):
+            self._nodes += [node]
+
+    def remove(self, node):
+        if node in self._nodes:
+            self._nodes.remove(node)
+
+    @property
+    def is_fading(self):
+        scheduler = self._network.ramp_scheduler
+        now = time.time()
+
+        for ramp in self._ramps:
+            if scheduler.is_ramping(ramp.value) and not ramp.is_done(now):
+                return True
+        return False
+
+    def fade(self, target, duration=1.0, interval=None):
+        """
+        Fade every light in the group.
+
+        :param target: The level (0 - 99) or color (#RRGGBB) to fade to.
+        A dict of node id to level or color can be used to give each node
+        its own target.
+        :type target: int, str or dict
+        :param duration: Seconds the fade should take
+        :type duration: float
+        :param interval: Preferred seconds between the steps of a light
+        :type interval: float, None
+        :return: The ramps that were started
+        :rtype: list
+        """
+        scheduler = self._network.ramp_scheduler
+        start_time = time.time()
+        self.stop()
+
+        for node in self._nodes:
+            if isinstance(target, dict):
+                if node.id not in target:
+                    continue
+                node_target = target[node.id]
+            else:
+                node_target = target
+
+            if isinstance(node_target, (str, unicode)):
+                value = node.values.find(
+                    zwave_command_classes.COMMAND_CLASS_SWITCH_COLOR,
+                    'Color'
+                )
+                if value is None:
+                    continue
+
+                ramp = scheduler.fade_color(
+                    value,
+                    node_target,
+                    duration,
+                    interval,
+                    start_time
+                )
+            else:
+                value = node.values.find(
+                    zwave_command_classes.COMMAND_CLASS_SWITCH_MULTILEVEL,
+                    'Level'
+                )
+                if value is None:
+                    continue
+
+                ramp = scheduler.fade(
+                    value,
+                    node_target,
+                    duration,
+                    interval,
+                    start_time
+                )
+
+            self._ramps += [ramp]
+
+        return self._ramps[:]
+
+    def stop(self):
+        """
+        Stop the fade of every light in the group.
+        """
+        scheduler = self._network.ramp_scheduler
+        for ramp in self._ramps:
+            scheduler.cancel(ramp.value)
+        del self._ramps[:]
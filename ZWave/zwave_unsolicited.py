@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.eventghost.net/>.
+
+import time
+import logging
+import threading
+import dispatcher
+
+logger = logging.getLogger('openzwave')
+
+HOUR = 60 * 60
+
+# round trip used for a poll when the node has no statistics yet
+DEFAULT_RTT = 0.1
+
+# seconds the statistics of a node are reused
+STATS_AGE = 60.0
+
+
+class ValueReports(object):
+    """
+    How the changes of a value arrived, from the counters the poll
+    scheduler keeps for the value.
+    """
+
+    def __init__(self, entry):
+        """
+        :param entry: The poll state of the value
+        :type entry: PolledValue
+        """
+        self.answers = entry.poll_changes
+        self.reports = entry.unsolicited
+        self.changed = entry.changed
+
+    @property
+    def ratio(self):
+        """
+        The part of the changes that arrived without being polled.
+
+        :rtype: float
+        """
+        total = self.answers + self.reports
+        if not total:
+            return 0.0
+        return float(self.reports) / total
+
+
+class ZWaveUnsolicitedReports(object):
+    """
+    Learns which values report on their own and stops polling them.
+
+    The poll scheduler sorts the changes of every polled value, a change
+    that arrives within response_time of a poll of the value is an answer
+    to the poll, any other change is a report the node sent on its own.
+    A value sends reports when at least min_reports of its changes
+    were reports, they make up at least ratio of its changes and the
+    receivedUnsolicited statistic of the node is counting.
+
+    Polling these values is only traffic. They are listed by suggestions,
+    with the airtime the polls take, and their polling is turned off by
+    disable or, with auto_disable set, as soon as they are found.
+    """
+
+    def __init__(
+        self,
+        network,
+        min_reports=3,
+        ratio=0.75,
+        auto_disable=False
+    ):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param min_reports: The number of reports needed before a value is
+        taken as reporting on its own
+        :type min_reports: int
+        :param ratio: The part of the changes of a value that has to be
+        reports
+        :type ratio: float
+        :param auto_disable: Turn off polling of reporting values as soon as
+        they are found
+        :type auto_disable: bool
+        """
+        self._network = network
+        self.min_reports = min_reports
+        self.ratio = ratio
+        self.auto_disable = auto_disable
+
+        self._lock = threading.Lock()
+        self._node_stats = {}
+        self._disabled = {}
+        self._controller_writes = None
+
+        # connected after the poll scheduler, which counts the change first
+        dispatcher.connect(
+            self._on_value_changed,
+            network.SIGNAL_VALUE_CHANGED
+        )
+
+    def reports(self, value_id):
+        """
+        How the changes of a polled value arrived.
+
+        :param value_id: The id of the value
+        :type value_id: int
+        :rtype: ValueReports or None
+        """
+        entry = self._network.poll_scheduler.entry(value_id)
+        if entry is None:
+            return None
+        return ValueReports(entry)
+
+    def _stats(self, node):
+        now = time.time()
+        checked, stats = self._node_stats.get(node.id, (0.0, None))
+
+        if now - checked > STATS_AGE:
+            try:
+                stats = node.stats
+            except:
+                logger.exception(u'Unable to read stats of [%s]', node.id)
+                stats = None
+
+            if not isinstance(stats, dict):
+                stats = None
+            self._node_stats[node.id] = (now, stats)
+
+        return stats
+
+    def is_reporting(self, value):
+        """
+        Does a value report its changes on its own.
+
+        :param value: The value
+        :type value: ZWaveValue
+        :rtype: bool
+        """
+        reports = self.reports(value.id)
+        if (
+            reports is None or
+            reports.reports < self.min_reports or
+            reports.ratio < self.ratio
+        ):
+            return False
+
+        stats = self._stats(value.node)
+        return stats is None or stats.get('receivedUnsolicited', 0) > 0
+
+    def _rtt(self, node):
+        stats = self._stats(node) or {}
+        rtt = stats.get('averageRequestRTT', 0)
+        if not rtt:
+            return DEFAULT_RTT
+        return rtt / 1000.0
+
+    def _saving(self, value, period):
+        polls = HOUR / period
+        rtt = self._rtt(value.node)
+        reports = self.reports(value.id)
+        return dict(
+            value_id=value.id,
+            node_id=value.node.id,
+            label=value.label,
+            reports=reports.reports,
+            answers=reports.answers,
+            polls_per_hour=polls,
+            airtime_per_hour=polls * rtt
+        )
+
+    def suggestions(self):
+        """
+        The polled values that report on their own.
+
+        :return: [dict(value_id=, node_id=, label=, reports=, answers=,
+        polls_per_hour=, airtime_per_hour=), ...], polls_per_hour is from
+        the poll period that was asked for and airtime_per_hour is the
+        seconds per hour those polls take, from the average request round
+        trip of the node.
+        :rtype: list
+        """
+        scheduler = self._network.poll_scheduler
+        res = []
+
+        for node in self._network.nodes.values():
+            for value in node.values.values():
+                entry = scheduler.entry(value.id)
+                if entry is None or not self.is_reporting(value):
+                    continue
+                res += [self._saving(value, entry.period)]
+
+        return res
+
+    def disable(self, value_ids=None):
+        """
+        Turn off polling of the values that report on their own.
+
+        :param value_ids: The values to turn off. Defaults to all of the
+        suggestions.
+        :type value_ids: list, None
+        :return: The suggestions of the values that were turned off
+        :rtype: list
+        """
+        res = []
+        for saving in self.suggestions():
+            if value_ids is not None and saving['value_id'] not in value_ids:
+                continue
+
+            node = self._network.nodes[saving['node_id']]
+            self._disable(node.values[saving['value_id']], saving)
+            res += [saving]
+
+        return res
+
+    def _disable(self, value, saving):
+        value.disable_poll()
+        logger.info(
+            u'Polling of %s on node [%s] turned off, it reports on '
+            u'its own. %.1f seconds of airtime per hour saved',
+            saving['label'],
+            saving['node_id'],
+            saving['airtime_per_hour']
+        )
+
+        with self._lock:
+            self._disabled[saving['value_id']] = saving
+
+    @property
+    def report(self):
+        """
+        What turning off the polls of reporting values saved and what the
+        suggestions would save.
+
+        The share is the part of the messages sent by the controller since
+        the detector started that the polls make up.
+
+        :return: dict(disabled=[], suggested=[], saved_polls_per_hour=,
+        saved_airtime_per_hour=, suggested_polls_per_hour=,
+        suggested_airtime_per_hour=, writes_per_hour=, saved_share=,
+        suggested_share=)
+        :rtype: dict
+        """
+        with self._lock:
+            disabled = list(self._disabled.values())
+        suggested = self.suggestions()
+
+        def total(items, key):
+            return sum(item[key] for item in items)
+
+        res = dict(
+            disabled=disabled,
+            suggested=suggested,
+            saved_polls_per_hour=total(disabled, 'polls_per_hour'),
+            saved_airtime_per_hour=total(disabled, 'airtime_per_hour'),
+            suggested_polls_per_hour=total(suggested, 'polls_per_hour'),
+            suggested_airtime_per_hour=total(suggested, 'airtime_per_hour'),
+            writes_per_hour=None,
+            saved_share=None,
+            suggested_share=None
+        )
+
+        writes = self._writes_per_hour()
+        if writes:
+            res['writes_per_hour'] = writes
+            res['saved_share'] = (
+                res['saved_polls_per_hour'] /
+                (writes + res['saved_polls_per_hour'])
+            )
+            res['suggested_share'] = res['suggested_polls_per_hour'] / writes
+
+        return res
+
+    def _writes_per_hour(self):
+        controller = self._network.controller
+        try:
+            writes = controller.stats.get('writeCnt', 0)
+        except:
+            return None
+
+        now = time.time()
+        if self._controller_writes is None:
+            self._controller_writes = (now, writes)
+            return None
+
+        start, start_writes = self._controller_writes
+        if now - start < 60:
+            return None
+        return (writes - start_writes) * HOUR / (now - start)
+
+    def _on_value_changed(self, network=None, node=None, value=None, **_):
+        if network is not self._network or value is None:
+            return
+
+        entry = network.poll_scheduler.entry(value.id)
+
+        if self._controller_writes is None:
+            self._writes_per_hour()
+
+        if (
+            self.auto_disable and
+            entry is not None and
+            self.is_reporting(value)
+        ):
+            self._disable(value, self._saving(value, entry.period))
@@ -17,8 +17,10 @@
 # with EventGhost. If not, see <http://www.gnu.org/licenses/>.
 
 
+import time
 import threading
 import wx
+from collections import OrderedDict
 
 _threads = {}
 _lock = threading.Lock()
@@ -64,3 +66,111 @@ def remap(value, old_min, old_max, new_min, new_max):
     new_range = new_max - new_min
 
     return (((value - old_min) * new_range) / old_range) + new_min
+
+
+class UIBridge(object):
+    """
+    Hands changes that come in on other threads to the gui in batches.
+
+    Changes are posted under a key, a change posted under a key that is
+    already waiting replaces it unless the new one is weak. The waiting
+    changes are passed to callback on the wx thread at most rate times a
+    second, so a burst of signals turns into a few calls instead of a
+    wx.CallAfter for every signal.
+    """
+
+    RATE = 20.0
+
+    def __init__(self, callback, rate=RATE):
+        """
+        :param callback: Called on the wx thread with a list of
+        (key, action, args) in the order the keys were first posted.
+        :type callback: callable
+        :param rate: Maximum number of calls to callback per second
+        :type rate: float
+        """
+        self._callback = callback
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._dirty = OrderedDict()
+        self._paused = False
+        self._timer = None
+        self._last_flush = 0.0
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def post(self, key, action, *args, **kwargs):
+        """
+        Queue a change.
+
+        :param key: What the change is for, ie: ('node', node_id)
+        :type key: hashable
+        :param action: What changed
+        :type action: str
+        :param args: Handed to the callback with the action
+        :param weak: Do not replace a change waiting under the same key.
+        :type weak: bool
+        """
+        weak = kwargs.pop('weak', False)
+
+        with self._lock:
+            if weak and key in self._dirty:
+                return
+
+            self._dirty[key] = (action, args)
+            self._schedule()
+
+    def pause(self):
+        """
+        Hold the changes until resume is called.
+        """
+        with self._lock:
+            self._paused = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def resume(self):
+        with self._lock:
+            self._paused = False
+            self._schedule()
+
+    def stop(self):
+        """
+        Drop the waiting changes and stop calling the callback.
+        """
+        with self._lock:
+            self._paused = True
+            self._dirty.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _schedule(self):
+        if self._paused or self._timer is not None or not self._dirty:
+            return
+
+        delay = max(0.0, self._last_flush + self._interval - time.time())
+        self._timer = threading.Timer(delay, wx.CallAfter, (self._flush,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if self._paused or not self._dirty:
+                return
+
+            changes = list(
+                (key, action, args)
+                for key, (action, args) in self._dirty.items()
+            )
+            self._dirty.clear()
+            self._last_flush = time.time()
+
+        try:
+            self._callback(changes)
+        except wx.PyDeadObjectError:
+            self.stop()
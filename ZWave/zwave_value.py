@@ -16,29 +16,46 @@
 # You should have received a copy of the GNU General Public License along
 # with EventGhost. If not, see <http://www.gnu.org/licenses/>.
 
+import time
 import logging
 import threading
+import collections
 import dispatcher
 import zwave_command_classes
 from zwave_object import ZWaveObject
 
 logger = logging.getLogger('openzwave')
 
+# seconds a write is shown as the data of a value without being confirmed
+PENDING_TIMEOUT = 10.0
+
+# level that turns a dimmer on at its last level, the node reports the
+# level it went to
+LEVEL_ON = 255
+
+LEVEL_COMMAND_CLASSES = (
+    zwave_command_classes.COMMAND_CLASS_SWITCH_MULTILEVEL,
+    zwave_command_classes.COMMAND_CLASS_BASIC
+)
+
 
 class ValuesContainer(object):
 
     def __init__(self):
         self._values = {}
+        self._index = None
 
     def __radd__(self, other):
         if isinstance(other, dict):
             other = ZWaveValue(**other)
 
         self._values[other.id] = other
+        self._index = None
         return self
 
     def __add__(self, other):
         self._values[other['id']] = ZWaveValue(**other)
+        self._index = None
         return self._values[other['id']]
 
     def __rsub__(self, other):
@@ -46,6 +63,7 @@ class ValuesContainer(object):
             del self._values[other]
         else:
             del self._values[other.id]
+        self._index = None
         return self
 
     def __contains__(self, item):
@@ -74,10 +92,14 @@ class ValuesContainer(object):
             key = key['id']
 
         self._values[key] = ZWaveValue(**value)
+        self._index = None
 
     def pop(self, value, default=None):
+        self._index = None
         if isinstance(value, dict):
             return self._values.pop(value['id'], default)
+        elif isinstance(value, ZWaveValue):
+            return self._values.pop(value.id, default)
         else:
             return self._values.pop(value, default)
 
@@ -90,6 +112,36 @@ class ValuesContainer(object):
     def items(self):
         return self._values.items()
 
+    def find(self, command_class, label, instance=None):
+        """
+        Find a value using the command class and label.
+
+        The lookup is done against an index that is rebuilt only when
+        values are added or removed.
+
+        :param command_class: The command class of the value
+        :type command_class: int
+        :param label: The label of the value
+        :type label: str
+        :param instance: The instance of the value. Defaults to the
+        lowest instance.
+        :type instance: int, None
+        :return: The value or None
+        :rtype: ZWaveValue
+        """
+        if self._index is None:
+            index = {}
+            for value in self:
+                key = (value.command_class, value.label)
+                index.setdefault(key, []).append(value)
+            for values in index.values():
+                values.sort(key=lambda v: v.instance)
+            self._index = index
+
+        for value in self._index.get((command_class, label), []):
+            if instance is None or value.instance == instance:
+                return value
+
     def __eq__(self, other):
         for value in self._values.values():
             if value.command_class == other:
@@ -122,6 +174,75 @@ class ValueTimer(object):
             self._event.set()
 
 
+class WriteLatencies(object):
+    """
+    The time it takes the writes to the values of a network to be
+    confirmed by a report from the node.
+    """
+
+    def __init__(self, size=1000):
+        """
+        :param size: The number of latencies kept
+        :type size: int
+        """
+        self._latencies = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.confirmed = 0
+        self.suppressed = 0
+        self.expired = 0
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self.confirmed += 1
+
+    @property
+    def stats(self):
+        """
+        :return: dict(sent=, confirmed=, suppressed=, expired=, count=,
+        mean=, median=, p95=, max=), the latencies are in seconds over the
+        last confirmed writes and None when there are none. suppressed are
+        the writes that were not sent because the same data was already
+        being written, expired the writes that were never confirmed.
+        :rtype: dict
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        res = dict(
+            sent=self.sent,
+            confirmed=self.confirmed,
+            suppressed=self.suppressed,
+            expired=self.expired,
+            count=len(latencies),
+            mean=None,
+            median=None,
+            p95=None,
+            max=None
+        )
+
+        if latencies:
+            count = len(latencies)
+            res['mean'] = sum(latencies) / count
+            res['median'] = latencies[count // 2]
+            res['p95'] = latencies[min(count - 1, int(count * 0.95))]
+            res['max'] = latencies[-1]
+
+        return res
+
+
+def _same_data(data, other):
+    if data == other:
+        return True
+    if isinstance(data, bool) or isinstance(other, bool):
+        return False
+    try:
+        return abs(float(data) - float(other)) < 1e-6
+    except (TypeError, ValueError):
+        return False
+
+
 # noinspection PyPep8Naming,PyShadowingBuiltins
 class ZWaveValue(ZWaveObject):
 
@@ -159,9 +280,15 @@ class ZWaveValue(ZWaveObject):
         self._readOnly = readOnly
         self._poll_intensity = 0
 
+        self._target = None
+        self._pending = False
+        self._sent = None
+        self._confirmed = None
+        self._latency = None
+        self._write_lock = threading.RLock()
+
         self._label_timer = ValueTimer(0, None)
         self._units_timer = ValueTimer(0, None)
-        self._data_timer = ValueTimer(0, None)
 
         self._entered_event = threading.Event()
         self._entered_lock = threading.Lock()
@@ -180,6 +307,11 @@ class ZWaveValue(ZWaveObject):
         changed_values = self._update(**kwargs)
         self._entered_event.set()
 
+        if 'value' in kwargs:
+            self._confirm()
+            self._network.send_queue.reported(self)
+            self._network.history.record(self, self._data)
+
         if changed_values:
             dispatcher.send(
                 self._network.SIGNAL_VALUE_CHANGED,
@@ -195,6 +327,10 @@ class ZWaveValue(ZWaveObject):
     def refresh_value(self, **kwargs):
         refreshed_values = self._update(**kwargs)
 
+        if 'value' in kwargs:
+            self._confirm()
+            self._network.send_queue.reported(self)
+
         if refreshed_values:
             dispatcher.send(
                 self._network.SIGNAL_VALUE_REFRESHED,
@@ -262,6 +398,17 @@ class ZWaveValue(ZWaveObject):
     def _get(self, item):
         return getattr(self._network.manager, item)(self.id)
 
+    @property
+    def history(self):
+        """
+        The stored samples of the value.
+
+        :return: The history or None if the value is not a SensorMultilevel,
+        Meter or Battery value.
+        :rtype: zwave_history.ValueHistory
+        """
+        return self._network.history.history(self)
+
     @property
     def parent_id(self):
         """
@@ -480,9 +627,14 @@ class ZWaveValue(ZWaveObject):
         """
         Get the current data of the value.
 
+        While a write has not been confirmed by the node the data written
+        is returned, see reported_data for the last data the node reported.
+
         :return: The data of the value
         :rtype: depending of the type of the value
         """
+        if self.is_pending:
+            return self._target
         return self._data
         # return self._get('getValue')
 
@@ -497,17 +649,113 @@ class ZWaveValue(ZWaveObject):
         if new_val != None:
             value.data = new_val
 
+        Writing the data that is already being written is not sent again.
+        The write goes through the send queue of the network, which drops it
+        when the node already reported the data. Buttons and write only
+        values are never reported back, every write to them is sent and
+        none is pending.
+
         :param value: The new data value
         :type value:
         """
+        latencies = self._network.write_latencies
+        send_queue = self._network.send_queue
 
-        self._data_timer.cancel()
-        self._data_timer = ValueTimer(
-            0.2,
-            self._network.manager.setValue
+        if not send_queue.reports_back(self):
+            send_queue.put(self, value)
+            return
+
+        with self._write_lock:
+            if self.is_pending and _same_data(value, self._target):
+                latencies.suppressed += 1
+                logger.debug(
+                    u'Write of %r to value %s is already pending',
+                    value,
+                    self.id
+                )
+                return
+
+            if not send_queue.put(self, value):
+                return
+
+            self._target = value
+            self._pending = True
+            self._sent = time.time()
+            self._confirmed = None
+
+        latencies.sent += 1
+
+    @property
+    def reported_data(self):
+        """
+        The last data reported by the node.
+
+        :rtype: depending of the type of the value
+        """
+        return self._data
+
+    @property
+    def is_pending(self):
+        """
+        Is a write to the value waiting to be confirmed by the node.
+
+        A write that is not confirmed within PENDING_TIMEOUT seconds is
+        dropped.
+
+        :rtype: bool
+        """
+        with self._write_lock:
+            if (
+                self._pending and
+                time.time() - self._sent > PENDING_TIMEOUT
+            ):
+                self._pending = False
+                self._network.write_latencies.expired += 1
+                logger.debug(
+                    u'Write to value %s was not confirmed',
+                    self.id
+                )
+
+            return self._pending
+
+    @property
+    def write_state(self):
+        """
+        The state of the last write to the value.
+
+        :return: dict(target=, pending=, sent=, confirmed=, latency=), sent
+        and confirmed are timestamps, latency is the seconds between them.
+        :rtype: dict
+        """
+        return dict(
+            target=self._target,
+            pending=self.is_pending,
+            sent=self._sent,
+            confirmed=self._confirmed,
+            latency=self._latency
         )
-        self._data_timer(self.id, value)
-        self._network.manager.setValue(self.id, value)
+
+    def _is_confirmed(self):
+        if (
+            self._target == LEVEL_ON and
+            not isinstance(self._target, bool) and
+            self.command_class in LEVEL_COMMAND_CLASSES
+        ):
+            # the node reports the level it turned on at
+            return bool(self._data)
+        return _same_data(self._data, self._target)
+
+    def _confirm(self):
+        with self._write_lock:
+            if not self._pending or not self._is_confirmed():
+                return
+
+            now = time.time()
+            self._pending = False
+            self._confirmed = now
+            self._latency = now - self._sent
+
+        self._network.write_latencies.add(self._latency)
 
     def __enter__(self):
         self._entered_lock.acquire()
@@ -590,13 +838,16 @@ class ZWaveValue(ZWaveObject):
         """
         Enable the polling of a device's state.
 
+        The value is polled by the poll scheduler of the network, the
+        intensity is the number of poll periods between polls.
+
         :param intensity: The intensity of the poll
         :type intensity: int
         :return: True if polling was enabled.
         :rtype: bool
         """
-        self._poll_intensity = intensity
-        return self._network.manager.enablePoll(self.id, intensity)
+        self._poll_intensity = max(intensity, 0)
+        return self._network.poll_scheduler.enable(self, intensity)
 
     def disable_poll(self):
         """
@@ -606,7 +857,7 @@ class ZWaveValue(ZWaveObject):
         :rtype: bool
         """
         self._poll_intensity = 0
-        return self._get('disablePoll')
+        return self._network.poll_scheduler.disable(self)
 
     @property
     def poll_intensity(self):
@@ -618,7 +869,7 @@ class ZWaveValue(ZWaveObject):
         :rtype: int
 
         """
-        return self._get('getPollIntensity')
+        return self._poll_intensity
 
     @property
     def is_polled(self):
@@ -627,7 +878,7 @@ class ZWaveValue(ZWaveObject):
 
         :rtype: bool
         """
-        return self._get('isPolled')
+        return self._poll_intensity > 0
 
     @property
     def command_class(self):
@@ -645,9 +896,15 @@ class ZWaveValue(ZWaveObject):
         """
         Refresh the value.
 
+        When the node is asleep the refresh is sent when it wakes up.
+
         :returns: True if the command was transmitted to controller
         :rtype: bool
         """
+        scheduler = self._network.wake_up_scheduler
+        if scheduler.hold(self._node, 'refresh_value', self.id):
+            return True
+
         return self._get('refreshValue')
 
     @property
@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of EventGhost.
+# Copyright © 2005-2016 EventGhost Project <http://www.eventghost.net/>
+#
+# EventGhost is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# EventGhost is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with EventGhost. If not, see <http://www.eventghost.net/>.
+
+import os
+import json
+import time
+import logging
+import threading
+import dispatcher
+import numpy as np
+
+logger = logging.getLogger('openzwave')
+
+DAY = 24 * 60 * 60
+
+# operations that only read from the node
+READ_OPERATIONS = (
+    'request_config_param',
+    'request_all_config_params',
+    'refresh_info',
+    'request_state',
+    'refresh_value'
+)
+
+WRITE_OPERATIONS = (
+    'set_config_param',
+)
+
+
+class ZWaveWakeUpScheduler(object):
+    """
+    Holds the operations for sleeping nodes until they wake up and sends
+    them together in the wake up window.
+
+    Configuration writes, configuration requests and refreshes for a node
+    that is not a listening device and is asleep are kept here instead of
+    sitting in the OpenZWave queue. Writes to the same parameter replace
+    each other and the same request is only kept once. When the Awake
+    notification of the node arrives everything is sent at once, OpenZWave
+    sends the node Wake Up No More Information when the last of it has been
+    sent so the node goes back to sleep as soon as possible.
+
+    The wake up interval of each node is taken from the Awake notifications
+    or from the Wake-up Interval value of the node. Nodes whose battery is
+    forecast to run out within low_battery_days only get the read
+    operations once every low_battery_refresh seconds, the writes are
+    always sent.
+
+    The intervals and the pending operations are written to the user
+    directory, so they survive a restart.
+    """
+
+    STATE_FILE = 'wake_up_state.json'
+
+    def __init__(
+        self,
+        network,
+        low_battery_days=30.0,
+        low_battery_refresh=DAY,
+        battery_threshold=10.0
+    ):
+        """
+        :param network: The network
+        :type network: ZWaveNetwork
+        :param low_battery_days: Nodes forecast to have a flat battery
+        within this many days save battery
+        :type low_battery_days: float
+        :param low_battery_refresh: Seconds between sending read operations
+        to a node that saves battery
+        :type low_battery_refresh: float
+        :param battery_threshold: The battery level a node stops working at
+        :type battery_threshold: float
+        """
+        self._network = network
+        self.low_battery_days = low_battery_days
+        self.low_battery_refresh = low_battery_refresh
+        self.battery_threshold = battery_threshold
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._awake = {}
+        self._asleep = {}
+        self._last_read = {}
+        self._loaded = False
+
+        dispatcher.connect(
+            self._on_notification,
+            network.SIGNAL_NOTIFICATION
+        )
+
+    @property
+    def _state_file(self):
+        controller = self._network.controller
+        if controller is None or controller.options is None:
+            return None
+
+        user_path = controller.options.user_path
+        if not user_path:
+            return None
+
+        return os.path.join(user_path, self.STATE_FILE)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        path = self._state_file
+        if path is None or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            logger.exception(u'Unable to load wake up state : %s', path)
+            return
+
+        def by_node(name):
+            return dict(
+                (int(node_id), item)
+                for node_id, item in data.get(name, {}).items()
+            )
+
+        self._awake = by_node('awake')
+        self._last_read = by_node('last_read')
+        for node_id, operations in by_node('pending').items():
+            self._pending[node_id] = list(
+                tuple(operation) for operation in operations
+            )
+
+    def _save(self):
+        path = self._state_file
+        if path is None:
+            return
+
+        data = dict(
+            awake=self._awake,
+            last_read=self._last_read,
+            pending=self._pending
+        )
+
+        try:
+            with open(path, 'w') as f:
+                json.dump(data, f)
+        except IOError:
+            logger.exception(u'Unable to save wake up state : %s', path)
+
+    @staticmethod
+    def _can_sleep(node):
+        try:
+            return not (
+                node.is_listening_device or
+                node.is_frequent_listening_device
+            )
+        except AttributeError:
+            return False
+
+    def hold(self, node, operation, *args):
+        """
+        Keep an operation for a node until the node wakes up.
+
+        :param node: The node
+        :type node: ZWaveNode
+        :param operation: One of READ_OPERATIONS or WRITE_OPERATIONS
+        :type operation: str
+        :param args: The arguments of the operation
+        :return: True if the operation is held, False if the node is awake
+        or never sleeps and the operation should be sent now.
+        :rtype: bool
+        """
+        if operation not in READ_OPERATIONS + WRITE_OPERATIONS:
+            raise ValueError('Unknown operation : ' + repr(operation))
+
+        if not self._can_sleep(node) or node.is_awake:
+            return False
+
+        item = (operation,) + tuple(args)
+
+        with self._lock:
+            self._load()
+            pending = self._pending.setdefault(node.id, [])
+
+            if operation == 'set_config_param':
+                # the last write to a parameter wins
+                pending[:] = list(
+                    i for i in pending
+                    if i[:2] != item[:2]
+                )
+            elif item in pending:
+                return True
+
+            pending.append(item)
+            self._save()
+
+        logger.debug(
+            u'Holding %s for sleeping node [%s]',
+            item,
+            node.id
+        )
+        return True
+
+    def pending(self, node_id):
+        """
+        The operations held for a node.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :return: [(operation, arg, ...), ...]
+        :rtype: list
+        """
+        with self._lock:
+            self._load()
+            return list(self._pending.get(node_id, []))
+
+    def cancel(self, node_id):
+        """
+        Drop the operations held for a node.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        """
+        with self._lock:
+            self._load()
+            if self._pending.pop(node_id, None) is not None:
+                self._save()
+
+    def wake_up_interval(self, node_id):
+        """
+        The number of seconds between the wake ups of a node.
+
+        The median of the times between the last Awake notifications is
+        used, the Wake-up Interval value of the node when there are not
+        enough of them.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :rtype: float or None
+        """
+        with self._lock:
+            self._load()
+            awake = list(self._awake.get(node_id, []))
+
+        if len(awake) > 2:
+            return float(np.median(np.diff(awake)))
+
+        node = self._network.nodes.get(node_id, None)
+        interval = getattr(node, 'wake_up_interval', None)
+        if interval:
+            return float(interval)
+
+        if len(awake) == 2:
+            return float(awake[1] - awake[0])
+
+        return None
+
+    def next_wake_up(self, node_id):
+        """
+        When a node is expected to wake up next.
+
+        :param node_id: The id of the node
+        :type node_id: int
+        :return: A timestamp or None if it is not known
+        :rtype: float or None
+        """
+        interval = self.wake_up_interval(node_id)
+
+        with self._lock:
+            awake = self._awake.get(node_id, [])
+            last = awake[-1] if awake else None
+
+        if interval is None or last is None:
+            return None
+
+        now = time.time()
+        missed = max(0, int((now - last) // interval))
+        return last + (missed + 1) * interval
+
+    def last_asleep(self, node_id):
+        """
+        When the last Sleep notification of a node arrived.
+
+        :rtype: float or None
+        """
+        return self._asleep.get(node_id, None)
+
+    def battery_forecast(self, node, days=30):
+        """
+        Forecast when the battery of a node is flat from the history of its
+        battery level.
+
+        A straight line is fitted through the hourly battery level of the
+        last days.
+
+        :param node: The node
+        :type node: ZWaveNode
+        :param days: The number of days of history to use
+        :type days: int
+        :return: dict(level=, drain_per_day=, days_left=, empty_at=) or None
+        if there is not enough history. days_left and empty_at are None
+        when the level is not dropping.
+        :rtype: dict or None
+        """
+        bound_value = getattr(node, 'bound_value', None)
+        value = None if bound_value is None else bound_value('battery_level')
+        if value is None:
+            return None
+
+        now = time.time()
+        samples = self._network.history.samples(
+            value,
+            now - days * DAY,
+            now,
+            3600
+        )
+        if len(samples) < 2 or samples['time'][-1] == samples['time'][0]:
+            return None
+
+        slope, intercept = np.polyfit(
+            samples['time'] - now,
+            samples['mean'],
+            1
+        )
+        level = float(samples['mean'][-1])
+        res = dict(
+            level=level,
+            drain_per_day=float(-slope * DAY),
+            days_left=None,
+            empty_at=None
+        )
+
+        if slope < 0:
+            seconds = max(level - self.battery_threshold, 0.0) / -slope
+            res['days_left'] = float(seconds / DAY)
+            res['empty_at'] = float(now + seconds)
+
+        return res
+
+    def saves_battery(self, node):
+        """
+        Is a node forecast to have a flat battery within low_battery_days.
+
+        :rtype: bool
+        """
+        forecast = self.battery_forecast(node)
+        return (
+            forecast is not None and
+            forecast['days_left'] is not None and
+            forecast['days_left'] < self.low_battery_days
+        )
+
+    def _on_notification(
+        self,
+        network=None,
+        nodeId=None,
+        notificationCode=None,
+        **_
+    ):
+        if network is not self._network or nodeId is None:
+            return
+
+        code = str(notificationCode)
+        if code == 'Awake':
+            self._on_awake(nodeId)
+        elif code == 'Sleep':
+            self._asleep[nodeId] = time.time()
+
+    def _on_awake(self, node_id):
+        now = time.time()
+
+        with self._lock:
+            self._load()
+            awake = self._awake.setdefault(node_id, [])
+            awake.append(now)
+            del awake[:-9]
+
+            node = self._network.nodes.get(node_id, None)
+            if node is None:
+                # keep the operations until the node is known
+                operations = []
+            else:
+                operations = self._pending.pop(node_id, [])
+
+            if operations:
+                reads = list(
+                    i for i in operations
+                    if i[0] in READ_OPERATIONS
+                )
+
+                if reads and self.saves_battery(node):
+                    last = self._last_read.get(node_id, 0)
+                    if now - last < self.low_battery_refresh:
+                        # keep them for a later wake up
+                        self._pending[node_id] = reads
+                        operations = list(
+                            i for i in operations
+                            if i[0] not in READ_OPERATIONS
+                        )
+                    else:
+                        self._last_read[node_id] = now
+                elif reads:
+                    self._last_read[node_id] = now
+
+            self._save()
+
+        if not operations:
+            return
+
+        logger.debug(
+            u'Node [%s] is awake, sending %d held operations',
+            node_id,
+            len(operations)
+        )
+        for operation in operations:
+            try:
+                self._send(node, operation)
+            except:
+                logger.exception(
+                    u'Unable to send %s to node [%s]',
+                    operation,
+                    node_id
+                )
+
+    def _send(self, node, operation):
+        manager = self._network.manager
+        home_id = self._network.home_id
+        name = operation[0]
+        args = operation[1:]
+
+        if name == 'set_config_param':
+            manager.setConfigParam(home_id, node.id, *args)
+        elif name == 'request_config_param':
+            manager.requestConfigParam(home_id, node.id, *args)
+        elif name == 'request_all_config_params':
+            manager.requestAllConfigParams(home_id, node.id)
+        elif name == 'refresh_info':
+            manager.refreshNodeInfo(home_id, node.id)
+        elif name == 'request_state':
+            manager.requestNodeState(home_id, node.id)
+        elif name == 'refresh_value':
+            manager.refreshValue(*args)